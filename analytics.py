@@ -0,0 +1,860 @@
+"""Order analytics built on pandas.
+
+Kept out of app.py so that pandas is only imported by requests that analyse
+CSV data; the login, splash and static pages never pay for it.
+
+Every CSV read goes through read_csv / iter_csv_chunks, which use the parser
+named by the CSV_ENGINE setting: pandas' C engine ('c', the default) or
+pyarrow's multithreaded CSV reader ('pyarrow'), which returns Arrow-backed
+columns. pyarrow is optional; without it 'pyarrow' falls back to 'c'.
+
+Reads of an upload with a known content hash are served from its
+memory-mapped columnar copy (see columnar.py) when COLUMNAR_FOLDER is set,
+so worker processes share the parsed data instead of each holding their own.
+
+Analytics run under a memory guard (see memory.py): their peak memory is
+recorded, and when ANALYTICS_MEMORY_BUDGET_MB is set an upload predicted to
+exceed it is analysed in chunks where a chunked plan exists, or refused.
+"""
+import copy
+import csv
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+
+import memory
+import metrics
+
+EXPORT_CHUNK_ROWS = 50000
+DERIVED_CACHE_SIZE = 32
+ORDER_DATE_FORMAT = '%d-%m-%Y'
+ARROW_BLOCK_SIZE = 16 * 1024 * 1024  # bytes per streamed batch with the pyarrow engine
+
+# Text columns are read as strings whatever they look like, so IDs and
+# statuses never flip between int, float and object from file to file
+ORDER_DTYPES = {
+    'sku_description': 'str',
+    'order_status': 'str',
+    'return_type': 'str',
+    'return_reason': 'str',
+}
+TOP_SKU_COLUMNS = ['order_id', 'sku_description', 'order_price', 'order_status', 'return_cost']
+
+log = logging.getLogger(__name__)
+
+_derived = OrderedDict()
+_derived_lock = threading.Lock()
+
+def derived(content_hash, name, compute):
+    """Memoise a result computed from an upload's data, keyed by its content hash.
+
+    Identical files (re-uploads, or the same export uploaded by two sellers)
+    are analysed once per process. Callers get a copy they may modify.
+    Uploads without a hash are computed every time, and nothing is stored
+    when ``compute`` raises.
+    """
+    if not content_hash:
+        return compute()
+    key = (name, content_hash)
+    with _derived_lock:
+        hit = key in _derived
+        if hit:
+            _derived.move_to_end(key)
+            value = _derived[key]
+    metrics.inc(metrics.CACHE_REQUESTS, cache='derived', result='hit' if hit else 'miss')
+    if hit:
+        return copy.deepcopy(value)
+    value = compute()
+    with _derived_lock:
+        _derived[key] = value
+        while len(_derived) > DERIVED_CACHE_SIZE:
+            _derived.popitem(last=False)
+    return copy.deepcopy(value)
+
+def forget(content_hash):
+    """Drop this process's derived results for a deleted upload"""
+    with _derived_lock:
+        for key in [key for key in _derived if key[1] == content_hash]:
+            del _derived[key]
+
+def dashboard_metrics(csv_path, content_hash=None, df=None):
+    def compute():
+        with guard(csv_path, 'dashboard'):
+            return calculate_dashboard_metrics(csv_path, content_hash, df, fallback=False)
+    try:
+        # compute raises instead of falling back, so a failed read is never cached
+        return derived(content_hash, 'dashboard', compute)
+    except (memory.MemoryBudgetExceeded, MemoryError):
+        raise
+    except Exception:
+        return empty_dashboard_metrics()  # already logged by calculate_dashboard_metrics
+
+def top_skus(csv_path, content_hash=None):
+    def compute():
+        budget = memory_budget()
+        if memory.too_large(csv_path, 'top_skus', budget):
+            # Too big to load whole: stream it, stopping if even that outgrows the budget
+            with memory.tracked('top_skus_chunked', budget) as tracker, metrics.timer('top_skus'):
+                return build_top_skus_chunked(csv_path, tracker)
+        with memory.tracked('top_skus'):
+            df = read_orders(csv_path, TOP_SKU_COLUMNS, content_hash)
+            with metrics.timer('top_skus'):
+                return build_top_skus(df)
+    return derived(content_hash, 'top_skus', compute)
+
+def memory_budget():
+    """ANALYTICS_MEMORY_BUDGET_MB in bytes, or None when analytics are not limited"""
+    from flask import current_app, has_app_context
+    budget_mb = current_app.config.get('ANALYTICS_MEMORY_BUDGET_MB') if has_app_context() else None
+    return budget_mb * 1024 * 1024 if budget_mb else None
+
+def guard(csv_path, analytic):
+    """Track ``analytic``'s peak memory, refusing it up front if its estimate is over budget"""
+    budget = memory_budget()
+    problem = memory.too_large(csv_path, analytic, budget)
+    if problem:
+        metrics.inc(metrics.ERRORS, where='memory_budget')
+        raise memory.MemoryBudgetExceeded(problem)
+    return memory.tracked(analytic, budget)
+
+def csv_engine():
+    """The configured parser backend, 'c' unless CSV_ENGINE is 'pyarrow' and pyarrow is installed"""
+    from flask import current_app, has_app_context
+    engine = current_app.config.get('CSV_ENGINE', 'c') if has_app_context() else 'c'
+    if engine == 'pyarrow':
+        try:
+            import pyarrow.csv  # noqa: F401
+        except ImportError:
+            return 'c'
+    return engine
+
+def columnar_folder():
+    """Where memory-mapped columnar copies of uploads live, or None when disabled"""
+    from flask import current_app, has_app_context
+    return current_app.config.get('COLUMNAR_FOLDER') if has_app_context() else None
+
+def read_header(csv_path):
+    import io
+    import storage
+    with storage.open_stored(csv_path) as raw:
+        return next(csv.reader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')), [])
+
+def _arrow_options(csv_path, usecols, dtype, text):
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    header = read_header(csv_path)
+    include = [column for column in header if usecols is None or column in usecols]
+    arrow_types = {'str': pa.string(), 'int64': pa.int64(), 'float64': pa.float64()}
+    if text:
+        column_types = {column: pa.string() for column in include}
+    else:
+        column_types = {column: arrow_types[kind] for column, kind in (dtype or {}).items() if column in include}
+    convert = pacsv.ConvertOptions(include_columns=include, column_types=column_types,
+                                   strings_can_be_null=not text, quoted_strings_can_be_null=not text)
+    return pacsv.ReadOptions(block_size=ARROW_BLOCK_SIZE, use_threads=True), convert
+
+def _pandas_options(csv_path, usecols, dtype, text):
+    if usecols is not None:
+        header = set(read_header(csv_path))
+        usecols = [column for column in usecols if column in header]
+    if text:
+        return {'usecols': usecols, 'dtype': str, 'keep_default_na': False}
+    return {'usecols': usecols, 'dtype': dtype}
+
+def _parse_dates(df, date_columns):
+    if date_columns:
+        with metrics.timer('date_parse'):
+            return _parse_date_columns(df, date_columns)
+    return df
+
+def _parse_date_columns(df, date_columns):
+    for column in date_columns:
+        if column in df.columns:
+            if isinstance(df[column].dtype, pd.ArrowDtype):
+                import pyarrow as pa
+                import pyarrow.compute as pc
+                parsed = pc.strptime(pa.array(df[column]), format=ORDER_DATE_FORMAT, unit='s', error_is_null=True)
+                df[column] = pd.Series(pd.arrays.ArrowExtensionArray(parsed), index=df.index)
+            else:
+                df[column] = pd.to_datetime(df[column], format=ORDER_DATE_FORMAT, errors='coerce')
+    return df
+
+def read_csv(csv_path, usecols=None, dtype=None, date_columns=(), engine=None):
+    """Read a whole CSV with the configured backend.
+
+    ``usecols`` is pushed into the parser (columns the file lacks are
+    skipped), ``dtype`` maps columns to 'str', 'int64' or 'float64', and
+    ``date_columns`` are parsed as DD-MM-YYYY (unparseable values -> NaT).
+    """
+    engine = engine or csv_engine()
+    with metrics.timer('csv_read'):
+        if engine == 'pyarrow':
+            import pyarrow.csv as pacsv
+            read_options, convert_options = _arrow_options(csv_path, usecols, dtype, text=False)
+            table = pacsv.read_csv(csv_path, read_options=read_options, convert_options=convert_options)
+            df = table.to_pandas(types_mapper=pd.ArrowDtype)
+        else:
+            df = pd.read_csv(csv_path, **_pandas_options(csv_path, usecols, dtype, text=False))
+    return _parse_dates(df, date_columns)
+
+def iter_csv_chunks(csv_path, text=False, usecols=None, dtype=None, engine=None):
+    """Yield a CSV as DataFrame chunks with the configured backend.
+
+    The C engine yields EXPORT_CHUNK_ROWS rows at a time, pyarrow one
+    ARROW_BLOCK_SIZE block at a time. With ``text`` every column is a string
+    and empty cells stay '' rather than NaN.
+    """
+    engine = engine or csv_engine()
+    if engine == 'pyarrow':
+        import pyarrow.csv as pacsv
+        read_options, convert_options = _arrow_options(csv_path, usecols, dtype, text)
+        for batch in pacsv.open_csv(csv_path, read_options=read_options, convert_options=convert_options):
+            yield batch.to_pandas(types_mapper=None if text else pd.ArrowDtype)
+    else:
+        yield from pd.read_csv(csv_path, chunksize=EXPORT_CHUNK_ROWS,
+                               **_pandas_options(csv_path, usecols, dtype, text))
+
+def read_orders(csv_path, usecols=None, content_hash=None):
+    """Load an order export into a DataFrame.
+
+    With a ``content_hash`` the columns are mapped from the upload's columnar
+    copy, which is written from the CSV on first use.
+    """
+    folder = columnar_folder()
+    if content_hash and folder:
+        import columnar
+        return columnar.load(folder, content_hash, lambda: read_csv(csv_path, dtype=ORDER_DTYPES), usecols)
+    return read_csv(csv_path, usecols=usecols, dtype=ORDER_DTYPES)
+
+def count_rows(csv_path):
+    """Number of data rows in a CSV file, or 0 if it cannot be parsed"""
+    try:
+        header = read_header(csv_path)
+        return len(read_csv(csv_path, usecols=header[:1])) if header else 0
+    except Exception:
+        return 0
+
+def format_day(day):
+    if 11 <= day <= 13:
+        return f"{day}th"
+    elif day % 10 == 1:
+        return f"{day}st"
+    elif day % 10 == 2:
+        return f"{day}nd"
+    elif day % 10 == 3:
+        return f"{day}rd"
+    else:
+        return f"{day}th"
+
+def calculate_dashboard_metrics(csv_path, content_hash=None, df=None, fallback=True):
+    """Dashboard figures for an export, or for its already loaded ``df``.
+
+    On error the zeros of empty_dashboard_metrics are returned, or with
+    ``fallback=False`` the exception is raised.
+    """
+    try:
+        if df is None:
+            df = read_orders(csv_path, content_hash=content_hash)
+        lap = metrics.stopwatch('dashboard')
+        
+        total_orders = len(df)
+        total_returns = (df["order_status"] == "returned").sum() if "order_status" in df.columns else 0
+        return_percent = round((total_returns / total_orders) * 100, 2) if total_orders > 0 else 0
+        
+        net_sales = df['order_price'].sum() if 'order_price' in df.columns else 0
+        return_cost = df['return_cost'].sum() if 'return_cost' in df.columns else 0
+        net_profit = net_sales - return_cost
+        lap('totals')
+        
+        # Line chart data
+        if 'order_date' in df.columns:
+            daily_sales = df.groupby("order_date").agg(
+                total_amount=("order_price", "sum"),
+                order_count=("order_price", "count")
+            ).reset_index()
+            
+            # Keep original dates for tooltip
+            chart_dates = daily_sales["order_date"].tolist()
+            # Create display labels (formatted dates)
+            chart_display_dates = daily_sales["order_date"].apply(
+                lambda x: format_day(int(x.split("-")[0])) if isinstance(x, str) and "-" in str(x) else str(x)
+            ).tolist()
+            chart_amounts = daily_sales["total_amount"].tolist()
+            chart_order_counts = daily_sales["order_count"].tolist()
+        else:
+            chart_dates = []
+            chart_display_dates = []
+            chart_amounts = []
+            chart_order_counts = []
+        lap('daily_sales')
+        
+        # Pie chart data (Return Reasons)
+        pie_labels = []
+        pie_values = []
+        if "order_status" in df.columns and "return_reason" in df.columns:
+            returned_df = df[df["order_status"] == "returned"]
+            if len(returned_df) > 0:
+                reason_counts = returned_df["return_reason"].value_counts().reset_index()
+                reason_counts.columns = ["return_reason", "count"]
+                pie_labels = reason_counts["return_reason"].tolist()
+                pie_values = reason_counts["count"].tolist()
+        lap('return_reasons')
+        
+        # Bar chart data (Top Catalogues)
+        catalogue_labels = []
+        catalogue_values = []
+        if "catalogue_id" in df.columns and "order_status" in df.columns:
+            returned_df = df[df["order_status"] == "returned"]
+            if len(returned_df) > 0:
+                top_catalogues = returned_df.groupby('catalogue_id').agg(
+                    return_count=('order_id', "count")
+                ).reset_index().sort_values('return_count', ascending=False, kind='stable').head(5)
+                catalogue_labels = top_catalogues["catalogue_id"].astype(str).tolist()
+                catalogue_values = top_catalogues["return_count"].tolist()
+        lap('top_catalogues')
+        
+        # Bar chart data (Top SKUs)
+        sku_labels = []
+        sku_values = []
+        if "sku_description" in df.columns and "order_status" in df.columns:
+            returned_df = df[df["order_status"] == "returned"]
+            if len(returned_df) > 0:
+                top_skus = returned_df.groupby("sku_description").agg(
+                    return_count=("order_id", "count")
+                ).reset_index().sort_values("return_count", ascending=False, kind="stable").head(5)
+                sku_labels = top_skus["sku_description"].tolist()
+                sku_values = top_skus["return_count"].tolist()
+        lap('top_skus')
+        
+        # Category Analysis (for catalogue page)
+        categories = []
+        top_categories = []
+        top_by_orders = []
+        category_insights = {"warnings": [], "dangers": [], "successes": [], "recommendations": [], "actions": []}
+        
+        # Check for category column first, then catalogue_id
+        if "category" in df.columns:
+            cat_col = "category"
+        elif "catalogue_id" in df.columns:
+            # Create a mapping from catalogue_id to category name
+            catalogue_mapping = {
+                362950628: "Men's Kurtas",
+                685582861: "Women's Sarees",
+                334760738: "Men's Shirts",
+                868820204: "Women's Dresses",
+                969119330: "Kids Wear",
+                266944844: "Accessories",
+                485451171: "Footwear",
+                675770529: "Bags",
+                774996843: "Jewelry",
+                149203558: "Watches",
+                586845604: "Electronics",
+                386665249: "Home Decor",
+                362863730: "Beauty Products",
+                924970419: "Sports Gear",
+                171069472: "Kitchenware",
+                636045484: "Furniture",
+                364814270: "Toys",
+                726563708: "Books",
+                197613238: "Food Items",
+                # Default for unmapped IDs
+            }
+            df['category'] = df['catalogue_id'].apply(lambda x: catalogue_mapping.get(x, f"Category {x}"))
+            cat_col = "category"
+        else:
+            cat_col = None
+        
+        if cat_col and len(df) > 0:
+            # Group by category
+            category_stats = df.groupby(cat_col).agg(
+                revenue=('order_price', 'sum'),
+                orders=('order_id', 'count'),
+                returns=('order_status', lambda x: (x == 'returned').sum()),
+                return_cost=('return_cost', 'sum'),
+                profit_margin=('order_price', lambda x: (x.sum() - df.loc[x.index, 'return_cost'].sum()) / x.sum() * 100 if x.sum() > 0 else 0)
+            ).reset_index()
+            
+            category_stats.columns = ['name', 'revenue', 'orders', 'returns', 'return_cost', 'profit_margin']
+            category_stats['return_rate'] = (category_stats['returns'] / category_stats['orders'] * 100).round(2)
+            category_stats['avg_order_value'] = (category_stats['revenue'] / category_stats['orders']).round(2)
+            
+            # Calculate performance score (higher is better)
+            category_stats['performance_score'] = (
+                (category_stats['revenue'] / category_stats['revenue'].max() * 30) +
+                (100 - category_stats['return_rate']) * 0.4 +
+                (category_stats['profit_margin'].clip(0, 50) / 50 * 30)
+            ).round(0)
+            
+            categories = category_stats.to_dict('records')
+            top_categories = sorted(categories, key=lambda x: x['revenue'], reverse=True)[:5]
+            top_by_orders = sorted(categories, key=lambda x: x['orders'], reverse=True)[:5]
+            
+            # Generate insights
+            for cat in categories:
+                if cat['return_rate'] > 15:
+                    category_insights['dangers'].append(f"{cat['name']} has a high return rate of {cat['return_rate']}%. Consider reviewing product quality or descriptions.")
+                elif cat['return_rate'] > 10:
+                    category_insights['warnings'].append(f"{cat['name']} return rate is at {cat['return_rate']}%. Monitor closely.")
+                
+                if cat['performance_score'] > 70:
+                    category_insights['successes'].append(f"{cat['name']} is performing excellently with a {cat['performance_score']}% score.")
+                
+                if cat['profit_margin'] < 10:
+                    category_insights['warnings'].append(f"{cat['name']} has low profit margin of {cat['profit_margin']}%. Consider optimizing costs.")
+            
+            # Add recommendations
+            if category_insights['dangers']:
+                category_insights['recommendations'].append("Focus on categories with high return rates first - consider quality control and better product descriptions.")
+            if top_categories:
+                best_cat = top_categories[0]
+                category_insights['recommendations'].append(f"{best_cat['name']} is your top performer - consider expanding this category.")
+            
+            # Add action items
+            category_insights['actions'] = [
+                {"title": "Review High Return Categories", "description": "Investigate root causes of returns in categories with >10% return rate."},
+                {"title": "Optimize Pricing", "description": "Consider adjusting prices in low margin categories to improve profitability."},
+                {"title": "Expand Successful Categories", "description": "Invest more in top-performing categories to maximize revenue."},
+                {"title": "Improve Descriptions", "description": "Add detailed product descriptions to reduce return rates."}
+            ]
+        lap('categories')
+        
+        return {
+            "total_orders": total_orders,
+            "total_returns": total_returns,
+            "return_percent": return_percent,
+            "net_sales": net_sales,
+            "return_cost": return_cost,
+            "net_profit": net_profit,
+            "chart_dates": chart_dates,
+            "chart_display_dates": chart_display_dates,
+            "chart_amounts": chart_amounts,
+            "chart_order_counts": chart_order_counts,
+            "pie_labels": pie_labels,
+            "pie_values": pie_values,
+            "catalogue_labels": catalogue_labels,
+            "catalogue_values": catalogue_values,
+            "sku_labels": sku_labels,
+            "sku_values": sku_values,
+            "categories": categories,
+            "top_categories": top_categories,
+            "top_by_orders": top_by_orders,
+            "insights": category_insights
+        }
+    except MemoryError:
+        raise  # answered by the app's MemoryError handler
+    except Exception:
+        log.exception("Error processing %s", csv_path)
+        metrics.inc(metrics.ERRORS, where='dashboard_metrics')
+        if not fallback:
+            raise
+        return empty_dashboard_metrics()
+
+def empty_dashboard_metrics():
+    return {
+        "total_orders": 0,
+        "total_returns": 0,
+        "return_percent": 0,
+        "net_sales": 0,
+        "return_cost": 0,
+        "net_profit": 0,
+        "chart_dates": [],
+        "chart_display_dates": [],
+        "chart_amounts": [],
+        "chart_order_counts": [],
+        "pie_labels": [],
+        "pie_values": [],
+        "catalogue_labels": [],
+        "catalogue_values": [],
+        "sku_labels": [],
+        "sku_values": [],
+        "categories": [],
+        "top_categories": [],
+        "top_by_orders": [],
+        "insights": {"warnings": [], "dangers": [], "successes": [], "recommendations": [], "actions": []}
+    }
+
+def sku_totals(df):
+    """Per-SKU orders, revenue, return cost and return count.
+
+    The totals of consecutive chunks add up to the totals of the whole file.
+    """
+    grouped = df.groupby('sku_description')
+    totals = grouped.agg(orders=('order_id', 'count'), revenue=('order_price', 'sum'))
+    totals['return_cost'] = grouped['return_cost'].sum() if 'return_cost' in df.columns else 0
+    if 'order_status' in df.columns:
+        returns = df[df['order_status'] == 'returned'].groupby('sku_description').size()
+        totals['return_count'] = returns.reindex(totals.index, fill_value=0).astype(int)
+    else:
+        totals['return_count'] = 0
+    return totals
+
+def sku_category(description):
+    text = str(description).lower()
+    if 'electronic' in text:
+        return 'Electronics'
+    if 'cable' in text or 'headphone' in text:
+        return 'Accessories'
+    return 'General'
+
+def top_skus_from_totals(totals, columns, first_descriptions):
+    """Top 10 SKUs by revenue from sku_totals.
+
+    ``columns`` are the file's columns (margin and return rate fall back to
+    defaults when it lacks return_cost or order_status) and
+    ``first_descriptions`` its first sku_description values, which the
+    category labels have always been taken from, row by row.
+    """
+    sku_stats = totals.reset_index()
+    if 'return_cost' in columns:
+        sku_stats['profit_margin'] = ((sku_stats['revenue'] - sku_stats['return_cost']) / sku_stats['revenue'] * 100).round(1)
+    else:
+        sku_stats['profit_margin'] = 35.0  # Default
+    if 'order_status' in columns:
+        sku_stats['return_rate'] = (sku_stats['return_count'] / sku_stats['orders'] * 100).round(1)
+    else:
+        sku_stats['return_rate'] = 5.0  # Default
+    
+    sku_stats = sku_stats.rename(columns={'sku_description': 'sku'})
+    top_skus_df = sku_stats.sort_values('revenue', ascending=False, kind='stable').head(10)
+    
+    # Add placeholder fields for missing columns
+    top_skus = []
+    for position, (_, row) in enumerate(top_skus_df.iterrows()):
+        top_skus.append({
+            'sku': row['sku'][:15] + '...' if len(str(row['sku'])) > 15 else row['sku'],
+            'name': row['sku'][:30] + '...' if len(str(row['sku'])) > 30 else row['sku'],
+            'category': sku_category(first_descriptions[position]),
+            'brand': 'Brand-' + str(hash(str(row['sku'])) % 1000)[:3],
+            'warehouse': 'WH-' + str((hash(str(row['sku'])) % 3) + 1),
+            'orders': int(row['orders']),
+            'revenue': round(row['revenue'], 2),
+            'profit_margin': row['profit_margin'],
+            'return_rate': row['return_rate']
+        })
+    return top_skus
+
+def build_top_skus(df):
+    """Top 10 SKUs by revenue with per-SKU margin and return rate"""
+    if 'sku_description' not in df.columns:
+        return []
+    return top_skus_from_totals(sku_totals(df), df.columns, df['sku_description'].head(10).tolist())
+
+def build_top_skus_chunked(csv_path, tracker=None):
+    """build_top_skus one chunk at a time, for files too large to load whole"""
+    header = read_header(csv_path)
+    if 'sku_description' not in header:
+        return []
+    totals = None
+    first_descriptions = []
+    for chunk in iter_csv_chunks(csv_path, usecols=TOP_SKU_COLUMNS, dtype=ORDER_DTYPES):
+        if len(first_descriptions) < 10:
+            first_descriptions += chunk['sku_description'].head(10 - len(first_descriptions)).tolist()
+        part = sku_totals(chunk)
+        totals = part if totals is None else pd.concat([totals, part]).groupby(level=0).sum()
+        if tracker:
+            tracker.check()
+    if totals is None:
+        return []
+    return top_skus_from_totals(totals, header, first_descriptions)
+
+def calculate_sku_metrics(df, sku):
+    """Order, revenue and return totals for a single SKU"""
+    # Find the specific SKU data
+    sku_data = df[df['sku_description'] == sku] if 'sku_description' in df.columns else pd.DataFrame()
+    
+    if not sku_data.empty:
+        sku_metrics = {
+            'sku': sku[:30] + '...' if len(str(sku)) > 30 else sku,
+            'total_orders': len(sku_data),
+            'revenue': sku_data['order_price'].sum() if 'order_price' in sku_data.columns else 0,
+            'returns': len(sku_data[sku_data['order_status'] == 'returned']) if 'order_status' in sku_data.columns else 0,
+            'return_rate': round((len(sku_data[sku_data['order_status'] == 'returned']) / len(sku_data) * 100), 2) if len(sku_data) > 0 else 0
+        }
+    else:
+        sku_metrics = {
+            'sku': sku[:30] + '...' if len(str(sku)) > 30 else sku,
+            'total_orders': 0,
+            'revenue': 0,
+            'returns': 0,
+            'return_rate': 0
+        }
+    return sku_metrics
+
+def iter_order_chunks(csv_paths, catalogue_id=None, status=None, start_date=None, end_date=None):
+    """Yield filtered DataFrame chunks from the given CSV files.
+
+    Files are read EXPORT_CHUNK_ROWS rows at a time so memory stays constant
+    regardless of file size. A file that fails to read is logged and the
+    error re-raised, which aborts a streamed response part way.
+    """
+    for csv_path in csv_paths:
+        try:
+            for chunk in iter_csv_chunks(csv_path, dtype=ORDER_DTYPES):
+                if catalogue_id is not None and 'catalogue_id' in chunk.columns:
+                    chunk = chunk[chunk['catalogue_id'] == catalogue_id]
+                if status and 'order_status' in chunk.columns:
+                    chunk = chunk[chunk['order_status'] == status]
+                if (start_date or end_date) and 'order_date' in chunk.columns:
+                    dates = pd.to_datetime(chunk['order_date'], format='%d-%m-%Y', errors='coerce')
+                    mask = dates.notna()
+                    if start_date:
+                        mask &= dates >= start_date
+                    if end_date:
+                        mask &= dates <= end_date
+                    chunk = chunk[mask]
+                if not chunk.empty:
+                    yield chunk
+        except Exception:
+            log.exception("Error exporting %s", csv_path)
+            metrics.inc(metrics.ERRORS, where='export')
+            raise  # abort the stream so the download fails visibly instead of ending short
+
+def sku_stats_frame(rows):
+    """Per-SKU statistics from (sku, orders, units, revenue, returns, return_cost) totals
+    computed over the orders table, highest revenue first"""
+    totals = pd.DataFrame.from_records(rows, columns=['sku', 'orders', 'units', 'revenue', 'returns', 'return_cost'])
+    totals[['orders', 'units', 'returns']] = totals[['orders', 'units', 'returns']].astype(int)
+    totals['return_rate'] = (totals['returns'] / totals['orders'] * 100).round(2)
+    return totals.sort_values('revenue', ascending=False, kind='stable')
+
+def stream_frames(frames, fmt):
+    """Serialise DataFrame chunks as CSV (single header) or NDJSON text"""
+    columns = None
+    for frame in frames:
+        if fmt == 'csv':
+            if columns is None:
+                columns = list(frame.columns)
+                yield frame.to_csv(index=False)
+            else:
+                yield frame.reindex(columns=columns).to_csv(index=False, header=False)
+        elif not frame.empty:
+            lines = frame.to_json(orient='records', lines=True)
+            yield lines if lines.endswith('\n') else lines + '\n'
+
+ORDER_TEXT_FIELDS = ('catalogue_id', 'sku_description', 'order_status', 'return_type', 'return_reason')
+ORDER_NUMBER_FIELDS = ('item_price', 'order_price', 'return_cost')
+# Columns of an order export, in the order the uploaded files have them
+ORDER_EXPORT_FIELDS = ('order_id', 'order_date', 'catalogue_id', 'sku_description', 'item_price', 'quantity',
+                       'order_price', 'order_status', 'return_type', 'return_cost', 'return_reason')
+
+def _text_column(chunk, field):
+    """``field`` as Python strings with empty cells as None"""
+    if field not in chunk.columns:
+        return pd.Series([None] * len(chunk), index=chunk.index, dtype=object)
+    values = chunk[field].astype(object)
+    return values.where(values != '', None)
+
+def _number_column(chunk, field, dtype='float64'):
+    """``field`` parsed as numbers, with empty or malformed cells as 0"""
+    if field not in chunk.columns:
+        return pd.Series(0, index=chunk.index, dtype=dtype)
+    return pd.to_numeric(chunk[field], errors='coerce').fillna(0).astype(dtype)
+
+def order_records(chunk):
+    """Order dicts ready to upsert from a text chunk of an export, built column by column"""
+    chunk = chunk[chunk['order_id'] != '']
+    if chunk.empty:
+        return []
+    if 'order_date' in chunk.columns:
+        dates = pd.to_datetime(chunk['order_date'], format=ORDER_DATE_FORMAT, errors='coerce')
+        order_dates = dates.dt.date.astype(object).where(dates.notna(), None)
+    else:
+        order_dates = _text_column(chunk, 'order_date')
+    columns = {
+        'order_id': chunk['order_id'].astype(object),
+        'order_date': order_dates,
+        'quantity': _number_column(chunk, 'quantity', 'int64'),
+        # 64-bit hash of every raw value in the row, as 16 hex digits
+        'row_hash': pd.util.hash_pandas_object(chunk, index=False).map('{:016x}'.format),
+    }
+    columns.update((field, _text_column(chunk, field)) for field in ORDER_TEXT_FIELDS)
+    columns.update((field, _number_column(chunk, field)) for field in ORDER_NUMBER_FIELDS)
+    # tolist() converts to Python scalars a column at a time, far quicker than to_dict('records')
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*(columns[key].tolist() for key in keys))]
+
+def iter_order_records(csv_path):
+    """Yield lists of order dicts ready to upsert into the orders table, one chunk at a time.
+
+    Each record carries a ``row_hash`` of the raw CSV values so unchanged
+    rows can be skipped when an overlapping export is merged again.
+    """
+    for chunk in iter_csv_chunks(csv_path, text=True):
+        if 'order_id' not in chunk.columns:
+            return
+        records = order_records(chunk)
+        if records:
+            yield records
+
+def order_ids(csv_path):
+    """The order ids in an export, as text"""
+    ids = set()
+    for chunk in iter_csv_chunks(csv_path, text=True, usecols=['order_id']):
+        if 'order_id' not in chunk.columns:
+            break
+        ids.update(chunk['order_id'].tolist())
+    ids.discard('')
+    return ids
+
+def orders_frame(rows):
+    """DataFrame with year/month/day columns from (order_date, quantity, order_price,
+    order_status, return_cost, return_reason) rows of the orders table"""
+    df = pd.DataFrame.from_records(rows, columns=['order_date', 'quantity', 'order_price', 'order_status',
+                                                  'return_cost', 'return_reason'])
+    dates = pd.to_datetime(df['order_date'])
+    return df.assign(year=dates.dt.year, month=dates.dt.month, day=dates.dt.day)
+
+def order_export_frame(rows):
+    """DataFrame of ORDER_EXPORT_FIELDS rows of the orders table, dates written as the uploads write them"""
+    df = pd.DataFrame.from_records(rows, columns=list(ORDER_EXPORT_FIELDS))
+    df['order_date'] = pd.to_datetime(df['order_date']).dt.strftime(ORDER_DATE_FORMAT)
+    return df
+
+def compare_month_frame(df, month1, year1, month2, year2):
+    """Comparison data for two months from orders with year, month and day columns"""
+    try:
+        # Filter for the two selected months
+        df1 = df[(df['year'] == year1) & (df['month'] == month1)]
+        df2 = df[(df['year'] == year2) & (df['month'] == month2)]
+        
+        if df1.empty and df2.empty:
+            return None
+        
+        # Calculate daily revenue for month 1
+        daily_revenue1 = {}
+        if not df1.empty:
+            daily_revenue1 = df1.groupby('day')['order_price'].sum().to_dict()
+        
+        # Calculate daily revenue for month 2
+        daily_revenue2 = {}
+        if not df2.empty:
+            daily_revenue2 = df2.groupby('day')['order_price'].sum().to_dict()
+        
+        # Calculate metrics for month 1
+        month1_data = {}
+        if not df1.empty:
+            # Get return reasons for month 1
+            return_reasons1 = {}
+            returned_df1 = df1[df1['order_status'] == 'returned']
+            if not returned_df1.empty and 'return_reason' in returned_df1.columns:
+                return_reasons1 = returned_df1['return_reason'].value_counts().to_dict()
+            
+            month1_data = {
+                'month_year': f"{datetime(year1, month1, 1).strftime('%B')} {year1}",
+                'total_orders': len(df1),
+                'total_quantity': df1['quantity'].sum(),
+                'total_revenue': df1['order_price'].sum(),
+                'avg_order_value': df1['order_price'].sum() / len(df1) if len(df1) > 0 else 0,
+                'delivered_count': len(df1[df1['order_status'] == 'delivered']),
+                'cancelled_count': len(df1[df1['order_status'] == 'cancelled']),
+                'returned_count': len(df1[df1['order_status'] == 'returned']),
+                'return_cost': df1['return_cost'].sum() if 'return_cost' in df1.columns else 0,
+                'return_rate': round((len(df1[df1['order_status'] == 'returned']) / len(df1) * 100), 2) if len(df1) > 0 else 0,
+                'daily_revenue': daily_revenue1,
+                'return_reasons': return_reasons1,
+                'has_data': True
+            }
+        else:
+            # Month 1 has no data - still create empty structure
+            month1_data = {
+                'month_year': f"{datetime(year1, month1, 1).strftime('%B')} {year1}",
+                'total_orders': 0,
+                'total_quantity': 0,
+                'total_revenue': 0,
+                'avg_order_value': 0,
+                'delivered_count': 0,
+                'cancelled_count': 0,
+                'returned_count': 0,
+                'return_cost': 0,
+                'return_rate': 0,
+                'daily_revenue': {},
+                'return_reasons': {},
+                'has_data': False
+            }
+        
+        # Calculate metrics for month 2
+        month2_data = {}
+        if not df2.empty:
+            # Get return reasons for month 2
+            return_reasons2 = {}
+            returned_df2 = df2[df2['order_status'] == 'returned']
+            if not returned_df2.empty and 'return_reason' in returned_df2.columns:
+                return_reasons2 = returned_df2['return_reason'].value_counts().to_dict()
+            
+            month2_data = {
+                'month_year': f"{datetime(year2, month2, 1).strftime('%B')} {year2}",
+                'total_orders': len(df2),
+                'total_quantity': df2['quantity'].sum(),
+                'total_revenue': df2['order_price'].sum(),
+                'avg_order_value': df2['order_price'].sum() / len(df2) if len(df2) > 0 else 0,
+                'delivered_count': len(df2[df2['order_status'] == 'delivered']),
+                'cancelled_count': len(df2[df2['order_status'] == 'cancelled']),
+                'returned_count': len(df2[df2['order_status'] == 'returned']),
+                'return_cost': df2['return_cost'].sum() if 'return_cost' in df2.columns else 0,
+                'return_rate': round((len(df2[df2['order_status'] == 'returned']) / len(df2) * 100), 2) if len(df2) > 0 else 0,
+                'daily_revenue': daily_revenue2,
+                'return_reasons': return_reasons2,
+                'has_data': True
+            }
+        else:
+            # Month 2 has no data - still create empty structure
+            month2_data = {
+                'month_year': f"{datetime(year2, month2, 1).strftime('%B')} {year2}",
+                'total_orders': 0,
+                'total_quantity': 0,
+                'total_revenue': 0,
+                'avg_order_value': 0,
+                'delivered_count': 0,
+                'cancelled_count': 0,
+                'returned_count': 0,
+                'return_cost': 0,
+                'return_rate': 0,
+                'daily_revenue': {},
+                'return_reasons': {},
+                'has_data': False
+            }
+        
+        # Check if at least one month has data
+        if not month1_data.get('has_data') and not month2_data.get('has_data'):
+            return None
+        
+        # Calculate differences and percentage changes
+        if month1_data and month2_data:
+            revenue_diff = month2_data['total_revenue'] - month1_data['total_revenue']
+            revenue_pct = round((revenue_diff / month1_data['total_revenue'] * 100), 2) if month1_data['total_revenue'] > 0 else 0
+            
+            orders_diff = month2_data['total_orders'] - month1_data['total_orders']
+            orders_pct = round((orders_diff / month1_data['total_orders'] * 100), 2) if month1_data['total_orders'] > 0 else 0
+            
+            return_rate_diff = month2_data['return_rate'] - month1_data['return_rate']
+            
+            aov_diff = month2_data['avg_order_value'] - month1_data['avg_order_value']
+            aov_pct = round((aov_diff / month1_data['avg_order_value'] * 100), 2) if month1_data['avg_order_value'] > 0 else 0
+            
+            comparison = {
+                'revenue_change': revenue_diff,
+                'revenue_change_pct': revenue_pct,
+                'orders_change': orders_diff,
+                'orders_change_pct': orders_pct,
+                'return_rate_change': return_rate_diff,
+                'aov_change': aov_diff,
+                'aov_change_pct': aov_pct
+            }
+        else:
+            comparison = {}
+        
+        return {
+            'month1': month1_data,
+            'month2': month2_data,
+            'comparison': comparison
+        }
+        
+    except MemoryError:
+        raise
+    except Exception:
+        log.exception("Error in two-month comparison")
+        metrics.inc(metrics.ERRORS, where='compare_months')
+        return None
@@ -1,35 +1,95 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file
+import time
+_import_started = time.perf_counter()  # before the flask/sqlalchemy imports, which dominate start-up
+
+from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file, Response, abort, g, has_request_context, jsonify, stream_with_context
+from flask import before_render_template, template_rendered
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import aliased
+from sqlalchemy import and_, case, event, func, or_, select
+from sqlalchemy.engine import Engine
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 from functools import wraps
+import click
 import re
 import os
+import hmac
 import csv
 import io
 import random
-import string
-import pandas as pd
-from PIL import Image
-import io as pil_io
+import threading
 
-# Set secret key before loading config
-os.environ['SECRET_KEY'] = 'hard-to-guess-string'
+from config import Config
+import memory
+import metrics
+import passwords
+import profiling
+import querylog
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'hard-to-guess-string'
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['PROFILE_PHOTO_FOLDER'] = 'uploads/profile'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///retrix.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 ALLOWED_EXTENSIONS = {'csv'}
+COMPRESSED_EXTENSIONS = {'gz', 'zst', 'zip'}  # orders.csv.gz, orders.csv.zst, orders.zip
 ALLOWED_PHOTO_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
-# Ensure upload directories exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['PROFILE_PHOTO_FOLDER'], exist_ok=True)
-db = SQLAlchemy(app)
+db = SQLAlchemy()
+
+def configure_app(config_class=Config):
+    """Configure the module-level ``app``, its database and upload folders.
+
+    Run once at the end of this module, so ``app`` is ready however it is
+    imported (``flask --app app``, wsgi.py, scripts). Settings come from
+    ``config_class``, which reads the environment; scratch setups such as
+    test_sku.py set DATABASE_URL and friends before importing this module.
+    Schema creation stays an explicit step (``init_db``).
+    """
+    started = time.perf_counter()
+    app.config.from_object(config_class)
+
+    # Ensure upload directories exist
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['PROFILE_PHOTO_FOLDER'], exist_ok=True)
+    db.init_app(app)
+    metrics.configure(app.config['METRICS_ENABLED'], app.config['METRICS_FOLDER'])
+    passwords.configure(app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_QUEUE'])
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', apply_sqlite_pragmas)
+
+    configure_ms = (time.perf_counter() - started) * 1000
+    app.extensions['retrix.startup'] = {'import_ms': _import_ms, 'configure_ms': configure_ms}
+    app.logger.info("Retrix startup: import %.1f ms, configure_app %.1f ms", _import_ms, configure_ms)
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the configured SQLITE_PRAGMAS to a new connection"""
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+def preload(application):
+    """Import heavy modules and compile templates ahead of forking.
+
+    Run once in the server master (gunicorn ``preload_app``) so every worker
+    shares these pages copy-on-write instead of building its own copy.
+    Raises AssetsNotVendored, so the server does not start, while the
+    front-end assets would come from a CDN (unless ALLOW_CDN_ASSETS).
+    """
+    import gc
+    import importlib
+    if not application.config['ALLOW_CDN_ASSETS']:
+        import assets
+        assets.check_vendored(application.static_folder)  # an air-gapped server must not depend on a CDN
+    for module in application.config['PRELOAD_MODULES']:
+        importlib.import_module(module)
+    for template in application.jinja_env.list_templates():
+        application.jinja_env.get_template(template)
+    init_db()
+    with application.app_context():
+        db.engine.dispose()
+    # Keep the preloaded objects out of the collector so it doesn't dirty shared pages
+    gc.freeze()
+    return application
 
 # Database Models
 class Seller(db.Model):
@@ -42,6 +102,7 @@ class Seller(db.Model):
     unique_code = db.Column(db.String(6), unique=True, nullable=False)
     profile_icon = db.Column(db.String(50), default='fa-user')
     profile_photo = db.Column(db.String(200), nullable=True)
+    deleted_at = db.Column(db.DateTime, nullable=True)  # account closed; collect_deletions removes it
 
 class CSVUpload(db.Model):
     __tablename__ = 'csv_uploads'
@@ -53,34 +114,436 @@ class CSVUpload(db.Model):
     filepath = db.Column(db.String(500), nullable=False)
     upload_date = db.Column(db.DateTime, default=db.func.current_timestamp())
     row_count = db.Column(db.Integer, default=0)
+    content_hash = db.Column(db.String(64), nullable=True)  # SHA-256 of the file, see storage.py
+
+    # Keep in step with the indexes created in migrations.py
+    __table_args__ = (
+        db.Index('ix_csv_uploads_seller_date', seller_id, upload_date.desc(), id.desc()),
+        db.Index('ix_csv_uploads_filename', filename),
+        db.Index('ix_csv_uploads_content_hash', content_hash),
+        db.Index('ix_csv_uploads_filepath', filepath),
+    )
+
+class Order(db.Model):
+    """One order per (seller, order_id), merged from every upload that contains it"""
+    __tablename__ = 'orders'
+    id = db.Column(db.Integer, primary_key=True)
+    seller_id = db.Column(db.Integer, nullable=False)
+    order_id = db.Column(db.String(64), nullable=False)
+    order_date = db.Column(db.Date, nullable=True)
+    catalogue_id = db.Column(db.String(64))
+    sku_description = db.Column(db.String(200))
+    item_price = db.Column(db.Float, default=0)
+    quantity = db.Column(db.Integer, default=0)
+    order_price = db.Column(db.Float, default=0)
+    order_status = db.Column(db.String(32))
+    return_type = db.Column(db.String(64))
+    return_cost = db.Column(db.Float, default=0)
+    return_reason = db.Column(db.String(200))
+    row_hash = db.Column(db.String(40), nullable=False)  # detects changed rows on re-export
+    upload_id = db.Column(db.Integer)  # upload that last changed the row
+
+    # Keep in step with the indexes created in migrations.py
+    __table_args__ = (
+        db.UniqueConstraint('seller_id', 'order_id', name='uq_orders_seller_order'),
+        db.Index('ix_orders_seller_date', seller_id, order_date),
+        db.Index('ix_orders_upload_id', upload_id),
+    )
+
+class RetiredFile(db.Model):
+    """A file no longer referenced, deleted by purge_retired_files after its grace period"""
+    __tablename__ = 'retired_files'
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(500), nullable=False, index=True)
+    purge_after = db.Column(db.Float, nullable=False)  # Unix time
+
+class PendingDeletion(db.Model):
+    """An upload or account marked deleted, removed in bulk by collect_deletions"""
+    __tablename__ = 'pending_deletions'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(16), nullable=False)  # 'upload' or 'seller'
+    target_id = db.Column(db.Integer, nullable=False)
+    seller_id = db.Column(db.Integer, nullable=False)
+    requested_at = db.Column(db.Float, nullable=False)  # Unix time
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+class OrderMergeState(db.Model):
+    """Per-seller high-water mark: every upload up to merged_upload_id is in ``orders``"""
+    __tablename__ = 'order_merge_state'
+    seller_id = db.Column(db.Integer, primary_key=True)
+    merged_upload_id = db.Column(db.Integer, nullable=False, default=0)
+    merged_at = db.Column(db.DateTime, default=db.func.current_timestamp())
 
 # Function to get upload statistics by date
+def upload_stats_query(seller_id):
+    return db.session.query(func.date(CSVUpload.upload_date), func.count(CSVUpload.id)) \
+        .filter(CSVUpload.seller_id == seller_id) \
+        .group_by(func.date(CSVUpload.upload_date))
+
 def get_upload_stats_by_date(seller_id):
     """Get CSV upload counts grouped by date for a seller"""
-    uploads = CSVUpload.query.filter_by(seller_id=seller_id).all()
-    date_counts = {}
-    for upload in uploads:
-        date_key = upload.upload_date.strftime('%Y-%m-%d')
-        if date_key in date_counts:
-            date_counts[date_key] += 1
+    return {date_key: count for date_key, count in upload_stats_query(seller_id).all()}
+
+# Request-scoped data access
+UPLOAD_COLUMNS = (CSVUpload.id, CSVUpload.filename, CSVUpload.original_name,
+                  CSVUpload.upload_date, CSVUpload.row_count, CSVUpload.filepath, CSVUpload.content_hash)
+
+def newest_first(query):
+    return query.order_by(CSVUpload.upload_date.desc(), CSVUpload.id.desc())
+
+def upload_row_to_dict(row):
+    return {
+        'id': row.id,
+        'filename': row.filename,
+        'original_name': row.original_name,
+        'upload_date': row.upload_date.strftime('%Y-%m-%d %H:%M:%S'),
+        'row_count': row.row_count,
+        'filepath': row.filepath,
+        'content_hash': row.content_hash
+    }
+
+def relative_to_upload(upload_id):
+    """Keyset filters (newer, older) for uploads around ``upload_id`` in newest-first order.
+
+    The anchor's upload_date is read in SQL rather than bound as a parameter,
+    so comparisons see exactly the stored value.
+    """
+    anchor = aliased(CSVUpload)
+    anchor_date = select(anchor.upload_date).where(anchor.id == upload_id).scalar_subquery()
+    newer = or_(CSVUpload.upload_date > anchor_date,
+                and_(CSVUpload.upload_date == anchor_date, CSVUpload.id > upload_id))
+    older = or_(CSVUpload.upload_date < anchor_date,
+                and_(CSVUpload.upload_date == anchor_date, CSVUpload.id < upload_id))
+    return newer, older
+
+def older_than_cursor(cursor):
+    """Keyset filter for uploads after ``cursor`` (the last id of the previous page)"""
+    try:
+        upload_id = int(cursor)
+    except ValueError:
+        abort(400, 'Invalid cursor')
+    return relative_to_upload(upload_id)[1]
+
+def upload_page_query(seller_id, cursor=None, search=None):
+    """A seller's uploads newest first, after ``cursor`` and matching ``search``"""
+    query = db.session.query(*UPLOAD_COLUMNS).filter(CSVUpload.seller_id == seller_id)
+    if cursor:
+        query = query.filter(older_than_cursor(cursor))
+    if search:
+        escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(CSVUpload.original_name.ilike(f'%{escaped}%', escape='\\'))
+    return newest_first(query)
+
+def get_upload_page(seller_id, cursor=None, limit=None, search=None):
+    """One keyset page of a seller's uploads, newest first.
+
+    Returns (uploads, next_cursor); next_cursor is None on the last page.
+    """
+    limit = limit or app.config['UPLOAD_PAGE_SIZE']
+    rows = upload_page_query(seller_id, cursor, search).limit(limit + 1).all()
+    next_cursor = str(rows[limit - 1].id) if len(rows) > limit else None
+    return [upload_row_to_dict(row) for row in rows[:limit]], next_cursor
+
+class SellerContext:
+    """A seller and the first page of their uploads (newest first), loaded once per request.
+
+    Uploads are plain dicts in the same shape get_all_uploads has always
+    returned. ``find`` looks one up by id or file path, falling back to a
+    single keyed query for uploads older than the first page, and
+    ``navigation`` answers position/total/prev/next with one query, so the
+    cost of a page no longer grows with the seller's upload count.
+    """
+    def __init__(self, seller, rows, page_size):
+        self.seller = seller
+        self.uploads = [upload_row_to_dict(row) for row in rows[:page_size]]
+        self.has_more = len(rows) > page_size
+        self._by_id = {upload['id']: idx for idx, upload in enumerate(self.uploads)}
+        self._by_path = {}
+        for idx, upload in enumerate(self.uploads):
+            self._by_path.setdefault(upload['filepath'], idx)
+        self._navigation = {}
+        self._csv_paths = None
+
+    @property
+    def next_cursor(self):
+        """Cursor for the page after ``uploads``, or None if there is none"""
+        return str(self.uploads[-1]['id']) if self.has_more else None
+
+    def find(self, upload_id=None, filepath=None):
+        """Return (index, upload) for an upload id or path, or (0, None)"""
+        idx = self._by_id.get(upload_id) if upload_id is not None else self._by_path.get(filepath)
+        if idx is not None:
+            return idx, self.uploads[idx]
+        if self.seller is None or not self.has_more:
+            return 0, None
+
+        query = db.session.query(*UPLOAD_COLUMNS).filter(CSVUpload.seller_id == self.seller.id)
+        if upload_id is not None:
+            query = query.filter(CSVUpload.id == upload_id)
+        else:
+            query = query.filter(CSVUpload.filepath == filepath)
+        row = newest_first(query).first()
+        if row is None:
+            return 0, None
+        upload = upload_row_to_dict(row)
+        return self.navigation(upload)['position'], upload
+
+    def navigation(self, upload):
+        """Position, total and neighbouring upload ids for prev/next controls"""
+        key = upload['id'] if upload else None
+        if key in self._navigation:
+            return self._navigation[key]
+        if upload is None or self.seller is None:
+            total = len(self.uploads)
+            if self.has_more:
+                total = db.session.query(func.count(CSVUpload.id)).filter(CSVUpload.seller_id == self.seller.id).scalar()
+            nav = {'total': total, 'position': 0, 'older_id': None, 'newer_id': None, 'current': None}
         else:
-            date_counts[date_key] = 1
-    return date_counts
+            row = db.session.execute(navigation_query(self.seller.id, upload['id'])).one()
+            nav = {'total': row[0], 'position': row[1], 'older_id': row[2], 'newer_id': row[3], 'current': upload}
+        self._navigation[key] = nav
+        return nav
+
+    def csv_paths(self):
+        """File paths of every upload still on disk, one per distinct content"""
+        if self._csv_paths is None:
+            self._csv_paths = []
+            if self.seller is not None:
+                rows = newest_first(db.session.query(CSVUpload.filepath, CSVUpload.content_hash)
+                                    .filter(CSVUpload.seller_id == self.seller.id)).all()
+                seen = set()
+                for row in rows:
+                    key = row.content_hash or row.filepath
+                    if key not in seen and os.path.exists(row.filepath):
+                        seen.add(key)
+                        self._csv_paths.append(row.filepath)
+        return self._csv_paths
+
+def navigation_query(seller_id, upload_id):
+    """Total, position and the older/newer neighbour ids of an upload, as one row"""
+    mine = CSVUpload.seller_id == seller_id
+    newer, older = relative_to_upload(upload_id)
+    return select(
+        select(func.count(CSVUpload.id)).where(mine).scalar_subquery(),
+        select(func.count(CSVUpload.id)).where(mine, newer).scalar_subquery(),
+        select(CSVUpload.id).where(mine, older)
+            .order_by(CSVUpload.upload_date.desc(), CSVUpload.id.desc()).limit(1).scalar_subquery(),
+        select(CSVUpload.id).where(mine, newer)
+            .order_by(CSVUpload.upload_date.asc(), CSVUpload.id.asc()).limit(1).scalar_subquery()
+    )
+
+def seller_context_query(seller_id, page_size):
+    """An open account joined to its newest ``page_size`` + 1 uploads (one row, uploads NULL, if it has none)"""
+    return newest_first(
+        db.session.query(Seller, *UPLOAD_COLUMNS)
+        .outerjoin(CSVUpload, CSVUpload.seller_id == Seller.id)
+        .filter(Seller.id == seller_id, Seller.deleted_at.is_(None))
+    ).limit(page_size + 1)
+
+def load_seller_context(seller_id):
+    """Load a seller and their first page of uploads in a single query, cached on ``g``"""
+    cache = g.setdefault('seller_contexts', {})
+    metrics.inc(metrics.CACHE_REQUESTS, cache='seller_context', result='hit' if seller_id in cache else 'miss')
+    if seller_id not in cache:
+        page_size = app.config['UPLOAD_PAGE_SIZE']
+        rows = seller_context_query(seller_id, page_size).all()
+        seller = rows[0][0] if rows else None
+        if seller is None and seller_id is not None and has_request_context() and session.get('seller_id') == seller_id:
+            session.clear()  # the account was closed, maybe from another session; sign this one out
+        cache[seller_id] = SellerContext(seller, [row for row in rows if row.id is not None], page_size)
+    return cache[seller_id]
+
+def invalidate_seller_context(seller_id):
+    """Drop the cached context after the seller's uploads change"""
+    g.pop('seller_contexts', {}).pop(seller_id, None)
+
+def current_seller_context():
+    return load_seller_context(session.get('seller_id'))
+
+def current_seller():
+    return current_seller_context().seller
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def time_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    metrics.observe(metrics.STAGE_SECONDS, seconds, stage='db_query')
+    slow_seconds = app.config.get('SLOW_QUERY_MS', 0) / 1000
+    if has_request_context():
+        querylog.record(statement, parameters, executemany, seconds, slow_seconds,
+                        g.setdefault('query_fingerprints', {}), request.endpoint or request.path)
+    else:
+        querylog.record(statement, parameters, executemany, seconds, slow_seconds)
+
+@event.listens_for(Engine, 'handle_error')
+def drop_query_timer(context):
+    """A failed statement never reaches after_cursor_execute; forget its start time"""
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+@event.listens_for(Engine, 'handle_error')
+def count_lock_errors(context):
+    """Count statements that gave up waiting for SQLite's write lock"""
+    if 'database is locked' in str(context.original_exception):
+        metrics.inc(metrics.ERRORS, where='db_locked')
+
+@app.after_request
+def add_query_count_header(response):
+    """Expose how many SQL statements served this request"""
+    response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+    return response
+
+@app.after_request
+def detect_n_plus_one(response):
+    """Log statements this request repeated enough times to look like a query per loop iteration"""
+    querylog.check_request(g.get('query_fingerprints'), app.config['N_PLUS_ONE_THRESHOLD'],
+                           request.endpoint or request.path)
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    """Latency per endpoint; registered early so it runs after the other after_request hooks"""
+    if metrics.enabled and 'request_started' in g:
+        metrics.observe(metrics.REQUEST_SECONDS, time.perf_counter() - g.request_started,
+                        endpoint=request.endpoint or 'unmatched', method=request.method,
+                        status=str(response.status_code))
+        metrics.flush()
+    return response
+
+@app.before_request
+def start_profiler():
+    """Run this request under cProfile if it carries the operator's profiling token"""
+    token = app.config['PROFILING_TOKEN']
+    if not (app.config['PROFILING_ENABLED'] and token):
+        return
+    # Header only: a query parameter would leave the token in access logs and Referer headers
+    offered = request.headers.get(profiling.PROFILE_HEADER)
+    if offered and hmac.compare_digest(offered.encode(), token.encode()):
+        profiler = profiling.start()
+        if profiler is not None:  # None: another profile is already running on this thread
+            metrics.start_trace()
+            g.profiler = profiler
+
+@app.after_request
+def save_profile(response):
+    """Stop a requested profile and save it with the upload it analysed and the timings"""
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    meta = {
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'path': request.path,
+        'args': request.args.to_dict(),
+        'status': response.status_code,
+        'duration_ms': round((time.perf_counter() - g.request_started) * 1000, 1),
+        'query_count': g.get('query_count', 0),
+        'stages_ms': {stage: round(seconds * 1000, 1) for stage, seconds in metrics.stop_trace().items()},
+        'seller_id': session.get('seller_id'),
+        'upload_id': None,
+        'row_count': None,
+    }
+    upload_id = request.args.get('upload_id', type=int) or session.get('selected_upload_id')
+    upload = db.session.get(CSVUpload, upload_id) if upload_id else None
+    if upload is not None and upload.seller_id == meta['seller_id']:
+        meta.update(upload_id=upload.id, row_count=upload.row_count)
+    response.headers['X-Profile-Id'] = profiling.save(profiler, app.config['PROFILE_FOLDER'], meta,
+                                                      keep=app.config['PROFILE_KEEP'])
+    return response
+
+@app.teardown_request
+def stop_profiler(exc):
+    """Never leave a profiler or stage trace on this worker thread when save_profile did not run"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        metrics.stop_trace()
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def record_render_time(sender, template, context, **extra):
+    if 'render_started' in g:
+        metrics.observe(metrics.STAGE_SECONDS, time.perf_counter() - g.pop('render_started'), stage='template_render')
+
+@app.errorhandler(passwords.HashingBusy)
+def password_hashing_busy(e):
+    """Sign-in burst beyond PASSWORD_HASH_QUEUE: ask the seller to retry rather than queue every thread"""
+    flash(str(e), 'warning')
+    template = {'seller_register': 'seller_register.html',
+                'seller_reset_password': 'seller_reset_password.html'}.get(request.endpoint, 'seller_login.html')
+    response = app.make_response((render_template(template), 503))
+    response.headers['Retry-After'] = '5'
+    return response
+
+@app.errorhandler(memory.MemoryBudgetExceeded)
+def analytics_over_budget(e):
+    """An upload too large for ANALYTICS_MEMORY_BUDGET_MB: explain instead of risking the worker"""
+    return render_template('memory_budget.html', message=str(e)), 503
+
+@app.errorhandler(MemoryError)
+def out_of_memory(e):
+    """An allocation hit WORKER_MEMORY_LIMIT_MB; the worker survives and the request fails"""
+    app.logger.exception("Out of memory serving %s", request.path)
+    metrics.inc(metrics.ERRORS, where='memory_error')
+    return render_template('memory_budget.html',
+                           message='The server ran out of memory preparing this report. Try a smaller export.'), 503
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target, answered only to requests bearing METRICS_TOKEN"""
+    # Behind a same-host proxy every request comes from 127.0.0.1, so the address proves nothing
+    token = app.config['METRICS_TOKEN']
+    offered = request.headers.get('Authorization', '')
+    if not (app.config['METRICS_ENABLED'] and token
+            and hmac.compare_digest(offered.encode(), f'Bearer {token}'.encode())):
+        abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 def get_all_uploads(seller_id):
     """Get all CSV uploads for a seller"""
-    uploads = CSVUpload.query.filter_by(seller_id=seller_id).order_by(CSVUpload.upload_date.desc()).all()
-    upload_list = []
-    for upload in uploads:
-        upload_list.append({
-            'id': upload.id,
-            'filename': upload.filename,
-            'original_name': upload.original_name,
-            'upload_date': upload.upload_date.strftime('%Y-%m-%d %H:%M:%S'),
-            'row_count': upload.row_count,
-            'filepath': upload.filepath
-        })
-    return upload_list
+    return load_seller_context(seller_id).uploads
+
+def select_upload(context, upload_id=None):
+    """Pick the upload to analyse: the requested one, the session's, or the latest on disk.
+
+    Returns (current_index, selected_upload, csv_path).
+    """
+    if upload_id:
+        current_index, selected_upload = context.find(upload_id=upload_id)
+        csv_path = selected_upload['filepath'] if selected_upload else None
+        if selected_upload:
+            session['selected_csv_path'] = csv_path
+            session['selected_upload_id'] = selected_upload['id']
+        return current_index, selected_upload, csv_path
+
+    # Check session for selected file first
+    csv_path = session.get('selected_csv_path')
+    if csv_path and os.path.exists(csv_path):
+        current_index, selected_upload = context.find(filepath=csv_path)
+        return current_index, selected_upload, csv_path
+
+    # Get latest upload
+    for idx, upload in enumerate(context.uploads):
+        if os.path.exists(upload['filepath']):
+            return idx, upload, upload['filepath']
+    return 0, None, csv_path
 
 def get_upload_as_dict(upload_id):
     """Get a single CSV upload as a dictionary with formatted date"""
@@ -98,7 +561,10 @@ def get_upload_as_dict(upload_id):
 
 # Helper function to check allowed file extension
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    if '.' not in filename:
+        return False
+    ext = filename.rsplit('.', 1)[1].lower()
+    return ext in ALLOWED_EXTENSIONS or ext in COMPRESSED_EXTENSIONS
 
 # Password validation function
 def validate_password(password):
@@ -114,17 +580,70 @@ def validate_password(password):
         return False, "Password must contain at least one special character"
     return True, "Password is valid"
 
-# Function to generate unique 6-digit code
+# Seller codes: 6 digits, never starting with 0. They prove identity in the
+# password reset, so they are drawn with the system CSPRNG.
+UNIQUE_CODES = range(100000, 1000000)
+UNIQUE_CODE_CANDIDATES = 8  # codes checked per query when registering one seller
+UNUSABLE_PASSWORD = '!'  # matches no password; onboarded sellers set theirs via the reset flow
+
 def generate_unique_code():
+    rng = random.SystemRandom()
     while True:
-        code = ''.join(random.choices(string.digits, k=6))
-        # Ensure the code doesn't start with 0 (optional, but common practice)
-        if code[0] == '0':
+        candidates = {str(rng.choice(UNIQUE_CODES)) for _ in range(UNIQUE_CODE_CANDIDATES)}
+        taken = {code for (code,) in db.session.query(Seller.unique_code).filter(Seller.unique_code.in_(candidates))}
+        free = candidates - taken
+        if free:
+            return free.pop()
+
+def allocate_unique_codes(count):
+    """``count`` distinct codes no seller holds, sampled from the whole free pool in one pass"""
+    used = {code for (code,) in db.session.query(Seller.unique_code).filter(Seller.unique_code != None)}
+    free = [code for code in map(str, UNIQUE_CODES) if code not in used]
+    if count > len(free):
+        raise ValueError(f"Only {len(free)} seller codes are left; cannot allocate {count}")
+    return random.SystemRandom().sample(free, count)
+
+@metrics.timed_job('onboard_sellers')
+def onboard_sellers(records, batch_size=5000):
+    """Create sellers from feed records (name, store_name, email) in batched transactions.
+
+    Records whose email is already registered, repeated or incomplete are
+    skipped. Codes for the whole feed are allocated up front; a batch that
+    collides with a concurrent registration is retried once with fresh codes.
+    Returns (created, skipped); ``created`` lists (email, store_name, code).
+    """
+    from sqlalchemy import insert
+    from sqlalchemy.exc import IntegrityError
+    rows, seen, skipped = [], set(), 0
+    for record in records:
+        row = {field: (record.get(field) or '').strip() for field in ('name', 'store_name', 'email')}
+        if not all(row.values()) or row['email'] in seen:
+            skipped += 1
             continue
-        # Check if code already exists (only check non-null values)
-        existing = Seller.query.filter(Seller.unique_code != None, Seller.unique_code == code).first()
-        if not existing:
-            return code
+        seen.add(row['email'])
+        rows.append(row)
+    codes = iter(allocate_unique_codes(len(rows)))
+    created = []
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        for attempt in range(2):
+            existing = {email for (email,) in db.session.query(Seller.email)
+                        .filter(Seller.email.in_([row['email'] for row in batch]))}
+            new = [row for row in batch if row['email'] not in existing]
+            batch_codes = [next(codes) for _ in new] if attempt == 0 else allocate_unique_codes(len(new))
+            values = [dict(row, password=UNUSABLE_PASSWORD, unique_code=code) for row, code in zip(new, batch_codes)]
+            try:
+                if values:
+                    db.session.execute(insert(Seller.__table__), values)
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    raise
+        skipped += len(batch) - len(values)
+        created.extend((row['email'], row['store_name'], row['unique_code']) for row in values)
+    return created, skipped
 
 # Login required decorators
 def login_required(f):
@@ -138,268 +657,138 @@ def login_required(f):
 def seller_login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'seller_id' not in session:
+        if 'seller_id' not in session or current_seller() is None:
             return redirect(url_for('seller_login'))
         return f(*args, **kwargs)
     return decorated_function
 
 # CSV Processing Functions
-def format_day(day):
-    if 11 <= day <= 13:
-        return f"{day}th"
-    elif day % 10 == 1:
-        return f"{day}st"
-    elif day % 10 == 2:
-        return f"{day}nd"
-    elif day % 10 == 3:
-        return f"{day}rd"
-    else:
-        return f"{day}th"
-
 def get_latest_uploaded_file(seller_id):
-    upload = CSVUpload.query.filter_by(seller_id=seller_id).order_by(CSVUpload.upload_date.desc()).first()
-    if upload:
-        return upload.filepath
+    uploads = load_seller_context(seller_id).uploads
+    if uploads:
+        return uploads[0]['filepath']
     return None
 
+def known_filenames_query(filenames):
+    return db.session.query(CSVUpload.filename).filter(CSVUpload.filename.in_(filenames))
+
+@metrics.timed_job('scan_uploads')
 def scan_uploads_folder(seller_id):
     """Scan uploads folder and add any missing files to the database"""
     import glob
     upload_folder = app.config['UPLOAD_FOLDER']
     pattern = os.path.join(upload_folder, '*_[0-9]*.csv')
     
-    added_count = 0
-    for filepath in glob.glob(pattern):
-        filename = os.path.basename(filepath)
-        # Check if already in database
-        existing = CSVUpload.query.filter_by(filename=filename).first()
-        if not existing:
-            # Count rows and add to database
-            try:
-                df = pd.read_csv(filepath)
-                row_count = len(df)
-            except:
-                row_count = 0
-            
-            upload = CSVUpload(
-                seller_id=seller_id,
-                filename=filename,
-                original_name=filename,
-                filepath=filepath,
-                row_count=row_count
-            )
-            db.session.add(upload)
-            added_count += 1
+    filepaths = glob.glob(pattern)
+    # Check which files are already in the database with a single query
+    filenames = [os.path.basename(filepath) for filepath in filepaths]
+    known = {row.filename for row in known_filenames_query(filenames)} if filenames else set()
+    if len(known) < len(filenames):
+        # Deleted uploads stay on disk until purged; don't register them again
+        unknown = [filepath for filepath, filename in zip(filepaths, filenames) if filename not in known]
+        known.update(os.path.basename(row.path) for row in
+                     db.session.query(RetiredFile.path).filter(RetiredFile.path.in_(unknown)))
+    
+    # Count rows before writing anything, then insert in short transactions
+    # so other workers are never kept waiting on the write lock for long
+    missing = []
+    for filepath, filename in zip(filepaths, filenames):
+        if filename not in known:
+            import analytics
+            import storage
+            missing.append(CSVUpload(seller_id=seller_id, filename=filename, original_name=filename,
+                                     filepath=filepath, row_count=analytics.count_rows(filepath),
+                                     content_hash=storage.hash_file(filepath)))
+    batch_size = app.config['INGEST_BATCH_SIZE']
+    for start in range(0, len(missing), batch_size):
+        db.session.add_all(missing[start:start + batch_size])
+        db.session.commit()
     
-    if added_count > 0:
+    if missing:
+        invalidate_seller_context(seller_id)
+        schedule_merge(seller_id)
+    return len(missing)
+
+def order_upsert():
+    """INSERT ... ON CONFLICT (seller_id, order_id) DO UPDATE, only when the row changed"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(Order.__table__)
+    changed = {column: stmt.excluded[column] for column in ORDER_MERGE_COLUMNS}
+    return stmt.on_conflict_do_update(index_elements=['seller_id', 'order_id'], set_=changed,
+                                      where=stmt.table.c.row_hash != stmt.excluded.row_hash)
+
+ORDER_MERGE_COLUMNS = ('order_date', 'catalogue_id', 'sku_description', 'item_price', 'quantity',
+                       'order_price', 'order_status', 'return_type', 'return_cost', 'return_reason',
+                       'row_hash', 'upload_id')
+
+@metrics.timed_job('merge_orders')
+def merge_seller_orders(seller_id):
+    """Upsert orders from the seller's uploads newer than their high-water mark.
+
+    Uploads are merged oldest first, so the latest export of an order wins
+    (e.g. delivered -> returned). Rows whose contents are unchanged are
+    skipped by the upsert, and each chunk commits on its own so the write
+    lock is held briefly. Requests run it through schedule_merge, after the
+    response. Returns the number of rows inserted or changed.
+    """
+    state = db.session.get(OrderMergeState, seller_id)
+    high_water = state.merged_upload_id if state else 0
+    pending = db.session.query(CSVUpload.id, CSVUpload.filepath) \
+        .filter(CSVUpload.seller_id == seller_id, CSVUpload.id > high_water) \
+        .order_by(CSVUpload.id).all()
+    if not pending:
+        return 0
+
+    import analytics
+    import storage
+    statement = order_upsert()
+    changed = 0
+    for upload in pending:
+        path = storage.resolve_legacy_path(upload.filepath)
+        if path:
+            for records in analytics.iter_order_records(path):
+                for record in records:
+                    record.update(seller_id=seller_id, upload_id=upload.id)
+                changed += max(db.session.connection().execute(statement, records).rowcount, 0)
+                db.session.commit()
+        state = db.session.get(OrderMergeState, seller_id) or OrderMergeState(seller_id=seller_id)
+        state.merged_upload_id = upload.id
+        state.merged_at = func.current_timestamp()
+        db.session.add(state)
         db.session.commit()
-    return added_count
+    return changed
 
-def calculate_dashboard_metrics(csv_path):
-    try:
-        df = pd.read_csv(csv_path)
-        
-        total_orders = len(df)
-        total_returns = (df["order_status"] == "returned").sum() if "order_status" in df.columns else 0
-        return_percent = round((total_returns / total_orders) * 100, 2) if total_orders > 0 else 0
-        
-        net_sales = df['order_price'].sum() if 'order_price' in df.columns else 0
-        return_cost = df['return_cost'].sum() if 'return_cost' in df.columns else 0
-        net_profit = net_sales - return_cost
-        
-        # Line chart data
-        if 'order_date' in df.columns:
-            daily_sales = df.groupby("order_date").agg(
-                total_amount=("order_price", "sum"),
-                order_count=("order_price", "count")
-            ).reset_index()
-            
-            # Keep original dates for tooltip
-            chart_dates = daily_sales["order_date"].tolist()
-            # Create display labels (formatted dates)
-            chart_display_dates = daily_sales["order_date"].apply(
-                lambda x: format_day(int(x.split("-")[0])) if isinstance(x, str) and "-" in str(x) else str(x)
-            ).tolist()
-            chart_amounts = daily_sales["total_amount"].tolist()
-            chart_order_counts = daily_sales["order_count"].tolist()
-        else:
-            chart_dates = []
-            chart_display_dates = []
-            chart_amounts = []
-            chart_order_counts = []
-        
-        # Pie chart data (Return Reasons)
-        pie_labels = []
-        pie_values = []
-        if "order_status" in df.columns and "return_reason" in df.columns:
-            returned_df = df[df["order_status"] == "returned"]
-            if len(returned_df) > 0:
-                reason_counts = returned_df["return_reason"].value_counts().reset_index()
-                reason_counts.columns = ["return_reason", "count"]
-                pie_labels = reason_counts["return_reason"].tolist()
-                pie_values = reason_counts["count"].tolist()
-        
-        # Bar chart data (Top Catalogues)
-        catalogue_labels = []
-        catalogue_values = []
-        if "catalogue_id" in df.columns and "order_status" in df.columns:
-            returned_df = df[df["order_status"] == "returned"]
-            if len(returned_df) > 0:
-                top_catalogues = returned_df.groupby('catalogue_id').agg(
-                    return_count=('order_id', "count")
-                ).reset_index().sort_values('return_count', ascending=False).head(5)
-                catalogue_labels = top_catalogues["catalogue_id"].astype(str).tolist()
-                catalogue_values = top_catalogues["return_count"].tolist()
-        
-        # Bar chart data (Top SKUs)
-        sku_labels = []
-        sku_values = []
-        if "sku_description" in df.columns and "order_status" in df.columns:
-            returned_df = df[df["order_status"] == "returned"]
-            if len(returned_df) > 0:
-                top_skus = returned_df.groupby("sku_description").agg(
-                    return_count=("order_id", "count")
-                ).reset_index().sort_values("return_count", ascending=False).head(5)
-                sku_labels = top_skus["sku_description"].tolist()
-                sku_values = top_skus["return_count"].tolist()
-        
-        # Category Analysis (for catalogue page)
-        categories = []
-        top_categories = []
-        top_by_orders = []
-        category_insights = {"warnings": [], "dangers": [], "successes": [], "recommendations": [], "actions": []}
-        
-        # Check for category column first, then catalogue_id
-        if "category" in df.columns:
-            cat_col = "category"
-        elif "catalogue_id" in df.columns:
-            # Create a mapping from catalogue_id to category name
-            catalogue_mapping = {
-                362950628: "Men's Kurtas",
-                685582861: "Women's Sarees",
-                334760738: "Men's Shirts",
-                868820204: "Women's Dresses",
-                969119330: "Kids Wear",
-                266944844: "Accessories",
-                485451171: "Footwear",
-                675770529: "Bags",
-                774996843: "Jewelry",
-                149203558: "Watches",
-                586845604: "Electronics",
-                386665249: "Home Decor",
-                362863730: "Beauty Products",
-                924970419: "Sports Gear",
-                171069472: "Kitchenware",
-                636045484: "Furniture",
-                364814270: "Toys",
-                726563708: "Books",
-                197613238: "Food Items",
-                # Default for unmapped IDs
-            }
-            df['category'] = df['catalogue_id'].apply(lambda x: catalogue_mapping.get(x, f"Category {x}"))
-            cat_col = "category"
-        else:
-            cat_col = None
-        
-        if cat_col and len(df) > 0:
-            # Group by category
-            category_stats = df.groupby(cat_col).agg(
-                revenue=('order_price', 'sum'),
-                orders=('order_id', 'count'),
-                returns=('order_status', lambda x: (x == 'returned').sum()),
-                return_cost=('return_cost', 'sum'),
-                profit_margin=('order_price', lambda x: (x.sum() - df.loc[x.index, 'return_cost'].sum()) / x.sum() * 100 if x.sum() > 0 else 0)
-            ).reset_index()
-            
-            category_stats.columns = ['name', 'revenue', 'orders', 'returns', 'return_cost', 'profit_margin']
-            category_stats['return_rate'] = (category_stats['returns'] / category_stats['orders'] * 100).round(2)
-            category_stats['avg_order_value'] = (category_stats['revenue'] / category_stats['orders']).round(2)
-            
-            # Calculate performance score (higher is better)
-            category_stats['performance_score'] = (
-                (category_stats['revenue'] / category_stats['revenue'].max() * 30) +
-                (100 - category_stats['return_rate']) * 0.4 +
-                (category_stats['profit_margin'].clip(0, 50) / 50 * 30)
-            ).round(0)
-            
-            categories = category_stats.to_dict('records')
-            top_categories = sorted(categories, key=lambda x: x['revenue'], reverse=True)[:5]
-            top_by_orders = sorted(categories, key=lambda x: x['orders'], reverse=True)[:5]
-            
-            # Generate insights
-            for cat in categories:
-                if cat['return_rate'] > 15:
-                    category_insights['dangers'].append(f"{cat['name']} has a high return rate of {cat['return_rate']}%. Consider reviewing product quality or descriptions.")
-                elif cat['return_rate'] > 10:
-                    category_insights['warnings'].append(f"{cat['name']} return rate is at {cat['return_rate']}%. Monitor closely.")
-                
-                if cat['performance_score'] > 70:
-                    category_insights['successes'].append(f"{cat['name']} is performing excellently with a {cat['performance_score']}% score.")
-                
-                if cat['profit_margin'] < 10:
-                    category_insights['warnings'].append(f"{cat['name']} has low profit margin of {cat['profit_margin']}%. Consider optimizing costs.")
-            
-            # Add recommendations
-            if category_insights['dangers']:
-                category_insights['recommendations'].append("Focus on categories with high return rates first - consider quality control and better product descriptions.")
-            if top_categories:
-                best_cat = top_categories[0]
-                category_insights['recommendations'].append(f"{best_cat['name']} is your top performer - consider expanding this category.")
-            
-            # Add action items
-            category_insights['actions'] = [
-                {"title": "Review High Return Categories", "description": "Investigate root causes of returns in categories with >10% return rate."},
-                {"title": "Optimize Pricing", "description": "Consider adjusting prices in low margin categories to improve profitability."},
-                {"title": "Expand Successful Categories", "description": "Invest more in top-performing categories to maximize revenue."},
-                {"title": "Improve Descriptions", "description": "Add detailed product descriptions to reduce return rates."}
-            ]
-        
-        return {
-            "total_orders": total_orders,
-            "total_returns": total_returns,
-            "return_percent": return_percent,
-            "net_sales": net_sales,
-            "return_cost": return_cost,
-            "net_profit": net_profit,
-            "chart_dates": chart_dates,
-            "chart_display_dates": chart_display_dates,
-            "chart_amounts": chart_amounts,
-            "chart_order_counts": chart_order_counts,
-            "pie_labels": pie_labels,
-            "pie_values": pie_values,
-            "catalogue_labels": catalogue_labels,
-            "catalogue_values": catalogue_values,
-            "sku_labels": sku_labels,
-            "sku_values": sku_values,
-            "categories": categories,
-            "top_categories": top_categories,
-            "top_by_orders": top_by_orders,
-            "insights": category_insights
-        }
-    except Exception as e:
-        print(f"Error processing CSV: {e}")
-        return {
-            "total_orders": 0,
-            "total_returns": 0,
-            "return_percent": 0,
-            "net_sales": 0,
-            "return_cost": 0,
-            "net_profit": 0,
-            "chart_dates": [],
-            "chart_display_dates": [],
-            "chart_amounts": [],
-            "chart_order_counts": [],
-            "pie_labels": [],
-            "pie_values": [],
-            "catalogue_labels": [],
-            "catalogue_values": [],
-            "sku_labels": [],
-            "sku_values": [],
-            "categories": [],
-            "top_categories": [],
-            "top_by_orders": [],
-            "insights": {"warnings": [], "dangers": [], "successes": [], "recommendations": [], "actions": []}
-        }
+def orders_pending(seller_id):
+    """True if the seller has uploads that are not merged into their orders yet"""
+    high_water = db.session.query(OrderMergeState.merged_upload_id) \
+        .filter(OrderMergeState.seller_id == seller_id).scalar_subquery()
+    return db.session.query(CSVUpload.id).filter(CSVUpload.seller_id == seller_id,
+                                                 CSVUpload.id > func.coalesce(high_water, 0)).first() is not None
+
+_merge_lock = threading.Lock()
+_merges_queued = set()
+
+def schedule_merge(seller_id):
+    """Merge the seller's new uploads into their orders after this response, on the background pool"""
+    with _merge_lock:
+        if seller_id in _merges_queued:
+            return  # the queued merge picks up this upload too
+        _merges_queued.add(seller_id)
+    background_executor().submit(merge_orders_in_background, seller_id)
+
+def merge_orders_in_background(seller_id):
+    with _merge_lock:
+        _merges_queued.discard(seller_id)
+    with app.app_context():
+        try:
+            merge_seller_orders(seller_id)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("Error merging orders for seller %s", seller_id)
+            metrics.inc(metrics.ERRORS, where='merge_orders')
 
 # Routes
 @app.route('/')
@@ -457,50 +846,17 @@ def reprocess_csv(upload_id):
 @app.route('/catalogue')
 @seller_login_required
 def catalogue():
-    seller = Seller.query.get(session.get('seller_id'))
-    
     # Scan uploads folder and add any missing files
     scan_uploads_folder(session.get('seller_id'))
+    seller = current_seller()
     
-    uploads = get_all_uploads(session.get('seller_id'))
-    
-    # Determine which upload to use
-    upload_id = request.args.get('upload_id')
-    selected_upload = None
-    current_index = 0
-    
-    if upload_id:
-        # Find the index of the selected upload
-        for idx, upload in enumerate(uploads):
-            if upload['id'] == int(upload_id):
-                current_index = idx
-                selected_upload = upload
-                break
-        if selected_upload:
-            csv_path = selected_upload['filepath']
-            session['selected_csv_path'] = csv_path
-            session['selected_upload_id'] = selected_upload['id']
-    else:
-        # Check session for selected file first
-        csv_path = session.get('selected_csv_path')
-        if not csv_path or not os.path.exists(csv_path):
-            # Get latest upload
-            for idx, upload in enumerate(uploads):
-                if os.path.exists(upload['filepath']):
-                    current_index = idx
-                    csv_path = upload['filepath']
-                    selected_upload = upload
-                    break
-        else:
-            # Find the index of the current CSV path
-            for idx, upload in enumerate(uploads):
-                if upload['filepath'] == csv_path:
-                    current_index = idx
-                    selected_upload = upload
-                    break
+    context = current_seller_context()
+    uploads = context.uploads
+    current_index, selected_upload, csv_path = select_upload(context, request.args.get('upload_id', type=int))
     
     if csv_path and os.path.exists(csv_path):
-        data = calculate_dashboard_metrics(csv_path)
+        import analytics
+        data = analytics.dashboard_metrics(csv_path, selected_upload and selected_upload['content_hash'])
     else:
         data = {
             "total_orders": 0,
@@ -525,7 +881,7 @@ def catalogue():
             "insights": {"warnings": [], "dangers": [], "successes": [], "recommendations": [], "actions": []}
         }
     
-    return render_template('catalogue.html', name=session.get('seller_name'), data=data, seller=seller, uploads=uploads, selected_upload=selected_upload, current_index=current_index)
+    return render_template('catalogue.html', name=session.get('seller_name'), data=data, seller=seller, uploads=uploads, selected_upload=selected_upload, current_index=current_index, upload_nav=context.navigation(selected_upload), upload_cursor=context.next_cursor)
 
 @app.route('/catalogue/view/<int:upload_id>')
 @seller_login_required
@@ -549,29 +905,23 @@ def catalogue_view_upload(upload_id):
 @app.route('/sku-analysis')
 @seller_login_required
 def sku_analysis():
-    seller = Seller.query.get(session.get('seller_id'))
+    context = current_seller_context()
+    seller = context.seller
     
     # Get all uploads for the seller
-    uploads = get_all_uploads(session.get('seller_id'))
+    uploads = context.uploads
     
     # Initialize variables
     selected_upload = None
     current_index = 0
-    upload = None
     csv_path = None
     
     # Get selected upload or use session's selected file, or default to latest
-    upload_id = request.args.get('upload_id')
+    upload_id = request.args.get('upload_id', type=int)
     if upload_id:
-        upload = CSVUpload.query.get(upload_id)
-        if upload:
-            csv_path = upload.filepath
-            # Find the index of the selected upload
-            for idx, u in enumerate(uploads):
-                if u['id'] == int(upload_id):
-                    current_index = idx
-                    selected_upload = upload
-                    break
+        current_index, selected_upload = context.find(upload_id=upload_id)
+        if selected_upload:
+            csv_path = selected_upload['filepath']
     else:
         # Check session for selected file first
         csv_path = session.get('selected_csv_path')
@@ -580,11 +930,7 @@ def sku_analysis():
         
         # Find the current upload based on CSV path
         if csv_path:
-            for idx, u in enumerate(uploads):
-                if u['filepath'] == csv_path:
-                    current_index = idx
-                    selected_upload = CSVUpload.query.get(u['id'])
-                    break
+            current_index, selected_upload = context.find(filepath=csv_path)
     
     # Check if CSV path is valid
     if not csv_path or not os.path.exists(csv_path):
@@ -642,11 +988,12 @@ def sku_analysis():
             "high_growth_skus": 0,
             "seasonality_index": 0
         }
-        return render_template('sku_analysis.html', name=session.get('seller_name'), data=data, seller=seller, uploads=uploads, selected_upload=selected_upload, current_index=current_index)
+        return render_template('sku_analysis.html', name=session.get('seller_name'), data=data, seller=seller, uploads=uploads, selected_upload=selected_upload, current_index=current_index, upload_cursor=context.next_cursor)
     
     try:
-        df = pd.read_csv(csv_path)
-        data = calculate_dashboard_metrics(csv_path)
+        import analytics
+        content_hash = selected_upload and selected_upload['content_hash']
+        data = analytics.dashboard_metrics(csv_path, content_hash)
         # Add SKU-specific metrics
         data['sku_data'] = True
         data['total_revenue'] = data.get('net_sales', 125000)
@@ -680,54 +1027,12 @@ def sku_analysis():
         data['seasonality_index'] = 1.15
         
         # Add top_skus for individual product analysis from CSV
-        data['top_skus'] = []
-        if 'sku_description' in df.columns:
-            sku_stats = df.groupby('sku_description').agg(
-                orders=('order_id', 'count'),
-                revenue=('order_price', 'sum')
-            ).reset_index()
-            
-            # Calculate profit margin and return rate for each SKU
-            if 'return_cost' in df.columns:
-                return_cost_by_sku = df.groupby('sku_description')['return_cost'].sum().reset_index()
-                return_cost_by_sku.columns = ['sku_description', 'return_cost']
-                sku_stats = sku_stats.merge(return_cost_by_sku, on='sku_description', how='left')
-                sku_stats['return_cost'] = sku_stats['return_cost'].fillna(0)
-                sku_stats['profit_margin'] = ((sku_stats['revenue'] - sku_stats['return_cost']) / sku_stats['revenue'] * 100).round(1)
-            else:
-                sku_stats['return_cost'] = 0
-                sku_stats['profit_margin'] = 35.0  # Default
-            
-            if 'order_status' in df.columns:
-                return_counts = df[df['order_status'] == 'returned'].groupby('sku_description').size()
-                sku_stats['return_count'] = sku_stats['sku_description'].map(return_counts).fillna(0).astype(int)
-                sku_stats['return_rate'] = (sku_stats['return_count'] / sku_stats['orders'] * 100).round(1)
-            else:
-                sku_stats['return_rate'] = 5.0  # Default
-            
-            # Rename columns
-            sku_stats = sku_stats.rename(columns={'sku_description': 'sku'})
-            top_skus_df = sku_stats.sort_values('revenue', ascending=False).head(10)
-            
-            # Add placeholder fields for missing columns
-            for idx, row in top_skus_df.iterrows():
-                data['top_skus'].append({
-                    'sku': row['sku'][:15] + '...' if len(str(row['sku'])) > 15 else row['sku'],
-                    'name': row['sku'][:30] + '...' if len(str(row['sku'])) > 30 else row['sku'],
-                    'category': df['sku_description'].map(
-                        lambda x: 'Electronics' if 'electronic' in str(x).lower() else 
-                                 'Accessories' if 'cable' in str(x).lower() or 'headphone' in str(x).lower() else
-                                 'General'
-                    ).iloc[top_skus_df.index.get_loc(idx)] if 'sku_description' in df.columns else 'General',
-                    'brand': 'Brand-' + str(hash(str(row['sku'])) % 1000)[:3],
-                    'warehouse': 'WH-' + str((hash(str(row['sku'])) % 3) + 1),
-                    'orders': int(row['orders']),
-                    'revenue': round(row['revenue'], 2),
-                    'profit_margin': row['profit_margin'],
-                    'return_rate': row['return_rate']
-                })
-    except Exception as e:
-        print(f"Error processing SKU analysis: {e}")
+        data['top_skus'] = analytics.top_skus(csv_path, content_hash)
+    except (memory.MemoryBudgetExceeded, MemoryError):
+        raise
+    except Exception:
+        app.logger.exception("Error processing SKU analysis")
+        metrics.inc(metrics.ERRORS, where='sku_analysis')
         flash('Error processing data. Please check the CSV file format.', 'warning')
         data = {
             "total_orders": 0,
@@ -754,16 +1059,17 @@ def sku_analysis():
             "top_skus": []
         }
     
-    return render_template('sku_analysis.html', name=session.get('seller_name'), data=data, seller=seller, uploads=uploads, selected_upload=selected_upload, current_index=current_index)
+    return render_template('sku_analysis.html', name=session.get('seller_name'), data=data, seller=seller, uploads=uploads, selected_upload=selected_upload, current_index=current_index, upload_cursor=context.next_cursor)
 
 @app.route('/sku-analysis/detail/<path:sku>')
 @seller_login_required
 def sku_detail(sku):
     """Individual SKU detail analysis"""
-    seller = Seller.query.get(session.get('seller_id'))
+    context = current_seller_context()
+    seller = context.seller
     
     # Get all uploads
-    uploads = get_all_uploads(session.get('seller_id'))
+    uploads = context.uploads
     
     # Get selected upload from session
     csv_path = session.get('selected_csv_path')
@@ -774,43 +1080,25 @@ def sku_detail(sku):
     current_index = 0
     
     if csv_path and os.path.exists(csv_path):
-        df = pd.read_csv(csv_path)
-        
-        # Find the specific SKU data
-        sku_data = df[df['sku_description'] == sku] if 'sku_description' in df.columns else pd.DataFrame()
-        
-        # Calculate metrics for this SKU
-        data = calculate_dashboard_metrics(csv_path)
+        import analytics
+        # Find selected upload info
+        current_index, selected_upload = context.find(filepath=csv_path)
+        content_hash = selected_upload and selected_upload['content_hash']
         
-        if not sku_data.empty:
-            sku_metrics = {
-                'sku': sku[:30] + '...' if len(str(sku)) > 30 else sku,
-                'total_orders': len(sku_data),
-                'revenue': sku_data['order_price'].sum() if 'order_price' in sku_data.columns else 0,
-                'returns': len(sku_data[sku_data['order_status'] == 'returned']) if 'order_status' in sku_data.columns else 0,
-                'return_rate': round((len(sku_data[sku_data['order_status'] == 'returned']) / len(sku_data) * 100), 2) if len(sku_data) > 0 else 0
-            }
-        else:
-            sku_metrics = {
-                'sku': sku[:30] + '...' if len(str(sku)) > 30 else sku,
-                'total_orders': 0,
-                'revenue': 0,
-                'returns': 0,
-                'return_rate': 0
-            }
+        with analytics.guard(csv_path, 'sku_detail'):
+            df = analytics.read_orders(csv_path, content_hash=content_hash)
+            
+            # Calculate metrics for this SKU
+            sku_metrics = analytics.calculate_sku_metrics(df, sku)
+            
+            # The dashboard figures are cached per upload; on a miss they reuse the same frame
+            data = analytics.dashboard_metrics(csv_path, content_hash, df)
         
         # Add SKU-specific metrics
         data['sku_data'] = True
         data['selected_sku'] = sku
         data['sku_metrics'] = sku_metrics
         data['top_skus'] = []
-        
-        # Find selected upload info
-        for idx, upload in enumerate(uploads):
-            if upload['filepath'] == csv_path:
-                current_index = idx
-                selected_upload = CSVUpload.query.get(upload['id'])
-                break
     else:
         data = {
             "total_orders": 0,
@@ -845,7 +1133,7 @@ def sku_detail(sku):
             }
         }
     
-    return render_template('sku_analysis.html', name=session.get('seller_name'), data=data, seller=seller, uploads=uploads, selected_upload=selected_upload, current_index=current_index)
+    return render_template('sku_analysis.html', name=session.get('seller_name'), data=data, seller=seller, uploads=uploads, selected_upload=selected_upload, current_index=current_index, upload_cursor=context.next_cursor)
 
 
 @app.route('/sku-analysis/view/<int:upload_id>')
@@ -897,7 +1185,7 @@ def seller_register():
         unique_code = generate_unique_code()
         
         # Create new seller
-        hashed_password = generate_password_hash(password)
+        hashed_password = passwords.hash_password(password, app.config['PASSWORD_HASH_METHOD'])
         new_seller = Seller(name=name, store_name=store_name, email=email, password=hashed_password, unique_code=unique_code)
         db.session.add(new_seller)
         db.session.commit()
@@ -932,9 +1220,15 @@ def seller_login():
         email = request.form['email']
         password = request.form['password']
         
-        seller = Seller.query.filter_by(email=email).first()
+        seller = Seller.query.filter_by(email=email, deleted_at=None).first()
+        method = app.config['PASSWORD_HASH_METHOD']
+        matches, needs_rehash = passwords.verify(seller.password, password, method) if seller else (False, False)
         
-        if seller and check_password_hash(seller.password, password):
+        if matches:
+            if needs_rehash:
+                # Hash parameters changed since this password was set; upgrade while we have it
+                seller.password = passwords.hash_password(password, method)
+                db.session.commit()
             session['seller_id'] = seller.id
             session['seller_name'] = seller.name
             flash('Login successful!', 'success')
@@ -978,7 +1272,7 @@ def seller_forgot_password():
                                       seller_id=seller_id)
         else:
             # Step 1: Verify store name and email
-            seller = Seller.query.filter_by(store_name=store_name, email=email).first()
+            seller = Seller.query.filter_by(store_name=store_name, email=email, deleted_at=None).first()
             
             if seller:
                 session['reset_seller_id'] = seller.id
@@ -1015,7 +1309,7 @@ def seller_reset_password():
         
         # Update password
         seller = Seller.query.get(session['reset_seller_id'])
-        seller.password = generate_password_hash(new_password)
+        seller.password = passwords.hash_password(new_password, app.config['PASSWORD_HASH_METHOD'])
         db.session.commit()
         
         session.pop('reset_seller_id', None)
@@ -1027,50 +1321,17 @@ def seller_reset_password():
 @app.route('/seller-dashboard')
 @seller_login_required
 def seller_dashboard():
-    seller = Seller.query.get(session.get('seller_id'))
-    
     # Scan uploads folder and add any missing files to database
     scan_uploads_folder(session.get('seller_id'))
+    seller = current_seller()
     
-    uploads = get_all_uploads(session.get('seller_id'))
-    
-    # Determine which upload to use
-    upload_id = request.args.get('upload_id')
-    selected_upload = None
-    current_index = 0
-    
-    if upload_id:
-        # Find the index of the selected upload
-        for idx, upload in enumerate(uploads):
-            if upload['id'] == int(upload_id):
-                current_index = idx
-                selected_upload = upload
-                break
-        if selected_upload:
-            csv_path = selected_upload['filepath']
-            session['selected_csv_path'] = csv_path
-            session['selected_upload_id'] = selected_upload['id']
-    else:
-        # Check session for selected file first
-        csv_path = session.get('selected_csv_path')
-        if not csv_path or not os.path.exists(csv_path):
-            # Get latest upload
-            for idx, upload in enumerate(uploads):
-                if os.path.exists(upload['filepath']):
-                    current_index = idx
-                    csv_path = upload['filepath']
-                    selected_upload = upload
-                    break
-        else:
-            # Find the index of the current CSV path
-            for idx, upload in enumerate(uploads):
-                if upload['filepath'] == csv_path:
-                    current_index = idx
-                    selected_upload = upload
-                    break
+    context = current_seller_context()
+    uploads = context.uploads
+    current_index, selected_upload, csv_path = select_upload(context, request.args.get('upload_id', type=int))
     
     if csv_path and os.path.exists(csv_path):
-        data = calculate_dashboard_metrics(csv_path)
+        import analytics
+        data = analytics.dashboard_metrics(csv_path, selected_upload and selected_upload['content_hash'])
     else:
         data = {
             "total_orders": 0,
@@ -1091,7 +1352,7 @@ def seller_dashboard():
             "sku_values": []
         }
     
-    return render_template('seller_dashboard.html', name=session.get('seller_name'), uploads=uploads, data=data, seller=seller, current_index=current_index)
+    return render_template('seller_dashboard.html', name=session.get('seller_name'), uploads=uploads, data=data, seller=seller, current_index=current_index, upload_nav=context.navigation(selected_upload))
 
 @app.route('/seller-dashboard/view/<int:upload_id>')
 @seller_login_required
@@ -1112,6 +1373,32 @@ def view_upload(upload_id):
     
     return redirect(url_for('seller_dashboard', upload_id=upload_id))
 
+def upload_to_json(upload):
+    return {key: value for key, value in upload.items() if key not in ('filepath', 'content_hash')}
+
+@app.route('/api/uploads')
+@seller_login_required
+def api_uploads():
+    """Searchable upload picker: one keyset page of the seller's uploads"""
+    limit = max(1, min(request.args.get('limit', type=int) or app.config['UPLOAD_PAGE_SIZE'], 100))
+    uploads, next_cursor = get_upload_page(session.get('seller_id'),
+                                           cursor=request.args.get('cursor'),
+                                           limit=limit,
+                                           search=request.args.get('q', '').strip() or None)
+    return jsonify(uploads=[upload_to_json(upload) for upload in uploads], next_cursor=next_cursor)
+
+@app.route('/api/uploads/<int:upload_id>/navigation')
+@seller_login_required
+def api_upload_navigation(upload_id):
+    """Position and previous/next upload ids for one upload"""
+    context = current_seller_context()
+    _, upload = context.find(upload_id=upload_id)
+    if upload is None:
+        abort(404)
+    nav = dict(context.navigation(upload))
+    nav['current'] = upload_to_json(upload)
+    return jsonify(nav)
+
 @app.route('/seller-upload-csv', methods=['GET', 'POST'])
 @seller_login_required
 def seller_upload_csv():
@@ -1128,27 +1415,56 @@ def seller_upload_csv():
             return redirect(request.url)
         
         if file and allowed_file(file.filename):
-            filename = secure_filename(str(session.get('seller_id')) + '_' + file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            
-            # Count rows in CSV
+            import storage
+            seller_id = session.get('seller_id')
+            filename = secure_filename(str(seller_id) + '_' + file.filename)
+            # Decompress and hash while streaming to disk; identical content is stored once
             try:
-                df = pd.read_csv(filepath)
-                row_count = len(df)
-            except:
-                row_count = 0
+                reader = storage.open_upload(file.stream, file.filename, app.config['MAX_DECOMPRESSED_SIZE'])
+                with metrics.timed(metrics.INGEST_SECONDS, job='store_upload'):
+                    content_hash, filepath, created = storage.store_stream(reader, app.config['UPLOAD_FOLDER'],
+                                                                           app.config['UPLOAD_STORAGE_COMPRESSION'])
+            except storage.UploadRejected as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('seller_dashboard'))
+            
+            duplicate = CSVUpload.query.filter_by(seller_id=seller_id, content_hash=content_hash).first()
+            if duplicate:
+                if created and duplicate.filepath != filepath:
+                    # The earlier copy predates the object store; don't keep a second one
+                    os.remove(filepath)
+                db.session.query(RetiredFile).filter_by(path=filepath).delete()
+                db.session.commit()
+                session['selected_csv_path'] = duplicate.filepath
+                session['selected_upload_id'] = duplicate.id
+                flash(f'{file.filename} has the same contents as {duplicate.original_name}, which you already uploaded.', 'info')
+                return redirect(url_for('seller_dashboard', upload_id=duplicate.id))
+            
+            # Count rows in CSV, unless someone has already uploaded the same data
+            twin = CSVUpload.query.filter_by(content_hash=content_hash).first()
+            if twin:
+                row_count = twin.row_count
+            else:
+                import analytics
+                with metrics.timed(metrics.INGEST_SECONDS, job='count_rows'):
+                    row_count = analytics.count_rows(filepath)
             
             # Save to database
             upload = CSVUpload(
-                seller_id=session.get('seller_id'),
+                seller_id=seller_id,
                 filename=filename,
                 original_name=file.filename,
                 filepath=filepath,
-                row_count=row_count
+                row_count=row_count,
+                content_hash=content_hash
             )
             db.session.add(upload)
+            # Re-uploading content that was just deleted takes the object back
+            db.session.query(RetiredFile).filter_by(path=filepath).delete()
             db.session.commit()
+            invalidate_seller_context(seller_id)
+            schedule_merge(seller_id)
+            purge_retired_files()
             
             # Set the newly uploaded file as the selected CSV
             session['selected_csv_path'] = filepath
@@ -1157,26 +1473,439 @@ def seller_upload_csv():
             flash(f'File uploaded successfully! {row_count} rows processed.', 'success')
             return redirect(url_for('seller_dashboard'))
         else:
-            flash('Invalid file type. Please upload a CSV file.', 'danger')
+            flash('Invalid file type. Please upload a CSV file (optionally .gz, .zst or .zip).', 'danger')
     
     return render_template('seller_dashboard.html', name=session.get('seller_name'), show_upload=True, uploads=uploads)
 
-@app.route('/download-csv/<filename>')
-def download_csv(filename):
-    return send_file(os.path.join(app.config['UPLOAD_FOLDER'], filename), as_attachment=True)
+def attachment_disposition(download_name):
+    """Content-Disposition for a download: the name quoted, plus an RFC 5987 filename* if it isn't ASCII"""
+    from urllib.parse import quote
+    from werkzeug.http import dump_options_header
+    try:
+        download_name.encode('ascii')
+        options = {'filename': download_name}
+    except UnicodeEncodeError:
+        import unicodedata
+        fallback = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        options = {'filename': fallback, 'filename*': "UTF-8''" + quote(download_name, safe="!#$&+^`|~")}
+    return dump_options_header('attachment', options)
+
+def serve_file(directory, filename, **kwargs):
+    """Send a file from disk, letting the reverse proxy ship the bytes if configured.
+
+    With FILE_OFFLOAD='x-sendfile' Flask emits an X-Sendfile header (Apache,
+    lighttpd). With 'x-accel-redirect' the response carries an internal nginx
+    URI, FILE_OFFLOAD_PREFIX + the path relative to the app root, e.g.
+
+        location /_protected/ { internal; alias /srv/retrix/; }
+
+    Otherwise the file is sent by werkzeug, which answers Range and
+    conditional requests so large downloads can be resumed.
+    """
+    filepath = safe_join(directory, filename)
+    if filepath is None or not os.path.isfile(filepath):
+        abort(404)
+
+    if app.config.get('FILE_OFFLOAD') == 'x-accel-redirect':
+        import mimetypes
+        response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        relpath = os.path.relpath(os.path.abspath(filepath), app.root_path).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = app.config['FILE_OFFLOAD_PREFIX'].rstrip('/') + '/' + relpath
+        if kwargs.get('as_attachment'):
+            download_name = kwargs.get('download_name') or os.path.basename(filepath)
+            response.headers['Content-Disposition'] = attachment_disposition(download_name)
+        if kwargs.get('max_age'):
+            response.cache_control.max_age = kwargs['max_age']
+        return response
+    return send_file(filepath, conditional=True, etag=True, **kwargs)
+
+@app.route('/download-csv/<int:upload_id>')
+@seller_login_required
+def download_csv(upload_id):
+    import storage
+    upload = CSVUpload.query.filter_by(id=upload_id, seller_id=current_seller().id).first()
+    if upload is None:
+        abort(404)  # not this seller's upload; don't reveal whether it exists
+    # The row's own file: its content-hash object, or for older rows the legacy path it was saved under
+    path = storage.resolve_legacy_path(upload.filepath)
+    if path is None:
+        abort(404)
+    stored_ext = os.path.splitext(path)[1]  # .csv, or .gz/.zst when kept compressed
+    base_name = upload.original_name
+    for ext in COMPRESSED_EXTENSIONS:
+        base_name = base_name[:-len(ext) - 1] if base_name.lower().endswith('.' + ext) else base_name
+    download_name = base_name if stored_ext == '.csv' else base_name + stored_ext
+    upload_folder = app.config['UPLOAD_FOLDER']
+    relative = os.path.relpath(path, upload_folder).replace(os.sep, '/')
+    return serve_file(upload_folder, relative, as_attachment=True, download_name=download_name)
+
+# Streaming exports
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def parse_export_date(value):
+    """Parse a YYYY-MM-DD query parameter, returning None when absent"""
+    from datetime import datetime
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        abort(400, f"Invalid date '{value}', expected YYYY-MM-DD")
+
+def export_response(generator, fmt, basename):
+    from datetime import datetime
+    filename = f"{basename}_{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    return Response(generator, mimetype=EXPORT_MIMETYPES[fmt],
+                    headers={'Content-Disposition': attachment_disposition(filename)})
+
+def iter_seller_orders(seller_id, catalogue_id=None, status=None, start_date=None, end_date=None):
+    """Yield the seller's merged orders matching the export filters as ORDER_EXPORT_FIELDS rows,
+    EXPORT_CHUNK_ROWS at a time (keyset on id, so later chunks never re-skip earlier rows)"""
+    import analytics
+    query = db.session.query(Order.id, *(getattr(Order, field) for field in analytics.ORDER_EXPORT_FIELDS)) \
+        .filter(Order.seller_id == seller_id)
+    if catalogue_id is not None:
+        query = query.filter(Order.catalogue_id == str(catalogue_id))
+    if status:
+        query = query.filter(Order.order_status == status)
+    if start_date:
+        query = query.filter(Order.order_date >= start_date.date())
+    if end_date:
+        query = query.filter(Order.order_date <= end_date.date())
+    last_id = 0
+    while True:
+        rows = query.filter(Order.id > last_id).order_by(Order.id).limit(analytics.EXPORT_CHUNK_ROWS).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield [row[1:] for row in rows]
+
+@app.route('/export/orders.<fmt>')
+@seller_login_required
+def export_orders(fmt):
+    """Stream a filtered subset of a seller's orders as CSV or NDJSON.
+
+    Without ``upload_id`` the orders come from the merged orders table, so an
+    order in several uploads is exported once, as the dashboards count it.
+    """
+    if fmt not in EXPORT_MIMETYPES:
+        abort(404)
+    seller_id = session.get('seller_id')
+    filters = {
+        'catalogue_id': request.args.get('catalogue_id', type=int),
+        'status': request.args.get('status'),
+        'start_date': parse_export_date(request.args.get('start')),
+        'end_date': parse_export_date(request.args.get('end'))
+    }
+    import analytics
+    import storage
+
+    upload_id = request.args.get('upload_id', type=int)
+    if upload_id:
+        upload = CSVUpload.query.get_or_404(upload_id)
+        if upload.seller_id != seller_id:
+            abort(403)
+        path = storage.resolve_legacy_path(upload.filepath)
+        frames = analytics.iter_order_chunks([path] if path else [], **filters)
+    else:
+        merge_seller_orders(seller_id)  # an export has to include every upload, so don't leave this to the background
+        frames = (analytics.order_export_frame(rows) for rows in iter_seller_orders(seller_id, **filters))
+    return export_response(stream_with_context(analytics.stream_frames(frames, fmt)), fmt, 'orders')
+
+@app.route('/export/sku-stats.<fmt>')
+@seller_login_required
+def export_sku_stats(fmt):
+    """Stream per-SKU statistics over a seller's merged orders"""
+    if fmt not in EXPORT_MIMETYPES:
+        abort(404)
+    seller_id = session.get('seller_id')
+    merge_seller_orders(seller_id)
+    import analytics
+    returned = func.sum(case((Order.order_status == 'returned', 1), else_=0))
+    rows = db.session.query(Order.sku_description, func.count(Order.id), func.sum(Order.quantity),
+                            func.sum(Order.order_price), returned, func.sum(Order.return_cost)) \
+        .filter(Order.seller_id == seller_id, Order.sku_description.isnot(None)) \
+        .group_by(Order.sku_description).order_by(Order.sku_description).all()
+    stats = analytics.sku_stats_frame(rows)
+
+    def generate():
+        chunk_rows = analytics.EXPORT_CHUNK_ROWS
+        for start in range(0, max(len(stats), 1), chunk_rows):
+            yield from analytics.stream_frames([stats.iloc[start:start + chunk_rows]], fmt)
+
+    return export_response(generate(), fmt, 'sku_stats')
+
+def retire_file(filepath):
+    """Schedule a file for deletion once in-flight requests are done with it.
+
+    Requests that already resolved the path (an analytics read, a download)
+    keep working, and nothing fails on Windows because the file is open.
+    Legacy paths stored with Windows backslashes are resolved first. The
+    caller commits.
+    """
+    import storage
+    filepath = storage.resolve_legacy_path(filepath) if filepath else None
+    if filepath:
+        db.session.add(RetiredFile(path=filepath, purge_after=time.time() + app.config['RETIRED_FILE_GRACE']))
+
+RETIRED_LOOKUP_BATCH = 200  # retired paths checked per query
+
+@metrics.timed_job('purge_retired')
+def purge_retired_files(limit=100):
+    """Delete retired files whose grace period is over and that nothing references again"""
+    due = RetiredFile.query.filter(RetiredFile.purge_after <= time.time()).limit(limit).all()
+    purged = 0
+    for start in range(0, len(due), RETIRED_LOOKUP_BATCH):
+        batch = due[start:start + RETIRED_LOOKUP_BATCH]
+        referenced = referenced_files([retired.path for retired in batch])
+        done = []
+        for retired in batch:
+            if retired.path not in referenced:
+                try:
+                    if os.path.isdir(retired.path):
+                        import shutil
+                        shutil.rmtree(retired.path)  # a columnar copy stored as .npy columns
+                    else:
+                        os.remove(retired.path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue  # still open somewhere; try again on the next purge
+                purged += 1
+            done.append(retired.id)
+        RetiredFile.query.filter(RetiredFile.id.in_(done)).delete(synchronize_session=False)
+        db.session.commit()
+    return purged
+
+def referenced_files(paths):
+    """The paths an upload or a seller's profile photo uses again, in two queries"""
+    import imaging
+    referenced = {path for (path,) in db.session.query(CSVUpload.filepath).filter(CSVUpload.filepath.in_(paths))}
+    names = [(path, os.path.basename(path), imaging.photo_stem(os.path.basename(path))) for path in paths]
+    photo = or_(Seller.profile_photo.in_([name for _, name, stem in names if stem is None]),
+                *(Seller.profile_photo.startswith(stem + '_', autoescape=True) for stem in {stem for _, _, stem in names if stem}))
+    photos = {name for (name,) in db.session.query(Seller.profile_photo).filter(photo)}
+    photo_stems = {imaging.photo_stem(name) for name in photos}
+    referenced.update(path for path, name, stem in names if (stem in photo_stems if stem else name in photos))
+    return referenced
+
+def retire_profile_photo(name):
+    """Retire every size and format of a stored profile photo; the caller commits"""
+    import imaging
+    for filename in imaging.photo_files(name):
+        retire_file(os.path.join(app.config['PROFILE_PHOTO_FOLDER'], filename))
+
+_background_executor = None
+
+def background_executor():
+    """Per-process pool for work done after the response: photo resizing, deletion collection"""
+    global _background_executor
+    if _background_executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _background_executor = ThreadPoolExecutor(max_workers=app.config['BACKGROUND_WORKERS'],
+                                                  thread_name_prefix='retrix-background')
+    return _background_executor
+
+@metrics.timed_job('profile_photo')
+def process_profile_photo(seller_id, data, stem):
+    """Write all sizes of an uploaded photo and make it the seller's, retiring the previous one.
+
+    Returns the stored name, or None if the image could not be processed.
+    The caller commits.
+    """
+    import imaging
+    try:
+        name = imaging.save_profile_photo(io.BytesIO(data), app.config['PROFILE_PHOTO_FOLDER'], stem)
+    except Exception:
+        app.logger.exception("Error saving profile photo for seller %s", seller_id)
+        metrics.inc(metrics.ERRORS, where='profile_photo')
+        return None
+    seller = db.session.get(Seller, seller_id)
+    if seller is None:
+        retire_profile_photo(name)  # account deleted while the photo was processed
+    else:
+        if seller.profile_photo and seller.profile_photo != name:
+            retire_profile_photo(seller.profile_photo)
+        seller.profile_photo = name
+    return name
+
+def process_profile_photo_in_background(seller_id, data, stem):
+    with app.app_context():
+        process_profile_photo(seller_id, data, stem)
+        db.session.commit()
+
+def discard_uploads(uploads):
+    """Delete upload rows, retiring each stored file and columnar copy that no other upload shares.
+
+    The sharing checks and the delete are one query each for the whole
+    batch. The caller commits.
+    """
+    if not uploads:
+        return
+    ids = [upload.id for upload in uploads]
+    others = CSVUpload.id.notin_(ids)
+    paths = {upload.filepath for upload in uploads}
+    hashes = {upload.content_hash for upload in uploads if upload.content_hash}
+    shared = {path for (path,) in db.session.query(CSVUpload.filepath).filter(CSVUpload.filepath.in_(paths), others)}
+    twins = {digest for (digest,) in db.session.query(CSVUpload.content_hash)
+             .filter(CSVUpload.content_hash.in_(hashes), others)}
+    retired = paths - shared  # retire_file resolves legacy backslash paths
+    if hashes - twins:
+        import analytics
+        import columnar
+        for digest in hashes - twins:
+            if app.config.get('COLUMNAR_FOLDER'):
+                retired.update(columnar.copies(app.config['COLUMNAR_FOLDER'], digest))
+            analytics.forget(digest)
+    for filepath in sorted(retired):
+        retire_file(filepath)
+    db.session.query(CSVUpload).filter(CSVUpload.id.in_(ids)).delete(synchronize_session=False)
+
+def delete_in_batches(model, condition, batch_size):
+    """Delete matching rows a batch per transaction, so the write lock is never held for long"""
+    deleted = 0
+    while True:
+        ids = [row_id for (row_id,) in db.session.query(model.id).filter(condition).limit(batch_size)]
+        if not ids:
+            return deleted
+        deleted += db.session.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+def clear_seller_orders(seller_id, batch_size):
+    """Forget all of a seller's merged orders and their merge state, in batches"""
+    delete_in_batches(Order, Order.seller_id == seller_id, batch_size)
+    OrderMergeState.query.filter_by(seller_id=seller_id).delete()
+    db.session.commit()
+
+def forget_upload_orders(upload_id, seller_id, batch_size):
+    """Delete the orders an upload last changed, then merge those orders again from the seller's other uploads.
+
+    Only merged uploads that contain one of the deleted orders are re-read,
+    oldest first, and only those rows are upserted; the seller's merge
+    high-water mark is left alone. Returns the number of orders restored.
+    """
+    removed = set()
+    while True:
+        rows = db.session.query(Order.id, Order.order_id).filter(Order.upload_id == upload_id).limit(batch_size).all()
+        if not rows:
+            break
+        db.session.query(Order).filter(Order.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+        db.session.commit()
+        removed.update(row.order_id for row in rows)
+    state = db.session.get(OrderMergeState, seller_id)
+    if not removed or state is None:
+        return 0
+
+    import analytics
+    import storage
+    others = db.session.query(CSVUpload.id, CSVUpload.filepath) \
+        .filter(CSVUpload.seller_id == seller_id, CSVUpload.id <= state.merged_upload_id) \
+        .order_by(CSVUpload.id).all()
+    statement = order_upsert()
+    restored = 0
+    for upload in others:
+        path = storage.resolve_legacy_path(upload.filepath)
+        if not path or removed.isdisjoint(analytics.order_ids(path)):
+            continue
+        for records in analytics.iter_order_records(path):
+            records = [record for record in records if record['order_id'] in removed]
+            if records:
+                for record in records:
+                    record.update(seller_id=seller_id, upload_id=upload.id)
+                restored += max(db.session.connection().execute(statement, records).rowcount, 0)
+                db.session.commit()
+    return restored
+
+def collect_upload(upload_id, seller_id, batch_size):
+    upload = db.session.get(CSVUpload, upload_id)
+    if upload is not None:
+        discard_uploads([upload])
+        db.session.commit()
+    forget_upload_orders(upload_id, seller_id, batch_size)
+
+def collect_seller(seller_id, batch_size):
+    while True:
+        uploads = CSVUpload.query.filter_by(seller_id=seller_id).limit(batch_size).all()
+        if not uploads:
+            break
+        discard_uploads(uploads)
+        db.session.commit()
+    clear_seller_orders(seller_id, batch_size)
+    seller = db.session.get(Seller, seller_id)
+    if seller is not None:
+        if seller.profile_photo:
+            retire_profile_photo(seller.profile_photo)
+        db.session.delete(seller)
+        db.session.commit()
+
+_collecting = threading.Lock()
+
+@metrics.timed_job('collect_deletions')
+def collect_deletions(batch_size=None):
+    """Remove everything marked deleted; returns how many deletions completed.
+
+    Every step deletes whatever is left and commits per batch, so a run
+    that is interrupted (or races another worker's) is finished by the
+    next one. A deletion that fails is retried on later runs.
+    """
+    batch_size = batch_size or app.config['DELETION_BATCH_SIZE']
+    if not _collecting.acquire(blocking=False):
+        return 0  # this process is already collecting; it picks up new work before it stops
+    completed = 0
+    try:
+        failed = set()
+        while True:
+            item = PendingDeletion.query.filter(PendingDeletion.id.notin_(failed)).order_by(PendingDeletion.id).first()
+            if item is None:
+                break
+            item_id, kind, target_id, seller_id = item.id, item.kind, item.target_id, item.seller_id
+            try:
+                if kind == 'seller':
+                    collect_seller(target_id, batch_size)
+                else:
+                    collect_upload(target_id, seller_id, batch_size)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Error collecting %s %s", kind, target_id)
+                metrics.inc(metrics.ERRORS, where='collect_deletions')
+                PendingDeletion.query.filter_by(id=item_id).update({'attempts': PendingDeletion.attempts + 1})
+                db.session.commit()
+                failed.add(item_id)
+                continue
+            PendingDeletion.query.filter_by(id=item_id).delete()
+            db.session.commit()
+            completed += 1
+        purge_retired_files()
+    finally:
+        _collecting.release()
+    return completed
+
+def collect_deletions_in_background():
+    with app.app_context():
+        collect_deletions()
+
+def schedule_collection():
+    """Run the deletion collector after this response, on the background pool"""
+    background_executor().submit(collect_deletions_in_background)
 
 @app.route('/delete-csv/<int:upload_id>')
+@seller_login_required
 def delete_csv(upload_id):
     upload = CSVUpload.query.get_or_404(upload_id)
+    seller_id = session.get('seller_id')
+    if upload.seller_id != seller_id:
+        flash('Unauthorized access', 'danger')
+        return redirect(url_for('seller_dashboard'))
     
-    # Delete file from disk
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], upload.filename)
-    if os.path.exists(filepath):
-        os.remove(filepath)
-    
-    # Delete from database
-    db.session.delete(upload)
+    # Detach it from the seller now; its file, columnar copy and orders are collected in the background
+    upload.seller_id = None
+    db.session.add(PendingDeletion(kind='upload', target_id=upload.id, seller_id=seller_id, requested_at=time.time()))
     db.session.commit()
+    invalidate_seller_context(seller_id)
+    if session.get('selected_upload_id') == upload.id or session.get('selected_csv_path') == upload.filepath:
+        session.pop('selected_upload_id', None)
+        session.pop('selected_csv_path', None)
+    schedule_collection()
     
     flash('File deleted successfully', 'info')
     
@@ -1189,7 +1918,7 @@ def seller_comparison():
     """Month comparison page - compare two specific months"""
     from datetime import datetime
     
-    seller = Seller.query.get(session.get('seller_id'))
+    seller = current_seller()
     
     # Get all uploaded CSV files
     csv_files = get_all_csv_files_for_seller(session.get('seller_id'))
@@ -1198,6 +1927,11 @@ def seller_comparison():
         return render_template('seller_comparison.html', name=session.get('seller_name'), seller=seller, 
                               has_data=False, available_years=[])
     
+    # Uploads are merged into the orders table in the background
+    if orders_pending(seller.id):
+        schedule_merge(seller.id)
+        flash('Your latest uploads are still being added; refresh in a moment to include them.', 'info')
+    
     # Get available years
     available_years = get_available_years_months(session.get('seller_id'))
     
@@ -1218,8 +1952,11 @@ def seller_comparison():
     # Get comparison data for the two selected months
     try:
         comparison_data = get_two_month_comparison_data(session.get('seller_id'), month1, year1, month2, year2)
-    except Exception as e:
-        print(f"Error getting comparison data: {e}")
+    except MemoryError:
+        raise
+    except Exception:
+        app.logger.exception("Error getting comparison data")
+        metrics.inc(metrics.ERRORS, where='two_month_comparison')
         comparison_data = None
     
     # Check if same month and year are selected
@@ -1251,225 +1988,42 @@ def seller_comparison():
                           year2=year2)
 
 
-def parse_order_date(date_str):
-    """Parse date string in DD-MM-YYYY format"""
-    try:
-        from datetime import datetime
-        return datetime.strptime(date_str, '%d-%m-%Y')
-    except:
-        return None
-
 def get_all_csv_files_for_seller(seller_id):
     """Get all CSV files uploaded by a seller"""
-    uploads = CSVUpload.query.filter_by(seller_id=seller_id).order_by(CSVUpload.upload_date.desc()).all()
-    return [upload.filepath for upload in uploads if os.path.exists(upload.filepath)]
+    return load_seller_context(seller_id).csv_paths()
+
+def month_range(year, month):
+    from datetime import date
+    return date(year, month, 1), date(year + month // 12, month % 12 + 1, 1)
+
+def month_orders_query(seller_id, months):
+    """The seller's merged orders in any of ``months``, (year, month) pairs"""
+    in_months = []
+    for year, month in months:
+        start, end = month_range(year, month)
+        in_months.append(and_(Order.order_date >= start, Order.order_date < end))
+    return db.session.query(Order.order_date, Order.quantity, Order.order_price, Order.order_status,
+                            Order.return_cost, Order.return_reason) \
+        .filter(Order.seller_id == seller_id, or_(*in_months))
 
 def get_two_month_comparison_data(seller_id, month1, year1, month2, year2):
-    """Get comparison data for two specific months"""
-    try:
-        from datetime import datetime
-        
-        # Get all CSV files for the seller
-        csv_files = get_all_csv_files_for_seller(seller_id)
-        
-        if not csv_files:
-            return None
-        
-        # Read and merge all CSV files
-        dataframes = []
-        for csv_path in csv_files:
-            try:
-                df = pd.read_csv(csv_path)
-                dataframes.append(df)
-            except Exception as e:
-                print(f"Error reading {csv_path}: {e}")
-        
-        if not dataframes:
-            return None
-        
-        # Concatenate all dataframes
-        df = pd.concat(dataframes, ignore_index=True)
-        
-        # Parse dates
-        df['parsed_date'] = df['order_date'].apply(parse_order_date)
-        df = df.dropna(subset=['parsed_date'])
-        
-        # Extract year, month, and day
-        df['year'] = df['parsed_date'].apply(lambda x: x.year)
-        df['month'] = df['parsed_date'].apply(lambda x: x.month)
-        df['day'] = df['parsed_date'].apply(lambda x: x.day)
-        
-        # Filter for the two selected months
-        df1 = df[(df['year'] == year1) & (df['month'] == month1)]
-        df2 = df[(df['year'] == year2) & (df['month'] == month2)]
-        
-        if df1.empty and df2.empty:
-            return None
-        
-        # Calculate daily revenue for month 1
-        daily_revenue1 = {}
-        if not df1.empty:
-            daily_revenue1 = df1.groupby('day')['order_price'].sum().to_dict()
-        
-        # Calculate daily revenue for month 2
-        daily_revenue2 = {}
-        if not df2.empty:
-            daily_revenue2 = df2.groupby('day')['order_price'].sum().to_dict()
-        
-        # Calculate metrics for month 1
-        month1_data = {}
-        if not df1.empty:
-            # Get return reasons for month 1
-            return_reasons1 = {}
-            returned_df1 = df1[df1['order_status'] == 'returned']
-            if not returned_df1.empty and 'return_reason' in returned_df1.columns:
-                return_reasons1 = returned_df1['return_reason'].value_counts().to_dict()
-            
-            month1_data = {
-                'month_year': f"{datetime(year1, month1, 1).strftime('%B')} {year1}",
-                'total_orders': len(df1),
-                'total_quantity': df1['quantity'].sum(),
-                'total_revenue': df1['order_price'].sum(),
-                'avg_order_value': df1['order_price'].sum() / len(df1) if len(df1) > 0 else 0,
-                'delivered_count': len(df1[df1['order_status'] == 'delivered']),
-                'cancelled_count': len(df1[df1['order_status'] == 'cancelled']),
-                'returned_count': len(df1[df1['order_status'] == 'returned']),
-                'return_cost': df1['return_cost'].sum() if 'return_cost' in df1.columns else 0,
-                'return_rate': round((len(df1[df1['order_status'] == 'returned']) / len(df1) * 100), 2) if len(df1) > 0 else 0,
-                'daily_revenue': daily_revenue1,
-                'return_reasons': return_reasons1,
-                'has_data': True
-            }
-        else:
-            # Month 1 has no data - still create empty structure
-            month1_data = {
-                'month_year': f"{datetime(year1, month1, 1).strftime('%B')} {year1}",
-                'total_orders': 0,
-                'total_quantity': 0,
-                'total_revenue': 0,
-                'avg_order_value': 0,
-                'delivered_count': 0,
-                'cancelled_count': 0,
-                'returned_count': 0,
-                'return_cost': 0,
-                'return_rate': 0,
-                'daily_revenue': {},
-                'return_reasons': {},
-                'has_data': False
-            }
-        
-        # Calculate metrics for month 2
-        month2_data = {}
-        if not df2.empty:
-            # Get return reasons for month 2
-            return_reasons2 = {}
-            returned_df2 = df2[df2['order_status'] == 'returned']
-            if not returned_df2.empty and 'return_reason' in returned_df2.columns:
-                return_reasons2 = returned_df2['return_reason'].value_counts().to_dict()
-            
-            month2_data = {
-                'month_year': f"{datetime(year2, month2, 1).strftime('%B')} {year2}",
-                'total_orders': len(df2),
-                'total_quantity': df2['quantity'].sum(),
-                'total_revenue': df2['order_price'].sum(),
-                'avg_order_value': df2['order_price'].sum() / len(df2) if len(df2) > 0 else 0,
-                'delivered_count': len(df2[df2['order_status'] == 'delivered']),
-                'cancelled_count': len(df2[df2['order_status'] == 'cancelled']),
-                'returned_count': len(df2[df2['order_status'] == 'returned']),
-                'return_cost': df2['return_cost'].sum() if 'return_cost' in df2.columns else 0,
-                'return_rate': round((len(df2[df2['order_status'] == 'returned']) / len(df2) * 100), 2) if len(df2) > 0 else 0,
-                'daily_revenue': daily_revenue2,
-                'return_reasons': return_reasons2,
-                'has_data': True
-            }
-        else:
-            # Month 2 has no data - still create empty structure
-            month2_data = {
-                'month_year': f"{datetime(year2, month2, 1).strftime('%B')} {year2}",
-                'total_orders': 0,
-                'total_quantity': 0,
-                'total_revenue': 0,
-                'avg_order_value': 0,
-                'delivered_count': 0,
-                'cancelled_count': 0,
-                'returned_count': 0,
-                'return_cost': 0,
-                'return_rate': 0,
-                'daily_revenue': {},
-                'return_reasons': {},
-                'has_data': False
-            }
-        
-        # Check if at least one month has data
-        if not month1_data.get('has_data') and not month2_data.get('has_data'):
-            return None
-        
-        # Calculate differences and percentage changes
-        if month1_data and month2_data:
-            revenue_diff = month2_data['total_revenue'] - month1_data['total_revenue']
-            revenue_pct = round((revenue_diff / month1_data['total_revenue'] * 100), 2) if month1_data['total_revenue'] > 0 else 0
-            
-            orders_diff = month2_data['total_orders'] - month1_data['total_orders']
-            orders_pct = round((orders_diff / month1_data['total_orders'] * 100), 2) if month1_data['total_orders'] > 0 else 0
-            
-            return_rate_diff = month2_data['return_rate'] - month1_data['return_rate']
-            
-            aov_diff = month2_data['avg_order_value'] - month1_data['avg_order_value']
-            aov_pct = round((aov_diff / month1_data['avg_order_value'] * 100), 2) if month1_data['avg_order_value'] > 0 else 0
-            
-            comparison = {
-                'revenue_change': revenue_diff,
-                'revenue_change_pct': revenue_pct,
-                'orders_change': orders_diff,
-                'orders_change_pct': orders_pct,
-                'return_rate_change': return_rate_diff,
-                'aov_change': aov_diff,
-                'aov_change_pct': aov_pct
-            }
-        else:
-            comparison = {}
-        
-        return {
-            'month1': month1_data,
-            'month2': month2_data,
-            'comparison': comparison
-        }
-        
-    except Exception as e:
-        print(f"Error in two-month comparison: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+    """Get comparison data for two specific months from the seller's merged orders"""
+    rows = month_orders_query(seller_id, ((year1, month1), (year2, month2))).all()
+    import analytics
+    with metrics.timer('month_comparison'):
+        return analytics.compare_month_frame(analytics.orders_frame(rows), month1, year1, month2, year2)
 
 def get_available_years_months(seller_id):
-    """Get available years and months from all CSV files"""
-    try:
-        csv_files = get_all_csv_files_for_seller(seller_id)
-        
-        if not csv_files:
-            return [2024, 2025, 2026]
-        
-        all_years = set()
-        for csv_path in csv_files:
-            try:
-                df = pd.read_csv(csv_path)
-                df['parsed_date'] = df['order_date'].apply(parse_order_date)
-                df = df.dropna(subset=['parsed_date'])
-                df['year'] = df['parsed_date'].apply(lambda x: x.year)
-                all_years.update(df['year'].unique())
-            except:
-                continue
-        
-        return sorted(list(all_years)) if all_years else [2024, 2025, 2026]
-        
-    except Exception as e:
-        print(f"Error getting available dates: {e}")
-        return [2024, 2025, 2026]
+    """Get the years that have orders, from the seller's merged orders"""
+    year = func.extract('year', Order.order_date)
+    years = [row[0] for row in db.session.query(year).filter(Order.seller_id == seller_id, Order.order_date.isnot(None))
+             .distinct().order_by(year)]
+    return [int(value) for value in years] or [2024, 2025, 2026]
 
 @app.route('/seller-settings')
 @seller_login_required
 def seller_settings():
-    seller = Seller.query.get(session.get('seller_id'))
+    seller = current_seller()
     upload_stats = get_upload_stats_by_date(seller.id)
     return render_template('seller_settings.html', seller=seller, upload_stats=upload_stats)
 
@@ -1505,24 +2059,24 @@ def seller_update_profile():
             # Check file extension
             ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
             if ext in ALLOWED_PHOTO_EXTENSIONS:
-                # Generate unique filename
-                filename = f"profile_{seller.id}.{ext}"
-                filepath = os.path.join(app.config['PROFILE_PHOTO_FOLDER'], filename)
-                
-                # Resize and save image
+                import imaging
                 try:
-                    img = Image.open(file)
-                    img = img.resize((200, 200), Image.Resampling.LANCZOS)
-                    img.save(filepath)
-                    seller.profile_photo = filename
-                except Exception as e:
-                    print(f"Error saving profile photo: {e}")
+                    imaging.check_photo(file)
+                except Exception:
+                    flash('Could not read that image; please upload a JPG, PNG or GIF photo.', 'warning')
+                else:
+                    # A versioned stem so every size's URL can be cached forever
+                    stem = f"profile_{seller.id}_{int(time.time() * 1000):x}"
+                    data = file.read()
+                    if app.config['PROFILE_PHOTO_ASYNC']:
+                        background_executor().submit(process_profile_photo_in_background, seller.id, data, stem)
+                        flash('Your new photo is being processed and will appear shortly.', 'info')
+                    elif process_profile_photo(seller.id, data, stem) is None:
+                        flash('Could not process that image; please try another photo.', 'warning')
     
     # Handle remove photo request
     if remove_photo and seller.profile_photo:
-        filepath = os.path.join(app.config['PROFILE_PHOTO_FOLDER'], seller.profile_photo)
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        retire_profile_photo(seller.profile_photo)
         seller.profile_photo = None
     
     # Update seller profile
@@ -1545,24 +2099,11 @@ def seller_delete_account():
     seller = Seller.query.get(seller_id)
     
     if seller:
-        # Delete profile photo if exists
-        if seller.profile_photo:
-            filepath = os.path.join(app.config['PROFILE_PHOTO_FOLDER'], seller.profile_photo)
-            if os.path.exists(filepath):
-                os.remove(filepath)
-        
-        # Delete all CSV uploads for this seller
-        uploads = CSVUpload.query.filter_by(seller_id=seller_id).all()
-        for upload in uploads:
-            # Delete file from disk
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], upload.filename)
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            db.session.delete(upload)
-        
-        # Delete seller from database
-        db.session.delete(seller)
+        # Close the account now; uploads, orders and files are removed by the background collector
+        seller.deleted_at = func.current_timestamp()
+        db.session.add(PendingDeletion(kind='seller', target_id=seller.id, seller_id=seller.id, requested_at=time.time()))
         db.session.commit()
+        schedule_collection()
         
         # Clear session
         session.clear()
@@ -1571,29 +2112,233 @@ def seller_delete_account():
     
     return redirect(url_for('login_selection'))
 
+@app.context_processor
+def inject_profile_photo_url():
+    def profile_photo_url(seller):
+        """Versioned, cacheable URL for a seller's photo (no DB hit to serve it)"""
+        if seller and seller.profile_photo:
+            return url_for('get_profile_photo_file', seller_id=seller.id, filename=seller.profile_photo)
+        return url_for('get_profile_photo', seller_id=seller.id if seller else 0)
+    def profile_photo_sources(seller):
+        """(type, srcset) per format for a <picture>, best format first; empty for older photos"""
+        if not (seller and seller.profile_photo):
+            return []
+        import imaging
+        return [(mime, ', '.join(f"{url_for('get_profile_photo_file', seller_id=seller.id, filename=name)} {width}w"
+                                 for name, width in files))
+                for mime, files in imaging.photo_sources(seller.profile_photo)]
+    return dict(profile_photo_url=profile_photo_url, profile_photo_sources=profile_photo_sources)
+
+@app.context_processor
+def inject_asset_url():
+    import assets
+    def asset_url(name):
+        """Local fingerprinted URL for a vendored asset (CDN until vendored)"""
+        return assets.asset_url(app.static_folder, name, url_for)
+    return dict(asset_url=asset_url)
+
+@app.route('/static/vendor/<path:filename>')
+def vendor_asset(filename):
+    """Serve a vendored asset, preferring its precompressed .br/.gz sibling"""
+    import mimetypes
+    import assets
+    filepath = safe_join(os.path.join(app.static_folder, assets.VENDOR_DIR), filename)
+    if filepath is None or not os.path.isfile(filepath):
+        abort(404)
+    encoding, variant = assets.precompressed_variant(filepath, request.accept_encodings)
+    response = send_file(variant, mimetype=mimetypes.guess_type(filepath)[0],
+                         max_age=app.config['VENDOR_ASSET_MAX_AGE'], conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip (or brotli, if installed) large HTML/JSON responses"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in app.config['COMPRESS_MIMETYPES']):
+        return response
+    data = response.get_data()
+    if len(data) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encodings = request.accept_encodings
+    if 'br' in encodings:
+        try:
+            import brotli
+            response.set_data(brotli.compress(data, quality=min(app.config['COMPRESS_LEVEL'], 11)))
+            response.headers['Content-Encoding'] = 'br'
+            return response
+        except ImportError:
+            pass
+    if 'gzip' in encodings:
+        import gzip
+        response.set_data(gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL']))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@app.route('/profile-photo/<int:seller_id>/<filename>')
+def get_profile_photo_file(seller_id, filename):
+    """Serve a profile photo by its versioned filename with long-lived caching"""
+    if not filename.startswith(f"profile_{seller_id}_") and not filename.startswith(f"profile_{seller_id}."):
+        abort(404)
+    if not os.path.exists(os.path.join(app.config['PROFILE_PHOTO_FOLDER'], filename)):
+        import imaging
+        # An AVIF/WebP variant this server could not encode: the same size in the fallback format
+        for substitute in imaging.substitute(filename) or ():
+            if os.path.exists(os.path.join(app.config['PROFILE_PHOTO_FOLDER'], substitute)):
+                filename = substitute
+                break
+    response = serve_file(app.config['PROFILE_PHOTO_FOLDER'], filename,
+                          max_age=app.config['PROFILE_PHOTO_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/profile-photo/<int:seller_id>')
 def get_profile_photo(seller_id):
     seller = Seller.query.get(seller_id)
     if seller and seller.profile_photo:
         filepath = os.path.join(app.config['PROFILE_PHOTO_FOLDER'], seller.profile_photo)
         if os.path.exists(filepath):
-            return send_file(filepath)
+            return redirect(url_for('get_profile_photo_file', seller_id=seller.id, filename=seller.profile_photo))
     # Return default icon as SVG
     return send_file(
-        pil_io.BytesIO(
+        io.BytesIO(
             b'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="currentColor" width="200" height="200">'
             b'<path d="M12 12c2.21 0 4-1.79 4-4s-1.79-4-4-4-4 1.79-4 4 1.79 4 4 4zm0 2c-2.67 0-8 1.34-8 4v2h16v-2c0-2.66-5.33-4-8-4z"/>'
             b'</svg>'),
         mimetype='image/svg+xml'
     )
 
-# Initialize database on first request
-@app.before_request
-def initialize_database():
-    if not hasattr(initialize_database, 'initialized'):
-        initialize_database.initialized = True
-        with app.app_context():
-            db.create_all()
+def init_db():
+    """Create any missing tables and apply pending migrations; run once at startup, not per request"""
+    import migrations
+    with app.app_context():
+        db.create_all()
+        return migrations.upgrade(db.engine, log=app.logger.info)
+
+def hot_upload_queries(seller_id=1, upload_id=1):
+    """The statements every seller page runs, built by the same helpers, for checking their query plans"""
+    page_size = app.config['UPLOAD_PAGE_SIZE']
+    return {
+        'upload page': upload_page_query(seller_id).limit(page_size + 1).statement,
+        'next page': upload_page_query(seller_id, cursor=str(upload_id)).limit(page_size + 1).statement,
+        'seller context': seller_context_query(seller_id, page_size).statement,
+        'navigation': navigation_query(seller_id, upload_id),
+        'stats by date': upload_stats_query(seller_id).statement,
+        'folder scan': known_filenames_query(['a.csv', 'b.csv']).statement,
+        'orders by month': month_orders_query(seller_id, ((2025, 1), (2025, 2))).statement,
+    }
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the database schema."""
+    init_db()
+    print('Database initialised')
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations."""
+    import migrations
+    with app.app_context():
+        db.create_all()
+        applied = migrations.upgrade(db.engine, log=print)
+        with db.engine.connect() as conn:
+            print(f"Schema version {migrations.current_version(conn)}"
+                  f"{'' if applied else ' (up to date)'}")
+
+@app.cli.command('check-indexes')
+def check_indexes_command():
+    """EXPLAIN the hot queries and fail if any scans csv_uploads or orders."""
+    import migrations
+    failures = 0
+    with app.app_context():
+        with db.engine.connect() as conn:
+            for name, statement in hot_upload_queries().items():
+                plan = migrations.explain(conn, statement)
+                problems = migrations.plan_problems(plan, (CSVUpload.__tablename__, Order.__tablename__))
+                failures += bool(problems)
+                print(f"{'FAIL' if problems else 'ok':<5} {name}")
+                for step in plan:
+                    print(f"        {step}")
+    if failures:
+        raise SystemExit(1)
+
+@app.cli.command('profiles')
+@click.argument('profile_id', required=False)
+@click.option('--limit', default=10, help='Profiles to list, or functions to print.')
+@click.option('--sort', default='cumulative', help='pstats sort key when printing a profile.')
+def profiles_command(profile_id, limit, sort):
+    """List the slowest captured request profiles, or print one as a pstats report."""
+    folder = app.config['PROFILE_FOLDER']
+    if profile_id:
+        print(profiling.render(folder, profile_id, sort=sort, limit=limit))
+        return
+    print(f"{'ms':>9} {'queries':>7} {'rows':>9} {'upload':>7}  {'endpoint':<22} id")
+    for meta in profiling.list_profiles(folder)[:limit]:
+        print(f"{meta['duration_ms']:>9.1f} {meta['query_count']:>7} {meta['row_count'] or '-':>9} "
+              f"{meta['upload_id'] or '-':>7}  {meta['endpoint'] or '-':<22} {meta['id']}")
+
+@app.cli.command('onboard-sellers')
+@click.argument('feed', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--output', type=click.File('w'), help='Write email,store_name,unique_code of created sellers here.')
+@click.option('--batch-size', default=5000, help='Sellers inserted per transaction.')
+def onboard_sellers_command(feed, output, batch_size):
+    """Create sellers in bulk from a CSV feed with name, store_name and email columns."""
+    started = time.perf_counter()
+    with app.app_context():
+        created, skipped = onboard_sellers(csv.DictReader(feed), batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    if output:
+        writer = csv.writer(output)
+        writer.writerow(['email', 'store_name', 'unique_code'])
+        writer.writerows(created)
+    print(f"Created {len(created)} sellers, skipped {skipped}, in {elapsed:.1f}s "
+          f"({len(created) / elapsed if elapsed else 0:.0f} sellers/s)")
+
+@app.cli.command('collect-deletions')
+@click.option('--batch-size', type=int, help='Rows deleted per transaction (default DELETION_BATCH_SIZE).')
+def collect_deletions_command(batch_size):
+    """Remove deleted uploads and accounts with their files, columnar copies and orders."""
+    started = time.perf_counter()
+    with app.app_context():
+        completed = collect_deletions(batch_size)
+        remaining = PendingDeletion.query.count()
+    print(f"Collected {completed} deletions in {time.perf_counter() - started:.1f}s, {remaining} pending")
+
+@app.cli.command('purge-retired')
+def purge_retired_command():
+    """Delete retired upload and photo files whose grace period has passed."""
+    with app.app_context():
+        purged = purge_retired_files(limit=None)
+    print(f"Purged {purged} files")
+
+@app.cli.command('startup-report')
+def startup_report_command():
+    """Show import/startup timings and which heavy modules are loaded."""
+    import sys
+    timings = app.extensions['retrix.startup']
+    print(f"import app.py   {timings['import_ms']:8.1f} ms")
+    print(f"configure_app() {timings['configure_ms']:8.1f} ms")
+    for module in app.config['PRELOAD_MODULES']:
+        print(f"{module:<15} {'loaded' if module in sys.modules else 'not loaded'}")
+
+@app.cli.command('vendor-assets')
+def vendor_assets_command():
+    """Download, fingerprint and precompress the third-party CSS/JS."""
+    import assets
+    assets.vendor_assets(app.static_folder)
+
+_import_ms = (time.perf_counter() - _import_started) * 1000
+configure_app()
 
 if __name__ == '__main__':
+    init_db()
     app.run(debug=True)
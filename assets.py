@@ -0,0 +1,157 @@
+"""Vendored front-end assets and precompressed static files.
+
+Templates reference third-party CSS/JS through ``asset_url(name)``. Once
+``flask vendor-assets`` has been run (on any machine with internet access),
+the files live under ``static/vendor`` with content-hashed names and gzip
+(and brotli, when the ``brotli`` package is installed) siblings, so
+air-gapped installs never reach a CDN. Until then ``asset_url`` falls back
+to the CDN URL, which is only acceptable in development: ``check_vendored``
+(run by wsgi.py's preload) refuses to start a production server while any
+asset is missing, or its file no longer matches the hash in its name.
+"""
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import urllib.parse
+import urllib.request
+
+# Logical name -> (vendor directory, CDN URL)
+VENDOR_ASSETS = {
+    # Both Bootstrap releases the templates were written against, each page keeping its own
+    'bootstrap-5.3.0.min.css': ('bootstrap-5.3.0', 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css'),
+    'bootstrap-5.3.0.bundle.min.js': ('bootstrap-5.3.0', 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js'),
+    'bootstrap-5.3.8.min.css': ('bootstrap-5.3.8', 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.8/dist/css/bootstrap.min.css'),
+    'bootstrap-5.3.8.bundle.min.js': ('bootstrap-5.3.8', 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.8/dist/js/bootstrap.bundle.min.js'),
+    'fontawesome.min.css': ('fontawesome-6.0.0', 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css'),
+    'chart.js': ('chartjs-4.4.1', 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.js'),
+    'chartjs-plugin-datalabels.js': ('chartjs-plugin-datalabels-2.2.0', 'https://cdn.jsdelivr.net/npm/chartjs-plugin-datalabels@2.2.0/dist/chartjs-plugin-datalabels.min.js'),
+}
+
+VENDOR_DIR = 'vendor'
+MANIFEST_NAME = 'manifest.json'
+PRECOMPRESSED_EXTENSIONS = ('.css', '.js', '.svg', '.ttf', '.eot', '.json', '.map')
+CSS_URL_PATTERN = re.compile(r"url\(\s*['\"]?([^'\")]+)['\"]?\s*\)")
+
+_manifest_cache = {}
+
+def load_manifest(static_folder):
+    """Read the logical name -> vendored path map, once per process"""
+    if static_folder not in _manifest_cache:
+        path = os.path.join(static_folder, VENDOR_DIR, MANIFEST_NAME)
+        try:
+            with open(path) as f:
+                _manifest_cache[static_folder] = json.load(f)
+        except (OSError, ValueError):
+            _manifest_cache[static_folder] = {}
+    return _manifest_cache[static_folder]
+
+def asset_url(static_folder, name, url_for):
+    """URL for a vendored asset, or its CDN URL when it has not been vendored"""
+    vendored = load_manifest(static_folder).get(name)
+    if vendored:
+        return url_for('vendor_asset', filename=vendored)
+    return VENDOR_ASSETS[name][1]
+
+class AssetsNotVendored(RuntimeError):
+    """Vendored assets are missing or damaged; run ``flask vendor-assets``"""
+
+def check_vendored(static_folder):
+    """Raise AssetsNotVendored unless every VENDOR_ASSETS entry is vendored and intact"""
+    _manifest_cache.pop(static_folder, None)
+    manifest = load_manifest(static_folder)
+    problems = []
+    for name in VENDOR_ASSETS:
+        vendored = manifest.get(name)
+        if not vendored:
+            problems.append(f'{name}: not vendored')
+            continue
+        path = os.path.join(static_folder, VENDOR_DIR, *vendored.split('/'))
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            problems.append(f'{name}: {vendored} is missing')
+            continue
+        # fingerprint() named the file stem.<sha256 prefix>.ext
+        if hashlib.sha256(data).hexdigest()[:10] != posixpath.basename(vendored).split('.')[1]:
+            problems.append(f'{name}: {vendored} does not match its checksum')
+    if problems:
+        raise AssetsNotVendored(
+            'Front-end assets are not vendored, so pages would load them from a CDN: ' + '; '.join(problems)
+            + '. Run `flask --app app vendor-assets` (with network access) and deploy static/vendor, '
+            'or set RETRIX_ALLOW_CDN_ASSETS=on to serve them from the CDN.')
+
+def precompress(path, brotli_module=None):
+    """Write .gz (and .br) siblings next to a static file"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli_module is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli_module.compress(data))
+
+def fingerprint(filename, data):
+    stem, ext = filename.split('.', 1) if '.' in filename else (filename, '')
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    return f"{stem}.{digest}.{ext}" if ext else f"{stem}.{digest}"
+
+def _download(url):
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return response.read()
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def vendor_assets(static_folder, log=print):
+    """Download every VENDOR_ASSETS entry (plus fonts/images its CSS refers to),
+    fingerprint the entry files, precompress them and write the manifest."""
+    try:
+        import brotli as brotli_module
+    except ImportError:
+        brotli_module = None
+
+    vendor_root = os.path.join(static_folder, VENDOR_DIR)
+    manifest = {}
+    for name, (directory, url) in VENDOR_ASSETS.items():
+        data = _download(url)
+        source_path = urllib.parse.urlparse(url).path
+        # Keep the CDN's layout below the package directory so relative url()s still resolve
+        relative = posixpath.join(posixpath.basename(posixpath.dirname(source_path)),
+                                  fingerprint(posixpath.basename(source_path), data))
+        target = os.path.join(vendor_root, directory, *relative.split('/'))
+        _write(target, data)
+        written = [target]
+
+        if name.endswith('.css'):
+            for ref in sorted(set(CSS_URL_PATTERN.findall(data.decode('utf-8', 'replace')))):
+                if ref.startswith('data:') or '://' in ref:
+                    continue
+                ref_path = ref.split('?', 1)[0].split('#', 1)[0]
+                ref_target = os.path.normpath(os.path.join(os.path.dirname(target), *ref_path.split('/')))
+                if not ref_target.startswith(os.path.join(vendor_root, directory)) or os.path.exists(ref_target):
+                    continue
+                _write(ref_target, _download(urllib.parse.urljoin(url, ref_path)))
+                written.append(ref_target)
+
+        for path in written:
+            if path.endswith(PRECOMPRESSED_EXTENSIONS):
+                precompress(path, brotli_module)
+        manifest[name] = f"{directory}/{relative}"
+        log(f"{name:<32} -> {manifest[name]} ({len(written)} files)")
+
+    _write(os.path.join(vendor_root, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    _manifest_cache.pop(static_folder, None)
+    return manifest
+
+def precompressed_variant(path, accept_encodings):
+    """Pick the best precompressed sibling of ``path`` the client accepts"""
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in accept_encodings and os.path.isfile(path + suffix):
+            return encoding, path + suffix
+    return None, path
@@ -0,0 +1,79 @@
+"""Per-worker memory when several processes analyse the same upload.
+
+    python benchmarks/columnar_memory.py --rows 2000000 --workers 4
+
+Each worker loads the same synthetic order export and computes the
+dashboard metrics, once parsing the CSV and once mapping the columnar copy
+(written on the first run, as the app does). Reported per worker, from
+/proc/self/status: private memory (RssAnon) and file-backed pages (RssFile),
+which are shared between processes through the page cache. Linux only.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+import columnar
+import storage
+from generate_orders import write_orders
+
+
+def rss():
+    fields = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if name in ('RssAnon', 'RssFile'):
+                fields[name] = int(value.split()[0]) // 1024
+    return fields['RssAnon'], fields['RssFile']
+
+
+def worker(path, digest, folder, results):
+    if folder:
+        df = columnar.load(folder, digest, lambda: analytics.read_csv(path, dtype=analytics.ORDER_DTYPES))
+    else:
+        df = analytics.read_orders(path)
+    analytics.build_top_skus(df)
+    results.put(rss())
+
+
+def run(label, path, digest, folder, workers):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(path, digest, folder, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    private = sum(anon for anon, _ in samples) / workers
+    shared = sum(file for _, file in samples) / workers
+    print(f"{label:<10} {private:>12.0f} {shared:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'retrix-bench'))
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    path = os.path.join(args.workdir, f'orders_{args.rows}.csv')
+    if not os.path.exists(path):
+        write_orders(path, args.rows)
+    digest = storage.hash_file(path)
+    folder = os.path.join(args.workdir, 'columnar')
+    columnar.load(folder, digest, lambda: analytics.read_csv(path, dtype=analytics.ORDER_DTYPES))
+
+    print(f"{'read':<10} {'private MB':>12} {'mapped MB':>12}   (per worker, {args.workers} workers)")
+    run('csv', path, digest, None, args.workers)
+    run('columnar', path, digest, folder, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Compare CSV parser backends on large order files.
+
+    python benchmarks/csv_engines.py --rows 1000000 10000000
+
+Writes a synthetic order export of each size (kept in --workdir so reruns
+skip generation), then times the read paths the app uses with each
+available CSV_ENGINE: a full read_orders, the one-column count_rows, and
+streaming the file through iter_order_records for ingestion. pyarrow is
+skipped when it is not installed.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+from generate_orders import write_orders
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def consume_records(path, engine):
+    for chunk in analytics.iter_csv_chunks(path, text=True, engine=engine):
+        len(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'retrix-bench'))
+    args = parser.parse_args()
+
+    engines = ['c']
+    try:
+        import pyarrow.csv  # noqa: F401
+        engines.append('pyarrow')
+    except ImportError:
+        print('pyarrow not installed; timing the C engine only')
+
+    os.makedirs(args.workdir, exist_ok=True)
+    print(f"{'rows':>10} {'engine':<8} {'read_orders':>12} {'count_rows':>11} {'ingest scan':>12}")
+    for rows in args.rows:
+        path = os.path.join(args.workdir, f'orders_{rows}.csv')
+        if not os.path.exists(path):
+            write_orders(path, rows)
+        for engine in engines:
+            read = timed(lambda: analytics.read_csv(path, dtype=analytics.ORDER_DTYPES, engine=engine))
+            count = timed(lambda: analytics.read_csv(path, usecols=['order_id'], engine=engine))
+            scan = timed(lambda: consume_records(path, engine))
+            print(f"{rows:>10} {engine:<8} {read:>11.2f}s {count:>10.2f}s {scan:>11.2f}s")
+
+
+if __name__ == '__main__':
+    main()
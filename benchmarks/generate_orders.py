@@ -0,0 +1,94 @@
+"""Seeded synthetic order exports in the uploads/*_sample_ecommerce_orders*.csv schema.
+
+    python benchmarks/generate_orders.py orders.csv --rows 1000000 --skus 500 \\
+        --catalogues 40 --reasons 6 --start 2025-01-01 --days 365 --seed 7
+
+The same options and seed always produce the same file. Cardinality is set
+by --skus (distinct sku_description values), --catalogues (catalogue_id
+values), --reasons (return_reason values) and --days (span of order_date
+from --start). Status, price and return mixes follow the sample exports.
+"""
+import argparse
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['order_id', 'order_date', 'catalogue_id', 'sku_description', 'item_price', 'quantity',
+           'order_price', 'order_status', 'return_type', 'return_cost', 'return_reason']
+PRODUCTS = ["Men's Kurta", "Women's Top", 'Saree', 'Dupatta', "Men's Shirt", "Women's Dress",
+            'Kids Frock', 'Palazzo', 'Lehenga', 'Nehru Jacket']
+COLOURS = ['White', 'Blue', 'Black', 'Maroon', 'Green', 'Red', 'Yellow', 'Pink', 'Grey', 'Navy']
+REASONS = ['Size issue', 'Wrong product', 'Quality issue', 'Color mismatch', 'Late delivery',
+           'Damaged in transit', 'Not as described', 'Changed mind']
+STATUSES = np.array(['delivered', 'delivered', 'delivered', 'cancelled', 'returned'])
+FIRST_ORDER_ID = 100001
+
+
+def sku_names(count):
+    names = [f"{product} {colour}" for product in PRODUCTS for colour in COLOURS]
+    names += [f"{PRODUCTS[i % len(PRODUCTS)]} Style {i}" for i in range(max(count - len(names), 0))]
+    return np.array(names[:count])
+
+
+def reason_names(count):
+    return np.array((REASONS + [f'Other reason {i}' for i in range(max(count - len(REASONS), 0))])[:count])
+
+
+def write_orders(path, rows, seed=0, skus=50, catalogues=20, reasons=4, start='2025-01-01', days=365,
+                 chunk=1_000_000):
+    """Write ``rows`` synthetic orders to ``path``"""
+    rng = np.random.default_rng(seed)
+    products = sku_names(skus)
+    catalogue_ids = 100_000_000 + rng.choice(900_000_000, size=catalogues, replace=False)
+    reason_values = reason_names(reasons)
+    first_day = date.fromisoformat(start)
+    day_labels = np.array([(first_day + timedelta(days=i)).strftime('%d-%m-%Y') for i in range(days)])
+    for offset in range(0, rows, chunk):
+        n = min(chunk, rows - offset)
+        status = STATUSES[rng.integers(0, len(STATUSES), n)]
+        returned = status == 'returned'
+        customer_return = returned & (rng.random(n) < 0.6)
+        price = rng.integers(300, 2500, n)
+        quantity = rng.integers(1, 4, n)
+        frame = pd.DataFrame({
+            'order_id': np.arange(offset, offset + n) + FIRST_ORDER_ID,
+            'order_date': day_labels[rng.integers(0, days, n)],
+            'catalogue_id': catalogue_ids[rng.integers(0, catalogues, n)],
+            'sku_description': products[rng.integers(0, skus, n)],
+            'item_price': price,
+            'quantity': quantity,
+            'order_price': price * quantity,
+            'order_status': status,
+            'return_type': np.where(customer_return, 'customer', np.where(returned, 'rto', '')),
+            'return_cost': np.where(customer_return, rng.integers(50, 300, n), 0),
+            'return_reason': np.where(returned, reason_values[rng.integers(0, reasons, n)], ''),
+        }, columns=COLUMNS)
+        frame.to_csv(path, mode='w' if offset == 0 else 'a', header=offset == 0, index=False)
+
+
+def add_cardinality_arguments(parser):
+    parser.add_argument('--skus', type=int, default=50)
+    parser.add_argument('--catalogues', type=int, default=20)
+    parser.add_argument('--reasons', type=int, default=4)
+    parser.add_argument('--start', default='2025-01-01', help='first order_date (YYYY-MM-DD)')
+    parser.add_argument('--days', type=int, default=365, help='order_date span in days')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def cardinality(args):
+    return {'skus': args.skus, 'catalogues': args.catalogues, 'reasons': args.reasons,
+            'start': args.start, 'days': args.days, 'seed': args.seed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=10_000)
+    add_cardinality_arguments(parser)
+    args = parser.parse_args()
+    write_orders(args.path, args.rows, **cardinality(args))
+
+
+if __name__ == '__main__':
+    main()
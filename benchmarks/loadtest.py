@@ -0,0 +1,267 @@
+"""Load-test the seller-facing routes with concurrent synthetic sellers.
+
+    python benchmarks/loadtest.py --serve --workers 4 --sellers 16 --rows 50000 --duration 60
+    python benchmarks/loadtest.py --url http://127.0.0.1:8000 --server-pid 1234 --sellers 8
+
+With --serve a gunicorn server (gunicorn.conf.py) is started in a scratch
+directory with its own SQLite database, upload folder and METRICS_FOLDER, so
+no real data is touched. Against a server you started yourself, pass
+--server-pid (the gunicorn master) to sample worker memory.
+
+Each run registers --sellers new sellers over HTTP; each uploads --uploads
+synthetic exports of --rows rows (generate_orders.py, one seed per file,
+consecutive months from January 2025). Every seller then logs in with its
+own cookie jar and cycles through the routes for --duration seconds.
+
+Reported: requests, errors (HTTP 5xx or connection failures), p50/p90/p99/max
+latency and throughput per route; 'database is locked' errors counted by the
+server's /metrics; and peak and final RSS of every server process, sampled
+from /proc. Memory and lock counts need the server on this (Linux) machine.
+"""
+import argparse
+import http.cookiejar
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+from generate_orders import write_orders
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'Load#test1'
+METRICS_TOKEN = uuid.uuid4().hex  # the scratch server's RETRIX_METRICS_TOKEN
+ROUTES = [
+    '/seller-dashboard',
+    '/catalogue',
+    '/sku-analysis',
+    '/seller-comparison?month1=1&year1=2025&month2=2&year2=2025',
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(scratch, workers, **extra_env):
+    """Initialise a scratch database and start gunicorn on it; returns (process, base url)"""
+    port = free_port()
+    env = dict(os.environ, **extra_env,
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO, os.environ.get('PYTHONPATH')])),
+               DATABASE_URL=f"sqlite:///{os.path.join(scratch, 'loadtest.db')}",
+               RETRIX_BIND=f'127.0.0.1:{port}', RETRIX_WORKERS=str(workers), RETRIX_ACCESS_LOG='',
+               RETRIX_METRICS_FOLDER=os.path.join(scratch, 'metrics'), RETRIX_METRICS_TOKEN=METRICS_TOKEN,
+               RETRIX_ALLOW_CDN_ASSETS='on')  # pages are fetched as HTML only, so unvendored assets don't matter
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], cwd=scratch, env=env,
+                   check=True, stdout=subprocess.DEVNULL)
+    log = open(os.path.join(scratch, 'server.log'), 'w')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO, 'gunicorn.conf.py')],
+                               cwd=scratch, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/seller-login', timeout=2).read()
+            return process, base_url
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.5)
+    process.terminate()
+    raise SystemExit(f"server did not start; see {log.name}")
+
+
+def opener():
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+
+def multipart(field, filename, data):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: text/csv\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def provision(base_url, sellers, upload_paths):
+    """Register sellers and upload their files; returns the sellers' emails"""
+    run = uuid.uuid4().hex[:8]
+    emails = []
+    for i in range(sellers):
+        email = f'load-{run}-{i}@example.com'
+        client = opener()
+        form = {'name': f'Load {i}', 'store_name': f'Load Store {i}', 'email': email,
+                'password': PASSWORD, 'confirm_password': PASSWORD}
+        client.open(base_url + '/seller-register', data=urllib.parse.urlencode(form).encode()).read()
+        client.open(base_url + '/seller-login',
+                    data=urllib.parse.urlencode({'email': email, 'password': PASSWORD}).encode()).read()
+        for j, path in enumerate(upload_paths[i]):
+            with open(path, 'rb') as f:
+                body, content_type = multipart('file', f'orders_{j + 1}.csv', f.read())
+            request = urllib.request.Request(base_url + '/seller-upload-csv', data=body,
+                                             headers={'Content-Type': content_type})
+            client.open(request).read()
+        emails.append(email)
+    return emails
+
+
+def seller_session(base_url, email, routes, deadline, samples):
+    client = opener()
+    client.open(base_url + '/seller-login',
+                data=urllib.parse.urlencode({'email': email, 'password': PASSWORD}).encode()).read()
+    offset = random.randrange(len(routes))
+    n = 0
+    while time.perf_counter() < deadline:
+        route = routes[(offset + n) % len(routes)]
+        n += 1
+        started = time.perf_counter()
+        try:
+            client.open(base_url + route, timeout=300).read()
+            status = 200
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError:
+            status = 0
+        samples.append((route, time.perf_counter() - started, status))
+
+
+def server_pids(master):
+    try:
+        with open(f'/proc/{master}/task/{master}/children') as f:
+            return [master] + [int(pid) for pid in f.read().split()]
+    except OSError:
+        return [master]
+
+
+def rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def sample_memory(master, stop, peaks, last):
+    while not stop.is_set():
+        for pid in server_pids(master):
+            rss = rss_mb(pid)
+            if rss is not None:
+                peaks[pid] = max(peaks.get(pid, 0), rss)
+                last[pid] = rss
+        stop.wait(0.5)
+
+
+def lock_errors(base_url):
+    try:
+        request = urllib.request.Request(base_url + '/metrics', headers={'Authorization': f'Bearer {METRICS_TOKEN}'})
+        text = urllib.request.urlopen(request, timeout=10).read().decode()
+    except OSError:
+        return None
+    match = re.search(r'^retrix_errors_total\{where="db_locked"\} (\S+)$', text, re.M)
+    return float(match.group(1)) if match else 0.0
+
+
+def percentile(ordered, p):
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def report(samples, elapsed):
+    print(f"{'route':<62} {'req':>6} {'err':>5} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for route in sorted({route for route, _, _ in samples}):
+        latencies = sorted(seconds * 1000 for r, seconds, _ in samples if r == route)
+        errors = sum(1 for r, _, status in samples if r == route and (status >= 500 or status == 0))
+        print(f"{route:<62} {len(latencies):>6} {errors:>5} {percentile(latencies, 50):>8.0f} "
+              f"{percentile(latencies, 90):>8.0f} {percentile(latencies, 99):>8.0f} {latencies[-1]:>8.0f}")
+    print(f"throughput {len(samples) / elapsed:.1f} req/s over {elapsed:.0f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', help='base URL of a running server (default: start one with --serve)')
+    parser.add_argument('--serve', action='store_true', help='start a scratch gunicorn server')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers with --serve')
+    parser.add_argument('--server-pid', type=int, help='gunicorn master pid, for memory sampling')
+    parser.add_argument('--sellers', type=int, default=8, help='concurrent sellers')
+    parser.add_argument('--uploads', type=int, default=2, help='uploads per seller')
+    parser.add_argument('--rows', type=int, default=50_000, help='rows per upload')
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--route', action='append', help='route to request (repeatable)')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'retrix-bench'))
+    args = parser.parse_args()
+    if not (args.url or args.serve):
+        parser.error('pass --url or --serve')
+
+    os.makedirs(args.workdir, exist_ok=True)
+    process = None
+    if args.serve:
+        scratch = tempfile.mkdtemp(prefix='loadtest-', dir=args.workdir)
+        process, base_url = start_server(scratch, args.workers)
+        master = process.pid
+        print(f"server {base_url} (pid {master}), scratch {scratch}")
+    else:
+        base_url, master = args.url.rstrip('/'), args.server_pid
+
+    try:
+        upload_paths = []
+        for i in range(args.sellers):
+            paths = []
+            for j in range(args.uploads):
+                path = os.path.join(args.workdir, f'load_{args.rows}_{i}_{j}.csv')
+                if not os.path.exists(path):
+                    write_orders(path, args.rows, seed=1000 * i + j, start=f'2025-{j % 12 + 1:02d}-01', days=28)
+                paths.append(path)
+            upload_paths.append(paths)
+        started = time.perf_counter()
+        emails = provision(base_url, args.sellers, upload_paths)
+        print(f"provisioned {args.sellers} sellers x {args.uploads} uploads of {args.rows} rows "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        locked_before = lock_errors(base_url)
+        peaks, last, stop = {}, {}, threading.Event()
+        sampler = None
+        if master:
+            sampler = threading.Thread(target=sample_memory, args=(master, stop, peaks, last), daemon=True)
+            sampler.start()
+        samples = []
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        threads = [threading.Thread(target=seller_session,
+                                    args=(base_url, email, args.route or ROUTES, deadline, samples))
+                   for email in emails]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+
+        report(samples, elapsed)
+        locked_after = lock_errors(base_url)
+        if locked_before is None or locked_after is None:
+            print("database locked errors: n/a (/metrics not reachable)")
+        else:
+            print(f"database locked errors: {locked_after - locked_before:.0f}")
+        for pid in sorted(peaks):
+            role = 'master' if pid == master else 'worker'
+            print(f"{role} {pid:>7}: peak {peaks[pid]:7.0f} MB, end {last[pid]:7.0f} MB")
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
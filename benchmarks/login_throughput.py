@@ -0,0 +1,140 @@
+"""Login throughput, and what a burst of logins does to dashboard latency.
+
+    python benchmarks/login_throughput.py --serve --workers 2 --logins 32 --duration 20
+    python benchmarks/login_throughput.py --serve --hash-workers 2 --hash-queue 64
+
+A scratch gunicorn server is started as in loadtest.py (or pass --url). One
+seller with a --rows upload loads the dashboard from --dashboards threads,
+first alone and then while --logins threads sign in as other sellers as
+fast as they can, each with a fresh session. Reported per phase: dashboard
+p50/p90/p99 latency, and login throughput, latency and 503s (the server's
+PASSWORD_HASH_QUEUE turning sign-ins away). --hash-workers, --hash-queue
+and --hash-method set the server's PASSWORD_HASH_* options.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from generate_orders import write_orders
+from loadtest import PASSWORD, opener, percentile, provision, start_server
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None  # a successful login answers 302; don't fetch the dashboard too
+
+
+def login_loop(base_url, emails, deadline, samples):
+    client = urllib.request.build_opener(NoRedirect)
+    n = 0
+    while time.perf_counter() < deadline:
+        email = emails[n % len(emails)]
+        n += 1
+        data = urllib.parse.urlencode({'email': email, 'password': PASSWORD}).encode()
+        started = time.perf_counter()
+        try:
+            client.open(base_url + '/seller-login', data=data, timeout=120).read()
+            status = 200
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError:
+            status = 0
+        samples.append((time.perf_counter() - started, status))
+
+
+def dashboard_loop(base_url, email, deadline, samples):
+    client = opener()
+    client.open(base_url + '/seller-login',
+                data=urllib.parse.urlencode({'email': email, 'password': PASSWORD}).encode()).read()
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            client.open(base_url + '/seller-dashboard', timeout=300).read()
+        except OSError:
+            pass
+        samples.append(time.perf_counter() - started)
+
+
+def phase(base_url, dashboard_email, login_emails, args, logins):
+    deadline = time.perf_counter() + args.duration
+    dashboard, login = [], []
+    threads = [threading.Thread(target=dashboard_loop, args=(base_url, dashboard_email, deadline, dashboard))
+               for _ in range(args.dashboards)]
+    threads += [threading.Thread(target=login_loop, args=(base_url, login_emails, deadline, login))
+                for _ in range(logins)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return dashboard, login, time.perf_counter() - started
+
+
+def report(label, dashboard, login, elapsed):
+    ordered = sorted(seconds * 1000 for seconds in dashboard)
+    line = f"{label:<16} dashboard n={len(ordered):>4}"
+    if ordered:
+        line += (f" p50 {percentile(ordered, 50):>6.0f} p90 {percentile(ordered, 90):>6.0f}"
+                 f" p99 {percentile(ordered, 99):>6.0f} ms")
+    print(line)
+    if login:
+        ok = sorted(seconds * 1000 for seconds, status in login if status == 302)
+        busy = sum(1 for _, status in login if status == 503)
+        failed = len(login) - len(ok) - busy
+        print(f"{'':<16} logins {len(ok) / elapsed:>6.1f}/s ok={len(ok)} busy={busy} failed={failed}"
+              + (f" p50 {percentile(ok, 50):.0f} p99 {percentile(ok, 99):.0f} ms" if ok else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', help='base URL of a running server (default: start one with --serve)')
+    parser.add_argument('--serve', action='store_true', help='start a scratch gunicorn server')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers with --serve')
+    parser.add_argument('--hash-workers', type=int, help='PASSWORD_HASH_WORKERS with --serve')
+    parser.add_argument('--hash-queue', type=int, help='PASSWORD_HASH_QUEUE with --serve')
+    parser.add_argument('--hash-method', help='PASSWORD_HASH_METHOD with --serve')
+    parser.add_argument('--accounts', type=int, default=8, help='sellers the login threads sign in as')
+    parser.add_argument('--logins', type=int, default=16, help='concurrent login threads')
+    parser.add_argument('--dashboards', type=int, default=2, help='concurrent dashboard threads')
+    parser.add_argument('--rows', type=int, default=50_000, help='rows in the dashboard seller\'s upload')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds per phase')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'retrix-bench'))
+    args = parser.parse_args()
+    if not (args.url or args.serve):
+        parser.error('pass --url or --serve')
+
+    os.makedirs(args.workdir, exist_ok=True)
+    process = None
+    if args.serve:
+        env = {name: str(value) for name, value in (('RETRIX_PASSWORD_HASH_WORKERS', args.hash_workers),
+                                                    ('RETRIX_PASSWORD_HASH_QUEUE', args.hash_queue),
+                                                    ('RETRIX_PASSWORD_HASH_METHOD', args.hash_method))
+               if value is not None}
+        scratch = tempfile.mkdtemp(prefix='login-', dir=args.workdir)
+        process, base_url = start_server(scratch, args.workers, **env)
+        print(f"server {base_url} (pid {process.pid}), scratch {scratch}")
+    else:
+        base_url = args.url.rstrip('/')
+
+    try:
+        path = os.path.join(args.workdir, f'load_{args.rows}_0_0.csv')
+        if not os.path.exists(path):
+            write_orders(path, args.rows, seed=0, start='2025-01-01', days=28)
+        dashboard_email, = provision(base_url, 1, [[path]])
+        login_emails = provision(base_url, args.accounts, [[] for _ in range(args.accounts)])
+
+        report('dashboard only', *phase(base_url, dashboard_email, login_emails, args, 0))
+        report(f'+{args.logins} logins', *phase(base_url, dashboard_email, login_emails, args, args.logins))
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
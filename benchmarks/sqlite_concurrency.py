@@ -0,0 +1,118 @@
+"""Concurrent read/write throughput on SQLite, with and without the connection profile.
+
+    python benchmarks/sqlite_concurrency.py --readers 4 --writers 2 --duration 10
+
+Each reader and writer is a separate process with its own engine, like
+gunicorn workers sharing one database file. Readers run the upload-history
+page query; writers insert upload rows in short transactions of --batch rows.
+The same workload runs twice on a fresh temporary database: once with SQLite
+defaults and once with Config.SQLITE_PRAGMAS applied on connect.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, insert, select
+
+from app import CSVUpload, db
+from config import Config
+
+SELLERS = 50
+
+
+def make_engine(path, pragmas):
+    engine = create_engine(f'sqlite:///{path}')
+    if pragmas:
+        @event.listens_for(engine, 'connect')
+        def apply(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+            cursor.close()
+    return engine
+
+
+def reader(path, pragmas, deadline, results):
+    engine = make_engine(path, pragmas)
+    table = CSVUpload.__table__
+    done = errors = 0
+    while time.time() < deadline:
+        query = (select(table.c.id, table.c.original_name, table.c.upload_date)
+                 .where(table.c.seller_id == random.randint(1, SELLERS))
+                 .order_by(table.c.upload_date.desc(), table.c.id.desc()).limit(21))
+        try:
+            with engine.connect() as conn:
+                conn.execute(query).all()
+            done += 1
+        except Exception:
+            errors += 1
+    results.put(('read', done, errors))
+
+
+def writer(path, pragmas, deadline, batch, results):
+    engine = make_engine(path, pragmas)
+    table = CSVUpload.__table__
+    done = errors = 0
+    while time.time() < deadline:
+        rows = [{'seller_id': random.randint(1, SELLERS), 'filename': f'{random.random()}.csv',
+                 'original_name': 'orders.csv', 'filepath': 'uploads/orders.csv', 'row_count': 100}
+                for _ in range(batch)]
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(table), rows)
+            done += batch
+        except Exception:
+            errors += 1
+    results.put(('write', done, errors))
+
+
+def run(label, pragmas, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        setup = make_engine(path, pragmas)
+        db.metadata.create_all(setup)
+        setup.dispose()
+
+        results = multiprocessing.Queue()
+        deadline = time.time() + args.duration
+        processes = [multiprocessing.Process(target=reader, args=(path, pragmas, deadline, results))
+                     for _ in range(args.readers)]
+        processes += [multiprocessing.Process(target=writer, args=(path, pragmas, deadline, args.batch, results))
+                      for _ in range(args.writers)]
+        for process in processes:
+            process.start()
+        totals = {'read': [0, 0], 'write': [0, 0]}
+        for _ in processes:
+            kind, done, errors = results.get()
+            totals[kind][0] += done
+            totals[kind][1] += errors
+        for process in processes:
+            process.join()
+
+    reads, read_errors = totals['read']
+    writes, write_errors = totals['write']
+    print(f"{label:<10} {reads / args.duration:>10.0f} {read_errors:>8} "
+          f"{writes / args.duration:>12.0f} {write_errors:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--batch', type=int, default=Config.INGEST_BATCH_SIZE)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{'profile':<10} {'reads/s':>10} {'errors':>8} {'rows/s':>12} {'errors':>8}")
+    run('default', {}, args)
+    run('tuned', Config.SQLITE_PRAGMAS, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Benchmark the analytics hot paths and fail on regressions against a stored baseline.
+
+    python benchmarks/suite.py                          # 10k and 1M rows, checked against baseline.json
+    python benchmarks/suite.py --rows 10000 1000000 10000000 --skus 2000 --days 730
+    python benchmarks/suite.py --save-baseline          # record this machine's numbers as the baseline
+
+For every size a seeded export is generated with generate_orders.py (kept in
+--workdir so reruns skip it) and each benchmark runs --repeat times against a
+scratch database and upload folder; the best time counts:
+
+    ingest             store_stream + count_rows + merge_seller_orders, as an upload does
+    dashboard_metrics  calculate_dashboard_metrics
+    top_skus           read_orders + build_top_skus (the sku_analysis table)
+    sku_detail         read_orders + calculate_sku_metrics + calculate_dashboard_metrics on that frame
+    month_comparison   get_two_month_comparison_data over the merged orders
+
+Results are written to --output as JSON. A benchmark slower than its baseline
+by more than --tolerance (and by more than --noise seconds) is a regression,
+and the exit status is 1. Baselines are only comparable on the same machine
+and cardinality; both are recorded with the numbers and a mismatch is reported.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_orders import add_cardinality_arguments, cardinality, write_orders
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def best_of(repeat, fn, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def machine():
+    import pandas as pd
+    return {'platform': platform.platform(), 'python': platform.python_version(),
+            'pandas': pd.__version__, 'cpus': os.cpu_count()}
+
+
+class Bench:
+    """A scratch app (database, upload folder) and the benchmarks run against it"""
+
+    def __init__(self, workdir):
+        scratch = os.path.join(workdir, 'scratch')
+        shutil.rmtree(scratch, ignore_errors=True)
+        os.makedirs(scratch)
+        self.upload_folder = os.path.join(scratch, 'uploads')
+        # app.py configures itself from the environment when first imported
+        os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(scratch, 'bench.db')}",
+                          RETRIX_UPLOAD_FOLDER=self.upload_folder, RETRIX_COLUMNAR_FOLDER='',
+                          RETRIX_METRICS='off')
+        import app as app_module
+        self.app_module = app_module
+        self.app = app_module.app
+        app_module.init_db()
+        self.sellers = 0
+
+    def new_seller(self):
+        Seller, db = self.app_module.Seller, self.app_module.db
+        self.sellers += 1
+        seller = Seller(name='Bench', store_name='Bench', email=f'bench{self.sellers}@example.com',
+                        password='-', unique_code=str(100000 + self.sellers))
+        db.session.add(seller)
+        db.session.commit()
+        return seller.id
+
+    def ingest(self, path, seller_id):
+        import analytics
+        import storage
+        m = self.app_module
+        with open(path, 'rb') as f:
+            digest, stored, _ = storage.store_stream(f, self.upload_folder)
+        m.db.session.add(m.CSVUpload(seller_id=seller_id, filename=os.path.basename(path),
+                                     original_name=os.path.basename(path), filepath=stored,
+                                     row_count=analytics.count_rows(stored), content_hash=digest))
+        m.db.session.commit()
+        m.merge_seller_orders(seller_id)
+        return stored
+
+    def forget(self, seller_id):
+        m = self.app_module
+        for upload in m.CSVUpload.query.filter_by(seller_id=seller_id):
+            if os.path.exists(upload.filepath):
+                os.remove(upload.filepath)
+            m.db.session.delete(upload)
+        m.clear_seller_orders(seller_id, self.app.config['DELETION_BATCH_SIZE'])  # commits
+
+    def run(self, path, repeat, start):
+        import analytics
+        results = {}
+        year, month = int(start[:4]), int(start[5:7])
+        next_year, next_month = (year, month + 1) if month < 12 else (year + 1, 1)
+        with self.app.app_context():
+            seller_id = self.new_seller()
+            results['ingest'] = best_of(repeat, lambda: self.ingest(path, seller_id),
+                                        setup=lambda: self.forget(seller_id))
+            stored = self.app_module.CSVUpload.query.filter_by(seller_id=seller_id).first().filepath
+            sku = analytics.read_orders(stored, ['sku_description'])['sku_description'].value_counts().index[0]
+
+            def sku_detail():
+                df = analytics.read_orders(stored)
+                analytics.calculate_sku_metrics(df, sku)
+                analytics.calculate_dashboard_metrics(stored, df=df)
+
+            results['dashboard_metrics'] = best_of(repeat, lambda: analytics.calculate_dashboard_metrics(stored))
+            results['top_skus'] = best_of(
+                repeat, lambda: analytics.build_top_skus(analytics.read_orders(stored, analytics.TOP_SKU_COLUMNS)))
+            results['sku_detail'] = best_of(repeat, sku_detail)
+            results['month_comparison'] = best_of(repeat, lambda: self.app_module.get_two_month_comparison_data(
+                seller_id, month, year, next_month, next_year))
+        return results
+
+
+def compare(results, baseline, tolerance, noise):
+    """(key, baseline seconds, seconds) for every benchmark that regressed"""
+    regressions = []
+    for key, seconds in results.items():
+        before = baseline.get(key)
+        if before is not None and seconds > before * (1 + tolerance) and seconds - before > noise:
+            regressions.append((key, before, seconds))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 1_000_000])
+    add_cardinality_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'retrix-bench'))
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown, as a fraction')
+    parser.add_argument('--noise', type=float, default=0.05, help='ignore slowdowns smaller than this (seconds)')
+    args = parser.parse_args()
+
+    params = cardinality(args)
+    os.makedirs(args.workdir, exist_ok=True)
+    bench = Bench(args.workdir)
+    results = {}
+    print(f"{'benchmark':<18} {'rows':>10} {'seconds':>9}")
+    for rows in args.rows:
+        name = 'orders_{rows}_{seed}_{skus}_{catalogues}_{reasons}_{start}_{days}.csv'.format(rows=rows, **params)
+        path = os.path.join(args.workdir, name)
+        if not os.path.exists(path):
+            write_orders(path, rows, **params)
+        for benchmark, seconds in bench.run(path, args.repeat, args.start).items():
+            results[f'{benchmark}/{rows}'] = seconds
+            print(f"{benchmark:<18} {rows:>10} {seconds:>9.3f}")
+
+    report = {'machine': machine(), 'cardinality': params, 'repeat': args.repeat,
+              'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    for field in ('machine', 'cardinality'):
+        if baseline.get(field) != report[field]:
+            print(f"warning: baseline {field} differs: {baseline.get(field)}")
+    regressions = compare(results, baseline['results'], args.tolerance, args.noise)
+    for key, before, seconds in regressions:
+        print(f"REGRESSION {key}: {before:.3f}s -> {seconds:.3f}s (+{(seconds / before - 1) * 100:.0f}%)")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
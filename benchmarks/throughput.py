@@ -0,0 +1,87 @@
+"""Measure requests/sec on the analytics routes of a running Retrix server.
+
+    gunicorn -c gunicorn.conf.py &
+    python benchmarks/throughput.py --email seller@example.com --password '...'
+
+Each thread logs in with its own cookie jar and requests one route in a loop
+for --duration seconds; the report lists requests/sec and mean latency.
+"""
+import argparse
+import http.cookiejar
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+ANALYTICS_ROUTES = [
+    '/seller-dashboard',
+    '/catalogue',
+    '/sku-analysis',
+    '/seller-comparison?month1=1&year1=2025&month2=2&year2=2025',
+]
+
+
+def logged_in_opener(base_url, email, password):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    form = urllib.parse.urlencode({'email': email, 'password': password}).encode()
+    opener.open(base_url + '/seller-login', data=form).read()
+    return opener
+
+
+def run_route(base_url, route, opener_factory, concurrency, duration):
+    counts, latencies, errors = [0] * concurrency, [0.0] * concurrency, [0] * concurrency
+    deadline = time.perf_counter() + duration
+
+    def worker(slot):
+        try:
+            opener = opener_factory()
+        except Exception:
+            errors[slot] += 1
+            return
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                opener.open(base_url + route).read()
+                counts[slot] += 1
+                latencies[slot] += time.perf_counter() - start
+            except Exception:
+                errors[slot] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    total = sum(counts)
+    return {
+        'route': route,
+        'requests': total,
+        'errors': sum(errors),
+        'rps': total / elapsed if elapsed else 0,
+        'mean_ms': sum(latencies) / total * 1000 if total else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--route', action='append', help='route to measure (repeatable)')
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    print(f"{'route':<62} {'req':>7} {'err':>5} {'req/s':>8} {'mean ms':>8}")
+    for route in args.route or ANALYTICS_ROUTES:
+        result = run_route(base_url, route, lambda: logged_in_opener(base_url, args.email, args.password),
+                           args.concurrency, args.duration)
+        print(f"{result['route']:<62} {result['requests']:>7} {result['errors']:>5} "
+              f"{result['rps']:>8.1f} {result['mean_ms']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
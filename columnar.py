@@ -0,0 +1,133 @@
+"""Memory-mapped columnar copies of uploads.
+
+The first analysis of an upload writes its parsed columns next to the
+object store, keyed by content hash, and every later read maps that file
+read-only instead of parsing the CSV again. Mapped pages live in the OS page
+cache, so all worker processes analysing the same popular upload share one
+copy and a worker's private memory does not grow with traffic.
+
+With pyarrow the copy is a single uncompressed Arrow IPC file and columns
+are handed to pandas zero-copy as Arrow-backed arrays. Without it, each
+column is a .npy file loaded with ``mmap_mode='r'``; numeric and date
+columns map directly. A text column is stored as int32 codes into a
+dictionary of its distinct values, kept as one UTF-8 byte buffer plus
+int64 offsets, so a single long value costs its own length rather than
+widening every cell; only the dictionary is decoded when it is read.
+"""
+import glob
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+FORMAT_VERSION = 2  # 2: text columns as dictionary codes instead of fixed-width strings
+
+def _has_pyarrow():
+    try:
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def cache_path(cache_dir, digest, arrow):
+    suffix = 'arrow' if arrow else 'npy'
+    return os.path.join(cache_dir, digest[:2], f'{digest}.v{FORMAT_VERSION}.{suffix}')
+
+def copies(cache_dir, digest):
+    """Every columnar copy of ``digest`` on disk, in either format and any FORMAT_VERSION"""
+    return sorted(path for path in glob.glob(os.path.join(glob.escape(cache_dir), digest[:2], f'{digest}.v*'))
+                  if not path.endswith('.part'))
+
+def _publish(temp_path, path):
+    """Rename a finished copy into place; if another worker won the race keep theirs"""
+    try:
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.isdir(temp_path):
+            shutil.rmtree(temp_path, ignore_errors=True)
+        elif os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def write_arrow(df, path):
+    import pyarrow as pa
+    import pyarrow.ipc
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    os.close(fd)
+    with pa.OSFile(temp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    _publish(temp_path, path)
+
+def read_arrow(path, usecols=None):
+    import pyarrow as pa
+    import pyarrow.ipc
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    if usecols is not None:
+        table = table.select([column for column in usecols if column in table.column_names])
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+def encode_text(series):
+    """(codes, offsets, data) for a text column: int32 codes (-1 for missing) into a dictionary
+    whose i-th value is the UTF-8 bytes data[offsets[i]:offsets[i + 1]]"""
+    codes, uniques = pd.factorize(series)
+    encoded = [str(value).encode('utf-8') for value in uniques]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return codes.astype(np.int32), offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+def decode_text(codes, offsets, data):
+    """The object array encode_text was given, with None for missing values"""
+    buffer = data.tobytes()
+    dictionary = np.empty(len(offsets), dtype=object)  # the extra last slot stays None for code -1
+    dictionary[:-1] = [buffer[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+    return dictionary[codes]
+
+def write_npy(df, path):
+    temp_dir = tempfile.mkdtemp(dir=os.path.dirname(path), suffix='.part')
+    columns = []
+    for i, (name, series) in enumerate(df.items()):
+        if series.dtype.kind in 'iufbM':
+            np.save(os.path.join(temp_dir, f'{i}.npy'), series.to_numpy())
+            columns.append({'name': name, 'kind': 'numeric'})
+        else:
+            for part, values in zip(('codes', 'offsets', 'data'), encode_text(series)):
+                np.save(os.path.join(temp_dir, f'{i}.{part}.npy'), values)
+            columns.append({'name': name, 'kind': 'text'})
+    with open(os.path.join(temp_dir, 'columns.json'), 'w') as f:
+        json.dump(columns, f)
+    _publish(temp_dir, path)
+
+def read_npy(path, usecols=None):
+    with open(os.path.join(path, 'columns.json')) as f:
+        columns = json.load(f)
+    data = {}
+    for i, column in enumerate(columns):
+        if usecols is not None and column['name'] not in usecols:
+            continue
+        if column['kind'] == 'text':
+            values = decode_text(*(np.load(os.path.join(path, f'{i}.{part}.npy'), mmap_mode='r')
+                                   for part in ('codes', 'offsets', 'data')))
+        else:
+            values = np.load(os.path.join(path, f'{i}.npy'), mmap_mode='r')
+        data[column['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+def load(cache_dir, digest, build, usecols=None):
+    """The upload's DataFrame, memory-mapped from its columnar copy.
+
+    ``build`` parses the CSV; it runs only when no copy exists yet.
+    """
+    arrow = _has_pyarrow()
+    path = cache_path(cache_dir, digest, arrow)
+    hit = os.path.exists(path)
+    metrics.inc(metrics.CACHE_REQUESTS, cache='columnar', result='hit' if hit else 'miss')
+    if not hit:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        (write_arrow if arrow else write_npy)(build(), path)
+    with metrics.timer('columnar_map'):
+        return (read_arrow if arrow else read_npy)(path, usecols)
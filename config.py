@@ -1,6 +1,102 @@
 import os
 
+from memory import PEAK_PER_CSV_BYTE, default_budget_mb
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'hard-to-guess-string'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///retrix.db'
+    # Password hashes use this werkzeug method; changing it rehashes each seller's password at next login.
+    # Hashing runs on PASSWORD_HASH_WORKERS threads per process with at most PASSWORD_HASH_QUEUE waiting.
+    PASSWORD_HASH_METHOD = os.environ.get('RETRIX_PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('RETRIX_PASSWORD_HASH_WORKERS', 1))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('RETRIX_PASSWORD_HASH_QUEUE', 16))
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///retrix.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    UPLOAD_FOLDER = os.environ.get('RETRIX_UPLOAD_FOLDER') or 'uploads'
+    PROFILE_PHOTO_FOLDER = 'uploads/profile'
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    # Keep uploaded CSVs compressed on disk: None, 'gzip' or 'zstd' (needs the zstandard package)
+    UPLOAD_STORAGE_COMPRESSION = os.environ.get('RETRIX_UPLOAD_COMPRESSION') or None
+    UPLOAD_PAGE_SIZE = 20  # uploads listed per page in history tables and the picker
+
+    # Let the reverse proxy send file bytes: None, 'x-sendfile' or 'x-accel-redirect'
+    FILE_OFFLOAD = os.environ.get('RETRIX_FILE_OFFLOAD')
+    FILE_OFFLOAD_PREFIX = os.environ.get('RETRIX_FILE_OFFLOAD_PREFIX', '/_protected/')
+    USE_X_SENDFILE = FILE_OFFLOAD == 'x-sendfile'
+    PROFILE_PHOTO_MAX_AGE = 365 * 24 * 60 * 60  # versioned URLs never change
+    # Resize uploaded profile photos on a background thread instead of in the request
+    PROFILE_PHOTO_ASYNC = os.environ.get('RETRIX_PROFILE_PHOTO_ASYNC') == 'on'
+    BACKGROUND_WORKERS = 1  # threads per server process for photo resizing and deletion collection
+    VENDOR_ASSET_MAX_AGE = 365 * 24 * 60 * 60  # fingerprinted filenames never change
+    # Until `flask vendor-assets` has been run, pages load Bootstrap, Font Awesome and Chart.js from
+    # their CDNs. The production entry point (wsgi.py) refuses to start in that state unless this is on.
+    ALLOW_CDN_ASSETS = os.environ.get('RETRIX_ALLOW_CDN_ASSETS') == 'on'
+
+    # gzip/brotli for dynamic responses at least this large
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_LEVEL = 6
+    COMPRESS_MIMETYPES = ['text/html', 'application/json', 'text/css', 'application/javascript', 'image/svg+xml']
+
+    # Work done once in the server master before workers fork (see wsgi.py)
+    PRELOAD_MODULES = ['numpy', 'pandas', 'PIL.Image']
+
+    # Applied to every new SQLite connection so several workers can read while one writes.
+    # busy_timeout comes first so switching to WAL waits for other connections.
+    # RETRIX_SQLITE_PROFILE=off keeps SQLite's defaults (rollback journal, no busy wait).
+    SQLITE_PRAGMAS = {} if os.environ.get('RETRIX_SQLITE_PROFILE') == 'off' else {
+        'busy_timeout': int(os.environ.get('RETRIX_SQLITE_BUSY_TIMEOUT', 5000)),  # ms
+        'journal_mode': 'WAL',
+        'synchronous': os.environ.get('RETRIX_SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'mmap_size': int(os.environ.get('RETRIX_SQLITE_MMAP_SIZE', 64 * 1024 * 1024)),
+    }
+    # Size the pool to the worker's threads (gunicorn --threads); extra connections are short-lived
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('RETRIX_DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('RETRIX_DB_MAX_OVERFLOW', 5)),
+        'pool_timeout': 30,
+    }
+    INGEST_BATCH_SIZE = 200  # rows per write transaction when registering uploads in bulk
+    RETIRED_FILE_GRACE = 10 * 60  # seconds a deleted file stays on disk for requests still reading it
+    DELETION_BATCH_SIZE = 1000  # rows removed per transaction when collecting deleted uploads and accounts
+
+    # CSV parser: 'c' (pandas) or 'pyarrow' (multithreaded, Arrow-backed columns; needs pyarrow)
+    CSV_ENGINE = os.environ.get('RETRIX_CSV_ENGINE', 'c')
+
+    # Memory-mapped columnar copies of uploads, shared by all workers through the page cache
+    # (Arrow IPC with pyarrow, else one .npy per column). Set RETRIX_COLUMNAR_FOLDER='' to disable.
+    COLUMNAR_FOLDER = os.environ.get('RETRIX_COLUMNAR_FOLDER', os.path.join('uploads', 'columnar')) or None
+
+    # Prometheus metrics at /metrics, served only to scrapers sending 'Authorization: Bearer <METRICS_TOKEN>'
+    # (no token, no endpoint). RETRIX_METRICS=off disables recording.
+    # With several workers, point METRICS_FOLDER at a directory they share (cleared on deploy)
+    # so each scrape sums every worker instead of reporting whichever one answered.
+    METRICS_ENABLED = os.environ.get('RETRIX_METRICS', 'on') != 'off'
+    METRICS_FOLDER = os.environ.get('RETRIX_METRICS_FOLDER') or None
+    METRICS_TOKEN = os.environ.get('RETRIX_METRICS_TOKEN')
+
+    # Statements slower than SLOW_QUERY_MS are logged with their parameters and route (0 disables);
+    # a request running one statement N_PLUS_ONE_THRESHOLD times or more is logged as a likely N+1
+    SLOW_QUERY_MS = float(os.environ.get('RETRIX_SLOW_QUERY_MS', 200))
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('RETRIX_N_PLUS_ONE_THRESHOLD', 10))
+
+    # Requests carrying the header X-Retrix-Profile: <PROFILING_TOKEN> run under
+    # cProfile and are saved to PROFILE_FOLDER; list them with `flask profiles`
+    PROFILING_ENABLED = os.environ.get('RETRIX_PROFILING') == 'on'
+    PROFILING_TOKEN = os.environ.get('RETRIX_PROFILING_TOKEN')
+    PROFILE_FOLDER = os.environ.get('RETRIX_PROFILE_FOLDER', 'profiles')
+    PROFILE_KEEP = 200
+
+    # Hard heap cap per gunicorn worker (MB, 0 = none); allocations past it raise MemoryError
+    WORKER_MEMORY_LIMIT_MB = int(os.environ.get('RETRIX_WORKER_MEMORY_LIMIT_MB', 0))
+    # Server processes sharing this machine's memory (gunicorn.conf.py uses the same default)
+    WORKERS = int(os.environ.get('RETRIX_WORKERS') or (os.cpu_count() or 1) + 1)
+    # Memory one analytics request may use (MB, 0 = unlimited). Uploads predicted to need more
+    # are analysed in chunks where possible, otherwise refused with an explanation. The default
+    # is half of what one worker has: WORKER_MEMORY_LIMIT_MB, else the container's (or machine's)
+    # memory split across WORKERS.
+    ANALYTICS_MEMORY_BUDGET_MB = int(os.environ.get('RETRIX_MEMORY_BUDGET_MB') or
+                                     default_budget_mb(WORKER_MEMORY_LIMIT_MB, WORKERS))
+    # .gz/.zst/.zip uploads may expand to at most this: 512 MB, or less when the budget could not
+    # run the heaviest analytic on a file that size, so an accepted upload is one that can be analysed
+    MAX_DECOMPRESSED_SIZE = min(512 * 1024 * 1024, (ANALYTICS_MEMORY_BUDGET_MB * 1024 * 1024 //
+                                                    int(max(PEAK_PER_CSV_BYTE.values())))
+                                or 512 * 1024 * 1024)
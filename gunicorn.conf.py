@@ -0,0 +1,33 @@
+"""Gunicorn settings for Retrix; every value can be overridden from the environment."""
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:application'
+bind = os.environ.get('RETRIX_BIND', '127.0.0.1:8000')
+
+# The analytics routes are CPU-bound pandas work, so scale with processes and
+# keep a few threads per worker for the cheap pages and file downloads.
+workers = int(os.environ.get('RETRIX_WORKERS', multiprocessing.cpu_count() + 1))
+threads = int(os.environ.get('RETRIX_THREADS', 4))
+timeout = int(os.environ.get('RETRIX_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('RETRIX_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('RETRIX_KEEPALIVE', 5))
+max_requests = int(os.environ.get('RETRIX_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('RETRIX_MAX_REQUESTS_JITTER', 0))
+
+# Import pandas/PIL and compile templates once in the master; workers share them copy-on-write
+preload_app = True
+
+accesslog = os.environ.get('RETRIX_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # Never share the master's database connections with a forked worker
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose()
+    # Optional hard heap cap: a runaway report raises MemoryError instead of waking the OOM killer
+    if app.config['WORKER_MEMORY_LIMIT_MB']:
+        import memory
+        memory.limit_process(app.config['WORKER_MEMORY_LIMIT_MB'] * 1024 * 1024)
@@ -0,0 +1,102 @@
+"""Image processing for profile photos.
+
+PIL is imported here rather than in app.py so that only the profile update
+request pays for loading it.
+
+An uploaded photo is decoded once at reduced scale (JPEG ``draft``, which
+skips most of the DCT work on large phone photos), cropped to a centred
+square and written at every PROFILE_PHOTO_SIZES width as AVIF and WebP,
+plus a JPEG (PNG if the photo has transparency) fallback. All files share a
+versioned stem, ``profile_<seller>_<version>_<size>.<ext>``; the seller row
+stores the largest fallback and the other names are derived from it.
+"""
+import os
+import re
+import tempfile
+
+from PIL import Image, ImageOps, features
+
+PROFILE_PHOTO_SIZES = (64, 128, 256)  # square widths; avatars are shown at 50 and 100 CSS px
+MODERN_FORMATS = tuple(fmt for fmt in ('avif', 'webp') if features.check(fmt))
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpg': 'image/jpeg', 'png': 'image/png'}
+SAVE_OPTIONS = {
+    'avif': {'format': 'AVIF', 'quality': 60, 'speed': 8},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpg': {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True},
+    'png': {'format': 'PNG', 'optimize': True},
+}
+_VARIANT = re.compile(r'^(profile_\d+_[0-9a-f]+)_(\d+)\.(avif|webp|jpg|png)$')
+
+def variant_name(stem, size, ext):
+    return f'{stem}_{size}.{ext}'
+
+def photo_stem(name):
+    """The shared stem of a pipeline-generated photo file, or None for anything else"""
+    match = _VARIANT.match(name or '')
+    return match.group(1) if match else None
+
+def photo_files(name):
+    """Every file belonging to the stored photo ``name`` (just ``name`` for older single-file photos)"""
+    stem = photo_stem(name)
+    if stem is None:
+        return [name]
+    fallback = name.rsplit('.', 1)[1]
+    return [variant_name(stem, size, ext)
+            for size in PROFILE_PHOTO_SIZES for ext in MODERN_FORMATS + (fallback,)]
+
+def photo_sources(name):
+    """(mime type, [(filename, width)]) per format for <picture>, modern formats first"""
+    stem = photo_stem(name)
+    if stem is None:
+        return []
+    fallback = name.rsplit('.', 1)[1]
+    return [(MIME_TYPES[ext], [(variant_name(stem, size, ext), size) for size in PROFILE_PHOTO_SIZES])
+            for ext in MODERN_FORMATS + (fallback,)]
+
+def substitute(name):
+    """The fallback-format file to serve when variant ``name`` is missing (encoder unavailable here)"""
+    match = _VARIANT.match(name)
+    if not match or match.group(3) in ('jpg', 'png'):
+        return None
+    return [variant_name(match.group(1), match.group(2), ext) for ext in ('jpg', 'png')]
+
+def check_photo(file):
+    """Raise if ``file`` is not an image PIL can read; only the header is parsed"""
+    with Image.open(file) as img:
+        img.size
+    file.seek(0)
+
+def decode_square(file, size):
+    """The photo upright and centre-cropped to a square of at least ``size`` pixels where possible"""
+    img = Image.open(file)
+    # JPEG: let libjpeg decode at 1/2, 1/4 or 1/8 scale, keeping both sides >= size
+    img.draft('RGB', (size, size))
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+    side = min(img.size)
+    left, top = (img.width - side) // 2, (img.height - side) // 2
+    return img.crop((left, top, left + side, top + side))
+
+def write_atomic(img, filepath, options):
+    """Write to a temporary file and rename into place, so a photo URL never serves a partial file"""
+    directory, name = os.path.split(filepath)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{name}.', suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            img.save(f, **options)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+def save_profile_photo(file, folder, stem):
+    """Write every size and format of an uploaded photo; returns the name to store for the seller"""
+    img = decode_square(file, max(PROFILE_PHOTO_SIZES))
+    fallback = 'png' if img.mode == 'RGBA' else 'jpg'
+    for size in sorted(PROFILE_PHOTO_SIZES, reverse=True):
+        # reducing_gap: box-reduce by an integer factor first, then LANCZOS over the last stretch
+        img = img.resize((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for ext in MODERN_FORMATS + (fallback,):
+            write_atomic(img, os.path.join(folder, variant_name(stem, size, ext)), SAVE_OPTIONS[ext])
+    return variant_name(stem, max(PROFILE_PHOTO_SIZES), fallback)
@@ -0,0 +1,205 @@
+"""Peak-memory accounting and memory budgets for analytics.
+
+``tracked(analytic)`` measures how far this process's resident memory
+rises while an analytic runs, sampled from /proc by one background thread,
+and records the peak in the metrics. RSS is process-wide: requests running
+on the worker's other threads at the same time count towards each other's
+peaks, so a recorded peak is an upper bound and ``check()`` can stop a
+small report that shares the worker with a large one. (Per-request
+attribution would need tracemalloc, which slows pandas down too much to
+leave on and does not see every native allocation.) Before an upload is loaded,
+``estimate`` predicts the memory the analytic will need from the CSV's
+size; callers with a chunked plan switch to it when that is over budget,
+the rest raise MemoryBudgetExceeded so the seller gets a clear message
+instead of the worker being OOM-killed. Chunked plans call ``check()``
+between chunks so a bad estimate still stops short of the budget.
+
+``limit_process`` is the backstop: a hard cap on the worker's heap
+(RLIMIT_DATA) so runaway allocations raise MemoryError.
+
+``default_budget_mb`` sizes the budget from the memory one worker can
+actually use when ANALYTICS_MEMORY_BUDGET_MB is not configured.
+"""
+import os
+import struct
+import threading
+
+import metrics
+
+SAMPLE_INTERVAL = 0.02  # seconds between RSS samples while an analytic is tracked
+# Peak memory of each analytic per byte of (decompressed) CSV it reads,
+# measured with benchmarks/suite.py exports; read_orders is the DataFrame alone
+PEAK_PER_CSV_BYTE = {
+    'read_orders': 3.0,
+    'dashboard': 6.0,
+    'sku_detail': 9.0,
+    'top_skus': 2.5,
+}
+ZSTD_RATIO = 6  # assumed compression ratio when a .zst frame does not record its size
+# Share of a worker's memory one analytics request may use by default; the rest holds the
+# application itself and whatever the worker's other threads are doing
+BUDGET_SHARE = 0.5
+FALLBACK_WORKER_MB = 1024  # assumed worker memory where neither the limit nor the machine's RAM is known
+
+class MemoryBudgetExceeded(Exception):
+    """An analytic needs more memory than the budget allows; the message is safe to show"""
+
+def rss_bytes():
+    """Resident memory of this process, or None where it cannot be read cheaply"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+class Tracker:
+    """Context manager recording the RSS rise of one analytic as retrix_analytic_peak_memory_bytes"""
+
+    def __init__(self, analytic, budget=None):
+        self.analytic = analytic
+        self.budget = budget
+        self.start = self.peak = None
+
+    def sample(self, rss):
+        if rss is not None and rss > self.peak:
+            self.peak = rss
+
+    @property
+    def used(self):
+        return (self.peak - self.start) if self.start is not None else 0
+
+    def check(self):
+        """Raise MemoryBudgetExceeded if the analytic has grown past its budget"""
+        if self.budget and self.used > self.budget:
+            raise MemoryBudgetExceeded(
+                f'This upload needs more memory than the server allows for one report '
+                f'({self.budget // (1024 * 1024)} MB). Try a smaller export.')
+
+    def __enter__(self):
+        self.start = self.peak = rss_bytes()
+        if self.start is not None:
+            _sampler.add(self)
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            _sampler.remove(self)
+            self.sample(rss_bytes())
+            metrics.observe(metrics.PEAK_MEMORY, self.used, analytic=self.analytic)
+
+class _Sampler:
+    """One daemon thread sampling RSS for every active Tracker"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = set()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def add(self, tracker):
+        with self.lock:
+            self.active.add(tracker)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='retrix-rss-sampler', daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def remove(self, tracker):
+        with self.lock:
+            self.active.discard(tracker)
+
+    def run(self):
+        while True:
+            with self.lock:
+                trackers = list(self.active)
+            if not trackers:
+                self.wake.wait()
+                self.wake.clear()
+                continue
+            rss = rss_bytes()
+            for tracker in trackers:
+                tracker.sample(rss)
+            self.wake.wait(SAMPLE_INTERVAL)
+
+_sampler = _Sampler()
+
+def tracked(analytic, budget=None):
+    return Tracker(analytic, budget)
+
+def csv_bytes(path):
+    """Size of a stored CSV once decompressed"""
+    size = os.path.getsize(path)
+    if path.endswith('.gz') and size >= 4:
+        with open(path, 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            return struct.unpack('<I', f.read(4))[0]  # ISIZE: length mod 2**32; uploads are far smaller
+    if path.endswith('.zst'):
+        try:
+            import zstandard
+            with open(path, 'rb') as f:
+                content_size = zstandard.frame_content_size(f.read(18))
+            if content_size >= 0:
+                return content_size
+        except Exception:
+            pass  # zstandard missing or not a zstd frame
+        return size * ZSTD_RATIO
+    return size
+
+def estimate(path, analytic):
+    """Predicted peak memory of ``analytic`` on the CSV at ``path``"""
+    return int(csv_bytes(path) * PEAK_PER_CSV_BYTE[analytic])
+
+def too_large(path, analytic, budget):
+    """The message to show if ``analytic`` on ``path`` would exceed ``budget``, else None"""
+    if not budget:
+        return None
+    needed = estimate(path, analytic)
+    if needed <= budget:
+        return None
+    return (f'This upload is too large to analyse on this server: it needs about '
+            f'{needed // (1024 * 1024)} MB and one report may use at most {budget // (1024 * 1024)} MB.')
+
+def machine_memory_bytes():
+    """Memory this process may use: the container's cgroup limit if set, else physical RAM"""
+    limits = []
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                limits.append(int(f.read().strip()))  # cgroup v2 writes 'max' when unlimited
+        except (OSError, ValueError):
+            pass
+    try:
+        limits.append(os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE'))
+    except (AttributeError, ValueError, OSError):
+        try:
+            import psutil
+            limits.append(psutil.virtual_memory().total)
+        except ImportError:
+            pass
+    return min(limits) if limits else None
+
+def default_budget_mb(worker_limit_mb, workers):
+    """BUDGET_SHARE of one worker's memory: WORKER_MEMORY_LIMIT_MB, else the machine's split across workers"""
+    if worker_limit_mb:
+        worker_bytes = worker_limit_mb * 1024 * 1024
+    else:
+        total = machine_memory_bytes()
+        worker_bytes = total // max(workers, 1) if total else FALLBACK_WORKER_MB * 1024 * 1024
+    return max(int(worker_bytes * BUDGET_SHARE) // (1024 * 1024), 1)
+
+def limit_process(limit_bytes):
+    """Cap this process's heap so allocations past ``limit_bytes`` raise MemoryError (Linux)"""
+    try:
+        import resource
+    except ImportError:
+        return False
+    soft, hard = resource.getrlimit(resource.RLIMIT_DATA)
+    if hard != resource.RLIM_INFINITY:
+        limit_bytes = min(limit_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_DATA, (limit_bytes, hard))
+    return True
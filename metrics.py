@@ -0,0 +1,215 @@
+"""Request, stage, cache and ingest timings in Prometheus text format.
+
+Call sites record into a small in-process registry::
+
+    with metrics.timer('csv_read'):
+        ...
+    metrics.inc(metrics.CACHE_REQUESTS, cache='derived', result='hit')
+
+and ``/metrics`` renders it. Every gunicorn worker keeps its own registry;
+when METRICS_FOLDER is set each worker also writes a snapshot there every
+few seconds and the endpoint sums all of them, so one scrape covers the
+whole server. With METRICS_ENABLED off every call returns at its first check.
+"""
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+REQUEST_SECONDS = 'retrix_request_duration_seconds'
+STAGE_SECONDS = 'retrix_stage_duration_seconds'
+INGEST_SECONDS = 'retrix_ingest_duration_seconds'
+CACHE_REQUESTS = 'retrix_cache_requests_total'
+ERRORS = 'retrix_errors_total'
+PEAK_MEMORY = 'retrix_analytic_peak_memory_bytes'
+DB_STATEMENTS = 'retrix_db_statements_total'
+DB_STATEMENT_SECONDS = 'retrix_db_statement_seconds_total'
+DB_SLOW_QUERIES = 'retrix_db_slow_queries_total'
+DB_N_PLUS_ONE = 'retrix_db_n_plus_one_total'
+
+METRICS = {
+    REQUEST_SECONDS: ('histogram', 'Request latency by endpoint, method and status'),
+    STAGE_SECONDS: ('histogram', 'Time spent in one stage of handling a request'),
+    INGEST_SECONDS: ('histogram', 'Duration of upload ingestion jobs'),
+    CACHE_REQUESTS: ('counter', 'Cache lookups by cache and result (hit or miss)'),
+    ERRORS: ('counter', 'Errors caught and handled, by where they happened'),
+    PEAK_MEMORY: ('histogram', 'Rise in resident memory while an analytic ran'),
+    DB_STATEMENTS: ('counter', 'SQL statements executed, by normalised statement'),
+    DB_STATEMENT_SECONDS: ('counter', 'Total execution time of SQL statements, by normalised statement'),
+    DB_SLOW_QUERIES: ('counter', 'Statements slower than SLOW_QUERY_MS, by route'),
+    DB_N_PLUS_ONE: ('counter', 'Requests repeating one statement N_PLUS_ONE_THRESHOLD times or more, by route'),
+}
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+MB = 1024 * 1024
+HISTOGRAM_BUCKETS = {PEAK_MEMORY: tuple(n * MB for n in (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192))}
+FLUSH_INTERVAL = 5.0  # seconds between snapshots written to METRICS_FOLDER
+
+enabled = True
+folder = None
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [per-bucket counts + overflow, sum]
+_counters = {}    # (name, labels) -> value
+_last_flush = 0.0
+_NULL_TIMER = nullcontext()
+_local = threading.local()  # .trace: stage timings of the current request, when traced
+
+def configure(is_enabled, metrics_folder=None):
+    global enabled, folder
+    enabled = bool(is_enabled)
+    folder = metrics_folder or None
+    if enabled and folder:
+        os.makedirs(folder, exist_ok=True)
+
+def observe(name, seconds, **labels):
+    if not enabled:
+        return
+    trace = getattr(_local, 'trace', None)
+    if trace is not None and name == STAGE_SECONDS:
+        trace[labels['stage']] = trace.get(labels['stage'], 0.0) + seconds
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        buckets = HISTOGRAM_BUCKETS.get(name, BUCKETS)
+        state = _histograms.get(key)
+        if state is None:
+            state = _histograms[key] = [[0] * (len(buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(buckets, seconds)] += 1
+        state[1] += seconds
+
+def inc(name, amount=1, **labels):
+    if not enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+class _Timer:
+    __slots__ = ('name', 'labels', 'started')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+def timed(name, **labels):
+    """Context manager observing its duration into histogram ``name``"""
+    return _Timer(name, labels) if enabled else _NULL_TIMER
+
+def timer(stage):
+    return timed(STAGE_SECONDS, stage=stage)
+
+def timed_job(job):
+    """Decorator recording each call's duration as ingest job ``job``"""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(INGEST_SECONDS, job=job):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def stopwatch(prefix):
+    """Lap timer: each ``lap(name)`` records the time since the previous lap as stage '<prefix>.<name>'"""
+    last = [time.perf_counter()]
+    def lap(name):
+        if enabled:
+            now = time.perf_counter()
+            observe(STAGE_SECONDS, now - last[0], stage=f'{prefix}.{name}')
+            last[0] = now
+    return lap
+
+def start_trace():
+    """Also collect this thread's stage timings until stop_trace()"""
+    _local.trace = {}
+
+def stop_trace():
+    """Total seconds per stage since start_trace()"""
+    trace = getattr(_local, 'trace', None) or {}
+    _local.trace = None
+    return trace
+
+def snapshot():
+    with _lock:
+        return {
+            'histograms': [[name, labels, counts[:], total] for (name, labels), (counts, total) in _histograms.items()],
+            'counters': [[name, labels, value] for (name, labels), value in _counters.items()],
+        }
+
+def flush(force=False):
+    """Write this process's snapshot to METRICS_FOLDER, at most every FLUSH_INTERVAL seconds"""
+    global _last_flush
+    if not (enabled and folder):
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.part')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(snapshot(), f)
+    os.replace(temp_path, os.path.join(folder, f'{os.getpid()}.json'))
+
+def _collect():
+    """Histograms and counters summed over every worker's snapshot (or just this process)"""
+    if folder:
+        flush(force=True)
+        snapshots = []
+        for path in glob.glob(os.path.join(folder, '*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # a worker is replacing its file
+    else:
+        snapshots = [snapshot()]
+    histograms, counters = {}, {}
+    for data in snapshots:
+        for name, labels, counts, total in data['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+        for name, labels, value in data['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    histograms, counters = _collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+            continue
+        for (metric, labels), (counts, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(HISTOGRAM_BUCKETS.get(name, BUCKETS) + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,108 @@
+"""Versioned schema migrations.
+
+Each migration is a function taking a SQLAlchemy connection, registered in
+MIGRATIONS with a version number. ``upgrade`` applies the ones newer than the
+version recorded in ``schema_version`` inside a single transaction, so an
+existing database is brought forward in place and a fresh one (built by
+``db.create_all``) is simply stamped. Migrations must be idempotent: they
+run against databases created both before and after the model gained the
+change.
+"""
+from sqlalchemy import inspect, text
+
+import storage
+
+SCHEMA_VERSION_TABLE = 'schema_version'
+
+def _columns(conn, table):
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+def add_seller_profile_columns(conn):
+    """Columns previously added by migrate_database.py and migrate_db.py"""
+    columns = _columns(conn, 'sellers')
+    if 'store_name' not in columns:
+        conn.execute(text("ALTER TABLE sellers ADD COLUMN store_name VARCHAR(100) NOT NULL DEFAULT ''"))
+    if 'unique_code' not in columns:
+        conn.execute(text("ALTER TABLE sellers ADD COLUMN unique_code VARCHAR(6)"))
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS idx_sellers_unique_code ON sellers (unique_code)"))
+    if 'profile_icon' not in columns:
+        conn.execute(text("ALTER TABLE sellers ADD COLUMN profile_icon VARCHAR(50) DEFAULT 'fa-user'"))
+    if 'profile_photo' not in columns:
+        conn.execute(text("ALTER TABLE sellers ADD COLUMN profile_photo VARCHAR(200)"))
+
+def add_upload_indexes(conn):
+    """Indexes behind the upload history, keyset pagination and folder scan"""
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_csv_uploads_seller_date "
+                      "ON csv_uploads (seller_id, upload_date DESC, id DESC)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_csv_uploads_filename ON csv_uploads (filename)"))
+
+def add_upload_content_hash(conn):
+    """SHA-256 of each upload, backfilled for files still on disk"""
+    if 'content_hash' not in _columns(conn, 'csv_uploads'):
+        conn.execute(text("ALTER TABLE csv_uploads ADD COLUMN content_hash VARCHAR(64)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_csv_uploads_content_hash ON csv_uploads (content_hash)"))
+    rows = conn.execute(text("SELECT id, filepath FROM csv_uploads WHERE content_hash IS NULL")).all()
+    for upload_id, filepath in rows:
+        path = storage.resolve_legacy_path(filepath)
+        if path:
+            conn.execute(text("UPDATE csv_uploads SET content_hash = :digest WHERE id = :id"),
+                         {'digest': storage.hash_file(path), 'id': upload_id})
+
+def add_seller_deleted_at(conn):
+    """Accounts closed but not yet removed by the deletion collector"""
+    if 'deleted_at' not in _columns(conn, 'sellers'):
+        conn.execute(text("ALTER TABLE sellers ADD COLUMN deleted_at DATETIME"))
+
+def add_order_upload_index(conn):
+    """Lets deleting an upload find the orders it last changed"""
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_upload_id ON orders (upload_id)"))
+
+def add_upload_filepath_index(conn):
+    """Lets the deletion collector check which stored files are still in use"""
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_csv_uploads_filepath ON csv_uploads (filepath)"))
+
+MIGRATIONS = [
+    (1, 'seller profile columns', add_seller_profile_columns),
+    (2, 'csv_uploads indexes', add_upload_indexes),
+    (3, 'csv_uploads content hash', add_upload_content_hash),
+    (4, 'seller soft delete', add_seller_deleted_at),
+    (5, 'orders upload index', add_order_upload_index),
+    (6, 'csv_uploads filepath index', add_upload_filepath_index),
+]
+
+def current_version(conn):
+    if not inspect(conn).has_table(SCHEMA_VERSION_TABLE):
+        return 0
+    return conn.execute(text(f"SELECT COALESCE(MAX(version), 0) FROM {SCHEMA_VERSION_TABLE}")).scalar()
+
+def upgrade(engine, log=None):
+    """Apply pending migrations; returns the list of versions applied"""
+    applied = []
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} ("
+                          "version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL, "
+                          "applied_at DATETIME DEFAULT CURRENT_TIMESTAMP)"))
+        version = current_version(conn)
+        for number, description, migration in MIGRATIONS:
+            if number <= version:
+                continue
+            migration(conn)
+            conn.execute(text(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description) VALUES (:version, :description)"),
+                         {'version': number, 'description': description})
+            applied.append(number)
+            if log:
+                log(f"Applied migration {number}: {description}")
+    return applied
+
+def explain(conn, statement):
+    """SQLite query plan rows (the ``detail`` column) for a SQLAlchemy statement"""
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'render_postcompile': True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup or ())
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return [row[-1] for row in rows]
+
+def plan_problems(plan, tables):
+    """Plan steps that read one of ``tables`` without an index or sort outside one"""
+    return [step for step in plan
+            if (step.startswith(tuple(f'SCAN {table}' for table in tables)) and 'INDEX' not in step)
+            or step.startswith('USE TEMP B-TREE FOR ORDER BY')]
@@ -0,0 +1,65 @@
+"""Password hashing off the request threads.
+
+scrypt and PBKDF2 release the GIL while they run, so hashing on a small
+per-process pool of PASSWORD_HASH_WORKERS threads caps how many cores a
+burst of logins can take: request threads wait on the result without
+holding the interpreter, and the analytics requests on the same worker
+keep running. At most PASSWORD_HASH_QUEUE hashes may be waiting; past that
+``HashingBusy`` is raised and the login page asks the seller to retry,
+instead of every thread of the worker queueing behind the pool.
+
+Hashes are made with PASSWORD_HASH_METHOD (werkzeug's method string, e.g.
+``scrypt:32768:8:1``). ``verify`` reports when a stored hash was made with
+other parameters so the caller can rehash it while it has the password.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import metrics
+
+class HashingBusy(Exception):
+    """More passwords are waiting to be hashed than PASSWORD_HASH_QUEUE allows"""
+
+workers = 1
+queue = 16
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+
+def configure(hash_workers, hash_queue):
+    global workers, queue, _executor, _slots
+    with _lock:
+        workers, queue = hash_workers, hash_queue
+        _executor = _slots = None  # rebuilt on first use, after any fork
+
+def _run(fn, *args):
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='retrix-hash')
+            _slots = threading.BoundedSemaphore(workers + queue)
+        executor, slots = _executor, _slots
+    if not slots.acquire(blocking=False):
+        metrics.inc(metrics.ERRORS, where='password_hash_busy')
+        raise HashingBusy('Too many sign-ins at once; please try again in a moment.')
+    try:
+        with metrics.timer('password_hash'):
+            return executor.submit(fn, *args).result()
+    finally:
+        slots.release()
+
+def hash_password(password, method):
+    return _run(generate_password_hash, password, method)
+
+def method_of(stored):
+    return stored.split('$', 1)[0] if stored else None
+
+def verify(stored, password, method):
+    """(matches, needs_rehash) for ``password`` against the stored hash"""
+    if not stored:
+        return False, False
+    matches = _run(check_password_hash, stored, password)
+    return matches, matches and method_of(stored) != method
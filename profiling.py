@@ -0,0 +1,65 @@
+"""On-demand request profiles.
+
+An operator holding PROFILING_TOKEN can ask for a single request to run
+under cProfile by sending the ``X-Retrix-Profile: <token>`` header.
+The profile is saved to PROFILE_FOLDER as ``<id>.prof`` (pstats format,
+readable by snakeviz or ``python -m pstats``) next to ``<id>.json`` with the
+endpoint, the upload that was analysed, its row count and the request's
+timings, so a slow dashboard can be studied without the seller's file.
+"""
+import cProfile
+import glob
+import io
+import json
+import os
+import pstats
+import time
+
+PROFILE_HEADER = 'X-Retrix-Profile'
+
+def start():
+    """A running profiler, or None if another profiler is already active in this thread"""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+def save(profiler, folder, meta, keep=200):
+    """Write a stopped profiler and its metadata; returns the profile id.
+
+    Only the ``keep`` newest profiles are kept.
+    """
+    os.makedirs(folder, exist_ok=True)
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f'.{int(now * 1000) % 1000:03d}'
+    profile_id = f"{stamp}-{os.getpid()}-{meta['endpoint'] or 'unmatched'}"
+    profiler.dump_stats(os.path.join(folder, f'{profile_id}.prof'))
+    with open(os.path.join(folder, f'{profile_id}.json'), 'w') as f:
+        json.dump(dict(meta, id=profile_id, captured_at=now), f, indent=1)
+    for old in list_profiles(folder, order='captured_at')[keep:]:
+        for ext in ('.prof', '.json'):
+            try:
+                os.remove(os.path.join(folder, old['id'] + ext))
+            except FileNotFoundError:
+                pass
+    return profile_id
+
+def list_profiles(folder, order='duration_ms'):
+    """Metadata of saved profiles, largest ``order`` value first"""
+    profiles = []
+    for path in glob.glob(os.path.join(folder, '*.json')):
+        try:
+            with open(path) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda meta: meta.get(order) or 0, reverse=True)
+
+def render(folder, profile_id, sort='cumulative', limit=30):
+    """pstats report of a saved profile as text"""
+    out = io.StringIO()
+    stats = pstats.Stats(os.path.join(folder, f'{profile_id}.prof'), stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
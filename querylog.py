@@ -0,0 +1,75 @@
+"""Per-statement query statistics, a slow-query log and N+1 detection.
+
+The SQLAlchemy cursor hooks in app.py pass every executed statement to
+``record``. Statements are reduced to a fingerprint (literals and IN lists
+collapsed, whitespace normalised) and counted with their total time in the
+metrics registry, so /metrics shows which statements run most and cost
+most. A statement slower than SLOW_QUERY_MS is logged with its parameters
+and the route that issued it.
+
+Within a request the fingerprints are also counted on ``g``; when one of
+them runs N_PLUS_ONE_THRESHOLD times or more, ``check_request`` logs the
+likely N+1 loop and counts it per endpoint.
+"""
+import logging
+import re
+from functools import lru_cache
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+MAX_STATEMENT = 300   # characters of a fingerprint kept as a metric label
+MAX_PARAMETER = 80    # characters of each parameter shown in the slow-query log
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)', re.I)
+_VALUES = re.compile(r'\bVALUES\s*(\((?:\s*\?\s*,)*\s*\?\s*\))(?:\s*,\s*\1)+', re.I)
+_SPACE = re.compile(r'\s+')
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement):
+    """``statement`` with literals replaced by ? and repeated placeholders collapsed"""
+    text = _STRING.sub('?', statement)
+    text = _NUMBER.sub('?', text)
+    text = _SPACE.sub(' ', text).strip()
+    text = _IN_LIST.sub('IN (?)', text)
+    text = _VALUES.sub(r'VALUES \1', text)
+    return text[:MAX_STATEMENT]
+
+def format_parameters(statement, parameters, executemany):
+    if executemany:
+        return f'<{len(parameters)} parameter sets>'
+    if not parameters:
+        return '()'
+    if 'password' in statement.lower():
+        return '<redacted>'
+    values = parameters.values() if isinstance(parameters, dict) else parameters
+    shown = []
+    for value in values:
+        text = repr(value)
+        shown.append(text if len(text) <= MAX_PARAMETER else text[:MAX_PARAMETER] + '...')
+    return '(' + ', '.join(shown) + ')'
+
+def record(statement, parameters, executemany, seconds, slow_seconds, request_queries=None, route=None):
+    """Account one executed statement; ``request_queries`` counts fingerprints for this request"""
+    key = fingerprint(statement)
+    metrics.inc(metrics.DB_STATEMENTS, statement=key)
+    metrics.inc(metrics.DB_STATEMENT_SECONDS, seconds, statement=key)
+    if request_queries is not None:
+        request_queries[key] = request_queries.get(key, 0) + 1
+    if slow_seconds and seconds >= slow_seconds:
+        metrics.inc(metrics.DB_SLOW_QUERIES, route=route or 'none')
+        log.warning("Slow query (%.0f ms) in %s: %s %s", seconds * 1000, route or 'no request',
+                    _SPACE.sub(' ', statement).strip(), format_parameters(statement, parameters, executemany))
+
+def check_request(request_queries, threshold, route):
+    """Warn about statements repeated ``threshold`` times or more in one request"""
+    if not (threshold and request_queries):
+        return []
+    repeated = [(key, count) for key, count in request_queries.items() if count >= threshold]
+    for key, count in repeated:
+        metrics.inc(metrics.DB_N_PLUS_ONE, route=route)
+        log.warning("Possible N+1 in %s: %d x %s", route, count, key)
+    return repeated
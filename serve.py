@@ -0,0 +1,12 @@
+"""Run Retrix under waitress (for Windows hosts, where gunicorn is unavailable)."""
+import os
+
+from waitress import serve
+
+from wsgi import application
+
+if __name__ == '__main__':
+    serve(application,
+          listen=os.environ.get('RETRIX_BIND', '127.0.0.1:8000'),
+          threads=int(os.environ.get('RETRIX_THREADS', 8)),
+          channel_timeout=int(os.environ.get('RETRIX_TIMEOUT', 120)))
@@ -0,0 +1,154 @@
+"""Content-addressed storage for uploaded CSV files.
+
+Uploads are written once under ``<UPLOAD_FOLDER>/objects/<hh>/<sha256>.csv``,
+hashing the bytes while they stream to disk. Two uploads with the same
+content share one object, so a re-upload never overwrites another file and
+anything derived from the data can be keyed by the hash.
+
+Uploads may arrive as .gz, .zst or .zip; they are decompressed while they
+stream, and the hash is always of the CSV itself. Objects can be kept
+compressed at rest (``.csv.gz`` / ``.csv.zst``); pandas and pyarrow read
+those directly, decompressing as they parse.
+"""
+import gzip
+import hashlib
+import os
+import tempfile
+import zipfile
+
+OBJECTS_DIR = 'objects'
+CHUNK_SIZE = 1024 * 1024
+COMPRESSED_UPLOAD_EXTENSIONS = ('.gz', '.zst', '.zip')
+STORED_EXTENSIONS = {None: '.csv', 'gzip': '.csv.gz', 'zstd': '.csv.zst'}
+
+class UploadRejected(ValueError):
+    """An upload that cannot be stored; the message is safe to show the seller"""
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise UploadRejected('.zst files are not supported on this server') from None
+    return zstandard
+
+class LimitedReader:
+    """Read at most ``limit`` bytes, turning decoder errors into UploadRejected"""
+    def __init__(self, raw, limit, compressed):
+        self.raw = raw
+        self.limit = limit
+        self.compressed = compressed
+        self.total = 0
+
+    def read(self, size=-1):
+        try:
+            data = self.raw.read(size)
+        except Exception as e:
+            # gzip, zlib, zipfile and zstandard each raise their own error types
+            if not self.compressed:
+                raise
+            raise UploadRejected('The compressed file is damaged or incomplete') from e
+        self.total += len(data)
+        if self.total > self.limit:
+            raise UploadRejected(f'The file expands to more than {self.limit // (1024 * 1024)} MB')
+        return data
+
+def open_upload(stream, filename, limit):
+    """A reader over an upload's CSV bytes, decompressing .gz, .zst and .zip on the fly.
+
+    At most ``limit`` decompressed bytes are read, so a small archive cannot
+    expand without bound.
+    """
+    name = filename.lower()
+    if name.endswith('.gz'):
+        return LimitedReader(gzip.GzipFile(fileobj=stream, mode='rb'), limit, compressed=True)
+    if name.endswith('.zst'):
+        return LimitedReader(_zstandard().ZstdDecompressor().stream_reader(stream), limit, compressed=True)
+    if name.endswith('.zip'):
+        try:
+            archive = zipfile.ZipFile(stream)
+        except zipfile.BadZipFile as e:
+            raise UploadRejected('The .zip file is damaged or incomplete') from e
+        members = [member for member in archive.infolist()
+                   if not member.is_dir() and member.filename.lower().endswith('.csv')]
+        if len(members) != 1:
+            raise UploadRejected('A .zip upload must contain exactly one CSV file')
+        if members[0].file_size > limit:
+            raise UploadRejected(f'The file expands to more than {limit // (1024 * 1024)} MB')
+        return LimitedReader(archive.open(members[0]), limit, compressed=True)
+    return LimitedReader(stream, limit, compressed=False)
+
+def open_stored(path):
+    """Binary reader over a stored object's CSV bytes"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        return _zstandard().ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+def _compressed_writer(f, compression):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=f, mode='wb', compresslevel=6, mtime=0)
+    if compression == 'zstd':
+        return _zstandard().ZstdCompressor(level=6).stream_writer(f, closefd=False)
+    return None
+
+def object_name(digest, ext='.csv'):
+    """Path of an object relative to the upload folder, with '/' separators"""
+    return f"{OBJECTS_DIR}/{digest[:2]}/{digest}{ext}"
+
+def object_path(upload_folder, digest, ext='.csv'):
+    return os.path.join(upload_folder, *object_name(digest, ext).split('/'))
+
+def find_object(upload_folder, digest):
+    """Path of the stored object for ``digest`` in whichever form it was kept, or None"""
+    for ext in STORED_EXTENSIONS.values():
+        path = object_path(upload_folder, digest, ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def store_stream(stream, upload_folder, compression=None):
+    """Copy ``stream`` into the object store, hashing as it is written.
+
+    ``compression`` ('gzip' or 'zstd') keeps the object compressed at rest.
+    Returns (digest, path, created); ``created`` is False when an object with
+    the same content already existed, in which case the new copy is discarded.
+    """
+    objects_root = os.path.join(upload_folder, OBJECTS_DIR)
+    os.makedirs(objects_root, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=objects_root, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            writer = _compressed_writer(f, compression)
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                (writer or f).write(chunk)
+            if writer:
+                writer.close()
+        existing = find_object(upload_folder, digest.hexdigest())
+        if existing:
+            os.remove(temp_path)
+            return digest.hexdigest(), existing, False
+        path = object_path(upload_folder, digest.hexdigest(), STORED_EXTENSIONS[compression])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return digest.hexdigest(), path, True
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def resolve_legacy_path(filepath):
+    """Stored paths written on Windows use backslashes; find the file on this OS"""
+    if os.path.exists(filepath):
+        return filepath
+    normalised = filepath.replace('\\', os.sep)
+    return normalised if os.path.exists(normalised) else None
@@ -4,9 +4,16 @@
 
 import sys
 import os
+import tempfile
 sys.path.insert(0, os.getcwd())
 
-from app import app, db, Seller, CSVUpload
+# Use a scratch database with the current schema rather than the committed one
+scratch = tempfile.mkdtemp(prefix='retrix-test-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch, 'test.db')
+
+from app import app, init_db, db, Seller, CSVUpload
+
+init_db()
 
 # First check if CSV file exists
 csv_path = 'uploads/4_sample_ecommerce_orders.csv'
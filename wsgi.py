@@ -0,0 +1,8 @@
+"""Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py            (Linux, prefork)
+    python serve.py                         (Windows, waitress)
+"""
+from app import app, preload
+
+application = preload(app)